@@ -0,0 +1,246 @@
+# aggregates.py
+# Dashboard summaries computed on the server: value counts, buckets, top-k,
+# group-bys and histograms over the in-memory Dataset. Only these small
+# results go to the browser, so the dashboard costs the same for 300 rows
+# or a million.
+#
+# A query is a dict, e.g.
+#   {"op": "counts", "column": "gender"}
+#   {"op": "rank", "column": "marks", "k": 6, "order": "desc", "fields": ["name", "marks"]}
+# Results are cached on the Dataset, i.e. per upload version.
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from datasets import Dataset, BadQuery, MAX_PAGE_ROWS, to_records
+
+
+MAX_BUCKET_ROWS = 1000
+MAX_HISTOGRAM_BINS = 200
+
+
+def _values(dataset: Dataset, col, scale_fractions: bool = False) -> np.ndarray:
+    # same reading as the dashboard's parseNumber; scale_fractions turns 0.85 into 85
+    values = dataset.numbers(col).to_numpy(dtype=float)
+    if scale_fractions:
+        values = np.where((values > 0) & (values <= 1), values * 100, values)
+    return values
+
+
+def _fields(dataset: Dataset, query: Dict[str, Any]) -> Optional[list]:
+    fields = query.get("fields")
+    if fields is None:
+        return None
+    # fields the dataset doesn't have are skipped (the dashboard asks for
+    # optional columns like "section" without knowing if they exist)
+    return [f for f in fields if f in dataset.columns]
+
+
+def _rows(dataset: Dataset, positions: np.ndarray, fields: Optional[list]) -> List[Dict[str, Any]]:
+    rows = to_records(dataset.take(positions, fields), dataset.formats)
+    for row, pos in zip(rows, positions):
+        row["__row"] = int(pos) + 1
+    return rows
+
+
+def _percent(count, total) -> float:
+    return round(float(count) / total * 100, 2) if total else 0.0
+
+
+def _limit(query: Dict[str, Any], key: str, default: int, maximum: int) -> int:
+    try:
+        value = int(query.get(key, default))
+    except (TypeError, ValueError):
+        raise BadQuery(f"{key} must be an integer") from None
+    if not 0 <= value <= maximum:
+        raise BadQuery(f"{key} must be between 0 and {maximum}")
+    return value
+
+
+# --------------------------------------------------
+# operations
+# --------------------------------------------------
+def op_head(dataset: Dataset, query):
+    """First n rows, optionally only some fields."""
+    n = _limit(query, "n", 20, MAX_PAGE_ROWS)
+    return {"rows": _rows(dataset, np.arange(min(n, len(dataset))), _fields(dataset, query))}
+
+
+def op_counts(dataset: Dataset, query):
+    """Value counts of a column, most common first (ties: first seen first)."""
+    col = dataset.column(query.get("column"))
+    limit = _limit(query, "limit", 100, 10_000)
+    text = dataset.display_text(col)
+
+    codes, uniques = pd.factorize(text)
+    counts = np.bincount(codes, minlength=len(uniques))
+    order = np.argsort(-counts, kind="stable")[:limit]
+    total = len(text)
+    return {
+        "total": total,
+        "distinct": len(uniques),
+        "values": [
+            {"value": uniques[i], "count": int(counts[i]), "percent": _percent(counts[i], total)}
+            for i in order
+        ],
+    }
+
+
+def op_buckets(dataset: Dataset, query):
+    """
+    Count numeric values into buckets given by descending lower bounds,
+    e.g. edges [90, 80, 70] -> >=90, >=80, >=70, rest. Optionally returns
+    the first rows_per_bucket rows of each bucket.
+    """
+    col = dataset.column(query.get("column"))
+    edges = [float(e) for e in query.get("edges", [])]
+    if edges != sorted(edges, reverse=True):
+        raise BadQuery("edges must be in descending order")
+    labels = query.get("labels") or [f">= {e:g}" for e in edges] + ["rest"]
+    if len(labels) != len(edges) + 1:
+        raise BadQuery("labels needs one entry per edge plus one for the rest")
+    per_bucket = _limit(query, "rows_per_bucket", 0, MAX_BUCKET_ROWS)
+    fields = _fields(dataset, query)
+
+    values = _values(dataset, col, query.get("scale_fractions", False))
+    numeric = ~np.isnan(values)
+    # bucket i = first edge the value reaches; len(edges) = the rest
+    bucket = np.full(len(values), len(edges))
+    for i in reversed(range(len(edges))):
+        bucket[numeric & (values >= edges[i])] = i
+    bucket[~numeric] = -1
+
+    numeric_count = int(numeric.sum())
+    buckets = []
+    for i, label in enumerate(labels):
+        members = np.flatnonzero(bucket == i)
+        entry = {"label": label, "count": len(members), "percent": _percent(len(members), numeric_count)}
+        if per_bucket:
+            entry["rows"] = _rows(dataset, members[:per_bucket], fields)
+        buckets.append(entry)
+    return {"total": len(values), "numeric": numeric_count, "buckets": buckets}
+
+
+def op_rank(dataset: Dataset, query):
+    """Top (order=desc) or bottom (order=asc) k rows by a numeric column, ties in row order."""
+    col = dataset.column(query.get("column"))
+    k = _limit(query, "k", 6, MAX_PAGE_ROWS)
+    descending = query.get("order", "desc") == "desc"
+
+    values = _values(dataset, col, query.get("scale_fractions", False))
+    positions = np.flatnonzero(~np.isnan(values))
+    numeric = values[positions]
+    if k < len(positions):
+        # argpartition keeps it O(n); the kth-value ties are sorted out below
+        kth = -numeric if descending else numeric
+        threshold = np.partition(kth, k - 1)[k - 1] if k else None
+        if threshold is not None:
+            keep = kth <= threshold
+            positions, numeric = positions[keep], numeric[keep]
+    order = np.lexsort((positions, -numeric if descending else numeric))[:k]
+
+    rows = _rows(dataset, positions[order], _fields(dataset, query))
+    for row, value in zip(rows, numeric[order]):
+        row["__value"] = float(value)
+    return {"numeric": int((~np.isnan(values)).sum()), "rows": rows}
+
+
+AGGREGATIONS = ("mean", "sum", "min", "max", "count")
+
+
+def op_group(dataset: Dataset, query):
+    """A numeric column aggregated per group, groups in first-seen order; blank groups skipped."""
+    by = dataset.column(query.get("by"))
+    col = dataset.column(query.get("column"))
+    agg = query.get("agg", "mean")
+    if agg not in AGGREGATIONS:
+        raise BadQuery(f"agg must be one of {', '.join(AGGREGATIONS)}")
+
+    groups = dataset.display_text(by).to_numpy(dtype=object)
+    values = _values(dataset, col, query.get("scale_fractions", False))
+    keep = (groups != "") & ~np.isnan(values)
+
+    frame = pd.DataFrame({"group": groups[keep], "value": values[keep]})
+    grouped = frame.groupby("group", sort=False)["value"]
+    result = grouped.agg("size" if agg == "count" else agg)
+    sizes = grouped.size()
+    return {
+        "groups": [
+            {"group": g, "value": round(float(result[g]), 4), "count": int(sizes[g])}
+            for g in result.index
+        ]
+    }
+
+
+def op_stats(dataset: Dataset, query):
+    """count/mean/min/max/sum of a numeric column; `below` also counts values under it."""
+    col = dataset.column(query.get("column"))
+    values = _values(dataset, col, query.get("scale_fractions", False))
+    values = values[~np.isnan(values)]
+    result = {"rows": len(dataset), "count": len(values)}
+    if len(values):
+        result.update({
+            "mean": round(float(values.mean()), 4),
+            "min": float(values.min()),
+            "max": float(values.max()),
+            "sum": float(values.sum()),
+        })
+    if query.get("below") is not None:
+        result["below_count"] = int((values < float(query["below"])).sum())
+    return result
+
+
+def op_histogram(dataset: Dataset, query):
+    """Equal-width histogram of a numeric column."""
+    col = dataset.column(query.get("column"))
+    bins = _limit(query, "bins", 10, MAX_HISTOGRAM_BINS) or 1
+    values = _values(dataset, col, query.get("scale_fractions", False))
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"count": 0, "counts": [], "edges": []}
+    counts, edges = np.histogram(values, bins=bins)
+    return {"count": len(values), "counts": counts.tolist(), "edges": edges.tolist()}
+
+
+OPERATIONS: Dict[str, Callable[[Dataset, Dict[str, Any]], Dict[str, Any]]] = {
+    "head": op_head,
+    "counts": op_counts,
+    "buckets": op_buckets,
+    "rank": op_rank,
+    "group": op_group,
+    "stats": op_stats,
+    "histogram": op_histogram,
+}
+
+
+def aggregate(dataset: Dataset, query: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one query (cached per dataset). Raises BadQuery for bad input."""
+    if not isinstance(query, dict):
+        raise BadQuery("Each query must be an object")
+    op = OPERATIONS.get(query.get("op"))
+    if op is None:
+        raise BadQuery(f"op must be one of {sorted(OPERATIONS)}")
+
+    spec = {k: v for k, v in query.items() if k != "id"}
+    key = ("aggregate", json.dumps(spec, sort_keys=True, default=str))
+    result, cached = dataset.memo(key, lambda: op(dataset, query))
+    return {**result, "op": query["op"], "cached": cached}
+
+
+def aggregate_many(dataset: Dataset, queries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Run a batch of queries. A bad query gets {"error": ...} in its slot so
+    one missing column doesn't blank the whole dashboard.
+    """
+    results = []
+    for query in queries:
+        try:
+            result = aggregate(dataset, query)
+        except BadQuery as e:
+            result = {"error": str(e)}
+        if isinstance(query, dict) and "id" in query:
+            result["id"] = query["id"]
+        results.append(result)
+    return results
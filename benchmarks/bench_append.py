@@ -0,0 +1,48 @@
+# benchmarks/bench_append.py
+# Adding rows to a cleaned sheet: re-cleaning everything against cleaning
+# only the new rows with the state saved by the first upload.
+#
+#   python benchmarks/bench_append.py --rows 1000000 --append 10000
+import argparse
+import pickle
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import clean_dataset
+from datagen import student_sheet
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--append", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    sheet = student_sheet(args.rows + max(args.append))
+    base = sheet.iloc[:args.rows]
+    state = {}
+    _, t_base = timed(clean_dataset, base.copy(), state=state)
+    saved = pickle.dumps(state)
+    print(f"first upload: {args.rows} rows in {t_base:.2f}s, state {len(saved) / 1e6:.1f} MB")
+
+    print(f"{'appended':>10} {'re-clean all':>13} {'append only':>12} {'speedup':>8}")
+    for n in args.append:
+        rows = sheet.iloc[:args.rows + n]
+        _, t_all = timed(clean_dataset, rows.copy())
+        _, t_delta = timed(clean_dataset, rows.iloc[args.rows:].copy(), state=pickle.loads(saved))
+        print(f"{n:>10} {t_all:>12.2f}s {t_delta:>11.3f}s {t_all / t_delta:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_compaction.py
+# Memory of a cleaned frame before and after compact_columns (categories
+# for low-cardinality text, downcast numbers), what the pass costs, and how
+# many such datasets fit the DatasetCache budget either way.
+#
+#   python benchmarks/bench_compaction.py --rows 100000 --extra-columns 10
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns
+from datasets import DATASET_CACHE_MB
+from datagen import SHEETS
+
+MB = 1024 * 1024
+
+
+def measure(sheet: str, rows: int, extra_columns: int):
+    df = normalize_columns(SHEETS[sheet](rows, extra_columns=extra_columns))
+    report, started = {}, {}
+    run_full_cleaning_pipeline(df, output_csv=None, inplace=True, compact_report=report,
+                               progress=lambda stage, _: started.setdefault(stage, time.perf_counter()))
+    report["seconds"] = time.perf_counter() - started["compact_columns"]
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--extra-columns", type=int, default=10)
+    args = ap.parse_args()
+    # mixed date formats make pandas warn on every parse
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    print(f"{args.rows} rows, {args.extra_columns} extra columns; cache budget {DATASET_CACHE_MB} MB")
+    print(f"{'sheet':<10} {'before MB':>10} {'after MB':>9} {'smaller':>8} "
+          f"{'fit before':>11} {'fit after':>10} {'pass s':>7}")
+    for sheet in SHEETS:
+        report = measure(sheet, args.rows, args.extra_columns)
+        before, after = report["bytes_before"] / MB, report["bytes_after"] / MB
+        print(f"{sheet:<10} {before:>10.1f} {after:>9.1f} {before / after:>7.1f}x "
+              f"{int(DATASET_CACHE_MB // before):>11} {int(DATASET_CACHE_MB // after):>10} "
+              f"{report['seconds']:>7.3f}")
+        print(f"{'':<10} " + ", ".join(f"{col}: {dtype}" for col, dtype in report["columns"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# benchmarks/bench_dob_age.py
+# clean_dob_age_pair on the DOB / Age columns of a generated sheet
+# (mixed date formats, bad dates, missing and junk ages).
+#
+#   python benchmarks/bench_dob_age.py                    # 10k, 100k, 1M rows
+#   python benchmarks/bench_dob_age.py --rows 1000000 --repeat 3
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import clean_dob_age_pair
+from datagen import student_sheet
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--repeat", type=int, default=1, help="report the best of this many runs")
+    args = ap.parse_args()
+
+    today = pd.Timestamp("2025-06-01")
+    print(f"{'rows':>10} {'seconds':>8} {'rows/s':>12} {'no dob':>8} {'no age':>8}")
+    for n in args.rows:
+        sheet = student_sheet(n)[["DOB", "Age"]]
+        best, out = float("inf"), None
+        for _ in range(args.repeat):
+            df = sheet.copy()
+            start = time.perf_counter()
+            out = clean_dob_age_pair(df, "DOB", "Age", today=today, inplace=True)
+            best = min(best, time.perf_counter() - start)
+        print(f"{n:>10} {best:>8.3f} {n / best:>12,.0f} "
+              f"{int(out['DOB'].isna().sum()):>8} {int(out['Age'].isna().sum()):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_id_column.py
+# Vectorized clean_id_column vs the original per-cell loop.
+#
+#   python benchmarks/bench_id_column.py                  # 10k, 1M, 10M rows
+#   python benchmarks/bench_id_column.py --rows 10000 1000000 --python-max 1000000
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import clean_id_column, _clean_id_column_python
+
+
+def make_ids(n: int, seed: int = 0) -> pd.Series:
+    """Student ids like STU0001 with ~5% missing, ~3% duplicates and some unpadded."""
+    rng = np.random.default_rng(seed)
+    width = len(str(n))
+    ids = pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(width)
+    ids = ("STU" + ids).to_numpy(dtype=object)
+
+    roll = rng.random(n)
+    ids[roll < 0.05] = np.nan
+    dup = (roll >= 0.05) & (roll < 0.08)
+    ids[dup] = ids[rng.integers(0, n, dup.sum())]
+    short = (roll >= 0.08) & (roll < 0.10)
+    ids[short] = "STU" + pd.Series(rng.integers(1, n + 1, short.sum())).astype(str).to_numpy(dtype=object)
+    return pd.Series(ids, dtype=object)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    ap.add_argument("--python-max", type=int, default=1_000_000,
+                    help="skip the per-cell reference above this many rows")
+    args = ap.parse_args()
+
+    print(f"{'rows':>10} {'mode':>9} {'vectorized':>11} {'python':>10} {'speedup':>8}  same")
+    for n in args.rows:
+        ids = make_ids(n)
+        for mode in ("fill", "sequence"):
+            fast, t_fast = timed(clean_id_column, ids, mode=mode)
+            if n <= args.python_max:
+                slow, t_slow = timed(_clean_id_column_python, ids, mode=mode)
+                same = fast.equals(slow)
+                print(f"{n:>10} {mode:>9} {t_fast:>10.3f}s {t_slow:>9.3f}s {t_slow / t_fast:>7.1f}x  {same}")
+            else:
+                print(f"{n:>10} {mode:>9} {t_fast:>10.3f}s {'-':>10} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_parallel_stages.py
+# Wall clock of the cleaning pipeline run one stage at a time against the
+# stage scheduler (scheduler.py) with thread and process pools, on wide
+# generated sheets. Also prints the bound the stage graph puts on any
+# speedup: the sequential total over its critical path (the longest chain
+# of stages that have to wait for each other), whatever the core count.
+#
+#   python benchmarks/bench_parallel_stages.py --rows 100000 --columns 0,40 --workers 2,4,8
+#
+# The pools are started before timing. Check "cores" in the output, a
+# speedup needs at least as many cores as workers.
+import argparse
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns, pipeline_stages
+from scheduler import StageScheduler, stage_graph
+from schema import DatasetSchema
+from datagen import SHEETS
+
+
+def timed_run(raw, scheduler):
+    """Seconds for the whole run, and per stage when it runs one at a time."""
+    df = normalize_columns(raw.copy())
+    schema = DatasetSchema(df)
+    marks = []
+    started = time.perf_counter()
+    run_full_cleaning_pipeline(df, output_csv=None, inplace=True, schema=schema, scheduler=scheduler,
+                               progress=lambda stage, _: marks.append((stage, time.perf_counter())))
+    ended = time.perf_counter()
+    stages = {stage: end - start for (stage, start), (_, end) in zip(marks, marks[1:] + [(None, ended)])}
+    return ended - started, stages
+
+
+def critical_path(raw, stage_seconds) -> float:
+    """Seconds of the slowest chain of dependent stages."""
+    df = normalize_columns(raw.copy())
+    stages = pipeline_stages(df, DatasetSchema(df))
+    finish = []
+    for stage, deps in zip(stages, stage_graph(stages)):
+        finish.append(max((finish[j] for j in deps), default=0.0) + stage_seconds[stage.name])
+    return max(finish)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--columns", default="0,40", help="extra columns added to each sheet, comma-separated")
+    ap.add_argument("--workers", default="2,4,8", help="pool sizes, comma-separated")
+    ap.add_argument("--kinds", default="thread,process")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+    # mixed date formats make pandas warn on every parse (here and in the
+    # pool processes, which read PYTHONWARNINGS when they start)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    os.environ.setdefault("PYTHONWARNINGS", "ignore::UserWarning")
+
+    columns = [int(x) for x in args.columns.split(",") if x.strip()]
+    workers = [int(x) for x in args.workers.split(",") if x.strip()]
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    schedulers = {(kind, n): StageScheduler(n, kind, min_rows=0) for kind in kinds for n in workers}
+    for scheduler in schedulers.values():
+        scheduler.start()  # outside the timings
+
+    print(f"{args.rows} rows, {os.cpu_count()} cores, best of {args.repeat}")
+    print(f"{'sheet':<10} {'columns':>7} {'pool':<12} {'seconds':>8} {'speedup':>8}")
+    try:
+        for sheet in SHEETS:
+            for extra in columns:
+                raw = SHEETS[sheet](args.rows, extra_columns=extra)
+                runs = [timed_run(raw, StageScheduler(1)) for _ in range(args.repeat)]
+                sequential = min(seconds for seconds, _ in runs)
+                stage_seconds = {stage: min(run[stage] for _, run in runs) for stage in runs[0][1]}
+                bound = sum(stage_seconds.values()) / critical_path(raw, stage_seconds)
+                print(f"{sheet:<10} {raw.shape[1]:>7} {'sequential':<12} {sequential:>8.3f} "
+                      f"{'':>8}  (graph allows {bound:.2f}x)")
+                for (kind, n), scheduler in schedulers.items():
+                    seconds = min(timed_run(raw, scheduler)[0] for _ in range(args.repeat))
+                    print(f"{'':<10} {'':>7} {f'{kind} x{n}':<12} {seconds:>8.3f} {sequential / seconds:>7.2f}x")
+    finally:
+        for scheduler in schedulers.values():
+            scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# benchmarks/bench_partitioned.py
+# Wall clock of the cleaning pipeline on long generated sheets, in one
+# piece against row shards (partitioned.py) on thread and process pools,
+# and whether the sharded result is the same frame.
+#
+#   python benchmarks/bench_partitioned.py --rows 2000000 --partition-rows 250000 --workers 2,4,8
+#
+# The pools are started before timing. Check "cores" in the output, a
+# speedup needs at least as many cores as workers.
+import argparse
+import os
+import sys
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns
+from scheduler import StageScheduler
+from datagen import SHEETS
+
+
+def timed_run(raw, scheduler):
+    df = normalize_columns(raw.copy())
+    started = time.perf_counter()
+    out = run_full_cleaning_pipeline(df, output_csv=None, inplace=True, scheduler=scheduler)
+    return time.perf_counter() - started, out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--partition-rows", type=int, default=125_000)
+    ap.add_argument("--workers", default="2,4,8", help="pool sizes, comma-separated")
+    ap.add_argument("--kinds", default="thread,process")
+    ap.add_argument("--repeat", type=int, default=1)
+    args = ap.parse_args()
+    # mixed date formats make pandas warn on every parse (here and in the
+    # pool processes, which read PYTHONWARNINGS when they start)
+    warnings.filterwarnings("ignore", category=UserWarning)
+    os.environ.setdefault("PYTHONWARNINGS", "ignore::UserWarning")
+
+    workers = [int(x) for x in args.workers.split(",") if x.strip()]
+    kinds = [k.strip() for k in args.kinds.split(",") if k.strip()]
+    schedulers = {(kind, n): StageScheduler(n, kind, min_rows=0, partition_rows=args.partition_rows)
+                  for kind in kinds for n in workers}
+    for scheduler in schedulers.values():
+        scheduler.start()  # outside the timings
+
+    print(f"{args.rows} rows, {os.cpu_count()} cores, {args.partition_rows} rows per shard, best of {args.repeat}")
+    print(f"{'sheet':<10} {'pool':<12} {'shards':>6} {'seconds':>8} {'speedup':>8} {'same':>5}")
+    try:
+        for sheet in SHEETS:
+            raw = SHEETS[sheet](args.rows)
+            runs = [timed_run(raw, StageScheduler(1)) for _ in range(args.repeat)]
+            sequential, expected = min(seconds for seconds, _ in runs), runs[0][1]
+            del runs
+            print(f"{sheet:<10} {'one piece':<12} {1:>6} {sequential:>8.3f}")
+            for (kind, n), scheduler in schedulers.items():
+                runs = [timed_run(raw, scheduler) for _ in range(args.repeat)]
+                seconds, out = min(seconds for seconds, _ in runs), runs[0][1]
+                same = out.equals(expected) and list(out.dtypes) == list(expected.dtypes)
+                print(f"{'':<10} {f'{kind} x{n}':<12} {scheduler.shards(len(raw)):>6} {seconds:>8.3f} "
+                      f"{sequential / seconds:>7.2f}x {'yes' if same else 'NO':>5}")
+                del runs, out
+    finally:
+        for scheduler in schedulers.values():
+            scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    main()
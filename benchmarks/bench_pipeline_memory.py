@@ -0,0 +1,50 @@
+# benchmarks/bench_pipeline_memory.py
+# Peak memory of each cleaning stage, copying stages vs. the pipeline owning
+# one frame (inplace=True).
+#
+#   python benchmarks/bench_pipeline_memory.py --rows 200000
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns
+from datagen import student_sheet
+
+
+def measure(rows: int, extra_columns: int, inplace: bool):
+    # trace from before the frame exists so frees of its columns are counted
+    tracemalloc.start()
+    df = normalize_columns(student_sheet(rows, extra_columns=extra_columns))
+    report = []
+    with tempfile.TemporaryDirectory() as tmp:
+        run_full_cleaning_pipeline(df, output_csv=os.path.join(tmp, "out.csv"),
+                                   inplace=inplace, memory_report=report)
+    tracemalloc.stop()
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--extra-columns", type=int, default=10)
+    args = ap.parse_args()
+
+    results = {mode: measure(args.rows, args.extra_columns, mode == "inplace")
+               for mode in ("copy", "inplace")}
+
+    print(f"{args.rows} rows, {14 + args.extra_columns} columns; peak_ratio = peak live / input size")
+    print(f"{'stage':<28} {'copy':>8} {'inplace':>8}")
+    for copy_row, inplace_row in zip(results["copy"], results["inplace"]):
+        print(f"{copy_row['stage']:<28} {copy_row['peak_ratio']:>7.2f}x {inplace_row['peak_ratio']:>7.2f}x")
+    print(f"{'pipeline peak':<28} "
+          f"{max(r['peak_ratio'] for r in results['copy']):>7.2f}x "
+          f"{max(r['peak_ratio'] for r in results['inplace']):>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
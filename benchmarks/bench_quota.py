@@ -0,0 +1,137 @@
+# benchmarks/bench_quota.py
+# Upload-limit checks under load: 200 uploads at once against the SQLite
+# counts (threads, then processes sharing the file) and the old
+# read-modify-write of upload_limits.json. Prints the counts each ended up
+# with, checks per second under the storm (wall time over checks, so the
+# cost of a check rather than how long 200 threads wait for the GIL) and
+# the latency of one check with nothing else running.
+#
+#   python benchmarks/bench_quota.py --uploads 200 --rounds 5
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quotas import SQLiteCounts, TokenBucket
+
+
+def json_acquire(path: Path, key: str, limit):
+    # the old load_upload_limits / save_upload_limits pair, no locking
+    counts = json.loads(path.read_text()) if path.exists() else {}
+    if limit is not None and counts.get(key, 0) >= limit:
+        return False
+    counts[key] = counts.get(key, 0) + 1
+    path.write_text(json.dumps(counts))
+    return True
+
+
+def storm(acquire, uploads: int, rounds: int, users: int, warm=None):
+    """
+    uploads threads, released together, each making `rounds` uploads.
+    warm() runs in each thread first (a server's threads are reused, so
+    opening a connection is not part of a check).
+    """
+    barrier = threading.Barrier(uploads)
+    granted = [0] * uploads
+
+    def attempt(key, limit):
+        try:
+            return acquire(key, limit)
+        except (ValueError, OSError):  # the JSON file caught mid-write
+            return False
+
+    def upload(i):
+        if warm:
+            warm()
+        barrier.wait()
+        for r in range(rounds):
+            granted[i] += attempt(f"user{(i + r) % users}@x.com", None)
+            # one guest key with a limit of 1: only one of all these may pass
+            attempt("guest@x.com", 1)
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(uploads)]
+    for t in threads:
+        t.start()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    return wall, sum(granted)
+
+
+def alone(acquire, n: int = 2000):
+    """ms per check, one thread, nothing else running."""
+    ms = []
+    for i in range(n):
+        start = time.perf_counter()
+        acquire(f"solo{i % 20}@x.com", None)
+        ms.append((time.perf_counter() - start) * 1000)
+    return np.array(ms)
+
+
+def process_part(db: str, uploads: int, rounds: int, users: int):
+    counts = SQLiteCounts(db)
+    return storm(counts.acquire, uploads, rounds, users, warm=lambda: counts.count(""))
+
+
+def report(name, checks, wall, counted, expected, guest, ms):
+    print(f"{name:<22} {counted:>6}/{expected:<6} {guest:>5} {checks / wall:>10.0f}/s "
+          f"{np.percentile(ms, 50):>8.3f} {np.percentile(ms, 99):>8.3f}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--uploads", type=int, default=200, help="concurrent uploads")
+    ap.add_argument("--rounds", type=int, default=5, help="uploads each one makes")
+    ap.add_argument("--users", type=int, default=20)
+    ap.add_argument("--processes", type=int, default=4)
+    args = ap.parse_args()
+    expected = args.uploads * args.rounds
+    checks = expected * 2  # every upload also tries the guest key
+    users = [f"user{i}@x.com" for i in range(args.users)]
+    print(f"{'backend':<22} {'counted':>13} {'guest':>5} {'storm':>12} {'p50 ms':>8} {'p99 ms':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "upload_limits.json"
+        acquire = lambda k, l: json_acquire(path, k, l)
+        wall, _ = storm(acquire, args.uploads, args.rounds, args.users)
+        try:
+            counts = json.loads(path.read_text())
+        except ValueError:
+            counts = {}  # the last write was torn: every count is gone
+        path.unlink()  # may be left half-written
+        report("json file (old)", checks, wall, sum(counts.get(u, 0) for u in users), expected,
+               counts.get("guest@x.com", 0), alone(acquire))
+
+        db = SQLiteCounts(Path(tmp) / "threads.sqlite3")
+        wall, _ = storm(db.acquire, args.uploads, args.rounds, args.users, warm=lambda: db.count(""))
+        report("sqlite, threads", checks, wall, sum(db.count(u) for u in users), expected,
+               db.count("guest@x.com"), alone(db.acquire))
+
+        # the same file from several worker processes at once
+        shared = Path(tmp) / "processes.sqlite3"
+        SQLiteCounts(shared)
+        per = args.uploads // args.processes
+        with ProcessPoolExecutor(args.processes) as pool:
+            parts = list(pool.map(process_part, [str(shared)] * args.processes, [per] * args.processes,
+                                  [args.rounds] * args.processes, [args.users] * args.processes))
+        db = SQLiteCounts(shared)
+        report(f"sqlite, {args.processes} processes", per * args.processes * args.rounds * 2,
+               max(wall for wall, _ in parts), sum(db.count(u) for u in users),
+               per * args.processes * args.rounds, db.count("guest@x.com"), alone(db.acquire))
+
+        bucket = TokenBucket(size=args.rounds, seconds=3600)
+        wall, granted = storm(bucket.acquire, args.uploads, args.rounds, args.users)
+        report("guest token bucket", checks, wall, granted, args.users * args.rounds, "-", alone(TokenBucket(size=10**9, seconds=1).acquire))
+
+
+if __name__ == "__main__":
+    main()
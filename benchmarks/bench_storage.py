@@ -0,0 +1,104 @@
+# benchmarks/bench_storage.py
+# Saving the cleaned upload: the old JSON + pickle pair against the stores
+# in storage.py (Feather) and Parquet. Feather and Parquet need pyarrow and
+# are skipped without it.
+#
+#   python benchmarks/bench_storage.py --rows 200000
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns
+from datagen import student_sheet
+from storage import FeatherStore, PickleStore, arrow_table, pa
+
+if pa is not None:
+    import pyarrow.parquet as pq
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def json_and_pickle(df, tmp: Path, column: str, page):
+    json_path, pkl_path = tmp / "last_upload.json", tmp / "last_upload.pkl"
+    store = PickleStore(pkl_path)
+    return {
+        "write": timed(lambda: (df.to_json(json_path, orient="records"), store.write(df))),
+        "read": timed(store.read),
+        "read_column": timed(lambda: store.read([column])),
+        "columns": timed(store.columns),
+        "num_rows": timed(store.num_rows),
+        "page": timed(lambda: store.take(page)),
+        "bytes": json_path.stat().st_size + pkl_path.stat().st_size,
+    }
+
+
+def feather(df, tmp: Path, column: str, page):
+    store = FeatherStore(tmp / "last_upload.feather")
+    return {
+        "write": timed(lambda: store.write(df)),
+        "read": timed(store.read),
+        "read_column": timed(lambda: store.read([column])),
+        "columns": timed(store.columns),
+        "num_rows": timed(store.num_rows),
+        "page": timed(lambda: store.take(page)),
+        "bytes": store.path.stat().st_size,
+    }
+
+
+def parquet(df, tmp: Path, column: str, page):
+    path = tmp / "last_upload.parquet"
+    return {
+        "write": timed(lambda: pq.write_table(arrow_table(df), path)),
+        "read": timed(lambda: pq.read_table(path).to_pandas()),
+        "read_column": timed(lambda: pq.read_table(path, columns=[column]).to_pandas()),
+        "columns": timed(lambda: pq.read_schema(path).names),
+        "num_rows": timed(lambda: pq.read_metadata(path).num_rows),
+        "page": timed(lambda: pq.read_table(path).take(pa.array(page)).to_pandas()),
+        "bytes": path.stat().st_size,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--extra-columns", type=int, default=10)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        df = run_full_cleaning_pipeline(
+            normalize_columns(student_sheet(args.rows, extra_columns=args.extra_columns)),
+            output_csv=os.path.join(tmp, "out.csv"), inplace=True,
+        )
+        column = "marks" if "marks" in df.columns else str(df.columns[0])
+        # a /rows page: 100 rows from anywhere in the frame
+        page = np.sort(np.random.default_rng(0).choice(len(df), min(100, len(df)), replace=False))
+
+        formats = {"json+pickle": json_and_pickle}
+        if pa is not None:
+            formats.update({"feather": feather, "parquet": parquet})
+        results = {name: run(df, tmp, column, page) for name, run in formats.items()}
+
+    print(f"{len(df)} cleaned rows, {len(df.columns)} columns; times in seconds")
+    if pa is None:
+        print("pyarrow is not installed: only the old format was measured")
+    print(f"{'format':<12} {'write':>8} {'read':>8} {'1 column':>9} {'columns':>8} {'rows':>8} "
+          f"{'page':>8} {'size MB':>8}")
+    for name, r in results.items():
+        print(f"{name:<12} {r['write']:>8.3f} {r['read']:>8.3f} {r['read_column']:>9.3f} "
+              f"{r['columns']:>8.4f} {r['num_rows']:>8.4f} {r['page']:>8.4f} {r['bytes'] / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
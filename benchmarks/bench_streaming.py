@@ -0,0 +1,76 @@
+# benchmarks/bench_streaming.py
+# Records for /upload?data=true: the old body (to_records, then json.dumps
+# of the whole list) against the streamed one (batches encoded straight
+# from the frame), with time to the first 64 KB sent, total time and peak
+# memory for each, plus what gzip makes of the stream. Memory is traced in a
+# second pass (tracemalloc slows everything down).
+#
+#   python benchmarks/bench_streaming.py --rows 100000 500000
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import streaming
+from cleaning import clean_dataset
+from datagen import student_sheet
+from datasets import to_records
+
+
+def old_body(df):
+    yield json.dumps({"rows": len(df), "data": to_records(df)}).encode()
+
+
+FIRST_BYTES = 64 * 1024
+
+
+def timed(chunks):
+    """(seconds until FIRST_BYTES were produced, total seconds, bytes)."""
+    start = time.perf_counter()
+    first, size = None, 0
+    for chunk in chunks:
+        size += len(chunk)
+        if first is None and size >= FIRST_BYTES:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start, size
+
+
+def peak_mb(chunks) -> float:
+    tracemalloc.start()
+    for _ in chunks:
+        pass
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 500_000])
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"encoder: {'orjson' if streaming.orjson is not None else 'pandas to_json'}")
+    print(f"{'rows':>8} {'body':<20} {'first 64K':>10} {'total':>8} {'MB':>7} {'peak MB':>8}")
+    for n in args.rows:
+        df = clean_dataset(student_sheet(n))
+        head = {"rows": len(df)}
+        cases = [
+            ("to_records + dumps", lambda: old_body(df)),
+            ("json-stream", lambda: streaming.json_chunks(df, head)),
+            ("ndjson", lambda: streaming.ndjson_chunks(df, head)),
+            ("json-stream + gzip", lambda: streaming.compressed(streaming.json_chunks(df, head), "gzip")),
+        ]
+        for name, chunks in cases:
+            first, total, size = timed(chunks())
+            peak = peak_mb(chunks())
+            print(f"{n:>8} {name:<20} {first:>9.3f}s {total:>7.2f}s {size / 1e6:>7.1f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+# benchmarks/bench_suite.py
+# How run_full_cleaning_pipeline scales: every stage timed on generated
+# student and employee sheets at several row and column counts, with the
+# peak memory of each stage. Results are saved as JSON named after the
+# commit, so a later run can be compared against them.
+#
+#   python benchmarks/bench_suite.py --rows 10000,100000 --columns 0,20
+#   python benchmarks/bench_suite.py --compare benchmarks/results/<commit>.json
+#
+# Times are the best of --repeat runs, taken without tracemalloc (it slows
+# pandas down several times); memory comes from one extra traced run.
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np
+import pandas as pd
+
+from cleaning import run_full_cleaning_pipeline, normalize_columns
+from schema import DatasetSchema
+from datagen import SHEETS
+
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_info(args) -> dict:
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+    }
+
+
+def timed_run(raw: pd.DataFrame) -> dict:
+    """Seconds per stage for one pipeline run on a copy of raw."""
+    df = normalize_columns(raw.copy())
+    marks = []
+
+    started = time.perf_counter()
+    schema = DatasetSchema(df)
+    marks.append(("detect_schema", started))
+    run_full_cleaning_pipeline(df, output_csv=None, inplace=True, schema=schema,
+                               progress=lambda stage, rows: marks.append((stage, time.perf_counter())))
+    marks.append((None, time.perf_counter()))
+
+    return {stage: end - start for (stage, start), (_, end) in zip(marks, marks[1:])}
+
+
+def traced_run(raw: pd.DataFrame) -> list:
+    """memory_report entries of one run, traced from before its frame exists."""
+    tracemalloc.start()
+    df = normalize_columns(raw.copy())
+    report = []
+    run_full_cleaning_pipeline(df, output_csv=None, inplace=True, memory_report=report)
+    tracemalloc.stop()
+    return report
+
+
+def measure(sheet: str, rows: int, extra_columns: int, repeat: int, seed: int) -> dict:
+    raw = SHEETS[sheet](rows, seed=seed, extra_columns=extra_columns)
+    runs = [timed_run(raw) for _ in range(repeat)]
+    memory = {entry["stage"]: entry for entry in traced_run(raw)}
+
+    stages = []
+    for stage in runs[0]:
+        entry = {"stage": stage, "seconds": round(min(run[stage] for run in runs), 4)}
+        if stage in memory:
+            entry["peak_mb"] = memory[stage]["peak_mb"]
+            entry["peak_ratio"] = memory[stage]["peak_ratio"]
+        stages.append(entry)
+
+    total = min(sum(run.values()) for run in runs)
+    return {
+        "sheet": sheet,
+        "rows": rows,
+        "columns": raw.shape[1],
+        "input_mb": round(raw.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+        "seconds": round(total, 4),
+        "rows_per_second": round(rows / total) if total else None,
+        "peak_ratio": max((m["peak_ratio"] for m in memory.values()), default=None),
+        "stages": stages,
+    }
+
+
+def config_key(result: dict) -> tuple:
+    return result["sheet"], result["rows"], result["columns"]
+
+
+def print_results(results: list):
+    for result in results:
+        print(f"\n{result['sheet']}: {result['rows']} rows x {result['columns']} columns "
+              f"({result['input_mb']} MB), {result['seconds']:.3f}s, "
+              f"{result['rows_per_second']} rows/s, peak {result['peak_ratio']}x input")
+        print(f"  {'stage':<28} {'seconds':>9} {'peak MB':>9} {'peak':>7}")
+        for stage in result["stages"]:
+            peak_mb = f"{stage['peak_mb']:>9.2f}" if "peak_mb" in stage else f"{'':>9}"
+            ratio = f"{stage['peak_ratio']:>6.2f}x" if "peak_ratio" in stage else f"{'':>7}"
+            print(f"  {stage['stage']:<28} {stage['seconds']:>9.4f} {peak_mb} {ratio}")
+
+
+def compare(results: list, baseline_path: Path, threshold: float) -> int:
+    """
+    Print new/old time and peak ratios per configuration and stage. Returns
+    how many configurations got slower (or grew peak memory) past threshold.
+    """
+    with open(baseline_path, "r") as f:
+        baseline = json.load(f)
+    old = {config_key(r): r for r in baseline["results"]}
+    print(f"\ncompared with {baseline_path} (commit {baseline['run'].get('commit')}); "
+          f"ratio = new / old, ! = over {threshold:.2f}")
+
+    regressions = 0
+    for result in results:
+        before = old.get(config_key(result))
+        if before is None:
+            print(f"\n{result['sheet']} {result['rows']}x{result['columns']}: not in baseline")
+            continue
+        time_ratio = result["seconds"] / before["seconds"] if before["seconds"] else float("nan")
+        peak_ratio = (result["peak_ratio"] / before["peak_ratio"]
+                      if result["peak_ratio"] and before["peak_ratio"] else float("nan"))
+        regressed = time_ratio > threshold or peak_ratio > threshold
+        regressions += regressed
+        print(f"\n{result['sheet']} {result['rows']}x{result['columns']}: "
+              f"time {time_ratio:.2f}x, peak {peak_ratio:.2f}x{'  !' if regressed else ''}")
+
+        old_stages = {s["stage"]: s for s in before["stages"]}
+        for stage in result["stages"]:
+            prev = old_stages.get(stage["stage"])
+            if prev is None or not prev["seconds"]:
+                continue
+            ratio = stage["seconds"] / prev["seconds"]
+            flag = "  !" if ratio > threshold and stage["seconds"] - prev["seconds"] > 0.01 else ""
+            print(f"  {stage['stage']:<28} {prev['seconds']:>9.4f} -> {stage['seconds']:>9.4f}  {ratio:>5.2f}x{flag}")
+    return regressions
+
+
+def int_list(text: str) -> list:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sheets", default=",".join(SHEETS), help="comma-separated: " + ", ".join(SHEETS))
+    ap.add_argument("--rows", type=int_list, default=[10_000, 100_000])
+    ap.add_argument("--columns", type=int_list, default=[0, 20], help="extra columns added to each sheet")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, help="results file (default benchmarks/results/<commit>.json)")
+    ap.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    ap.add_argument("--threshold", type=float, default=1.2,
+                    help="new/old ratio counted as a regression (exit status 1)")
+    args = ap.parse_args()
+    # mixed date formats make pandas warn on every parse
+    warnings.filterwarnings("ignore", category=UserWarning)
+
+    sheets = [s.strip() for s in args.sheets.split(",") if s.strip()]
+    unknown = [s for s in sheets if s not in SHEETS]
+    if unknown:
+        ap.error(f"unknown sheet(s): {', '.join(unknown)}")
+
+    results = []
+    for sheet in sheets:
+        for rows in args.rows:
+            for extra_columns in args.columns:
+                results.append(measure(sheet, rows, extra_columns, args.repeat, args.seed))
+    print_results(results)
+
+    info = run_info(args)
+    out = args.out or RESULTS_DIR / f"{info['commit'] or 'results'}{'-dirty' if info['dirty'] else ''}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"run": info, "results": results}, f, indent=2)
+    print(f"\nsaved {out}")
+
+    if args.compare:
+        if compare(results, args.compare, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_upload_cache.py
+# A repeated upload: parsing and cleaning the CSV again against hashing the
+# body and reading the cleaned frame back from the upload cache.
+#
+#   python benchmarks/bench_upload_cache.py --rows 100000 1000000
+import argparse
+import hashlib
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from datagen import student_sheet
+from upload_cache import UploadCache
+from workers import parse_and_clean
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"{'rows':>10} {'MB':>7} {'clean':>8} {'hash':>7} {'hit':>7} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = UploadCache(Path(tmp) / "cache", 1 << 40)
+        for n in args.rows:
+            csv = Path(tmp) / f"sheet_{n}.csv"
+            student_sheet(n).to_csv(csv, index=False)
+
+            (df, stats, state), t_clean = timed(parse_and_clean, csv)
+            key, t_hash = timed(lambda: cache.key(file_hash(csv)))
+            cache.put(key, df, {"ingest": stats, "schema": None, "state": state})
+            _, t_hit = timed(lambda: cache.get(key).store.read())
+            t_repeat = t_hash + t_hit
+            print(f"{n:>10} {csv.stat().st_size / 1e6:>7.1f} {t_clean:>7.2f}s {t_hash:>6.3f}s "
+                  f"{t_hit:>6.3f}s {t_clean / t_repeat:>7.0f}x")
+        print(cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+# benchmarks/datagen.py
+# Seeded generators for dirty student and employee sheets, shaped like the
+# CSVs users upload: messy ids, mixed gender spellings, mixed date formats,
+# "85/100" attendance, missing emails.
+import numpy as np
+import pandas as pd
+
+
+FIRST_NAMES = ["John", "Amit", "Rahul", "Anita", "Priya", "Vikram", "Sara", "Li", "Maria", "Omar",
+               "Kavya", "Arjun", "Neha", "Ravi", "Fatima", "Chen"]
+LAST_NAMES = ["Smith", "Kumar", "Rao", "Verma", "Singh", "Lee", "Khan", "Patel", "Garcia", "Iyer"]
+
+
+def _pick(rng, values, n, p=None):
+    return rng.choice(np.asarray(values, dtype=object), n, p=p)
+
+
+def _names(rng, n):
+    # first + random three-letter middle + last: mostly unique, like a real roster
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"), dtype=object)
+    middle = (_pick(rng, letters, n) + _pick(rng, letters, n) + _pick(rng, letters, n))
+    middle = pd.Series(middle).str.capitalize().to_numpy(dtype=object)
+    return _pick(rng, FIRST_NAMES, n) + " " + middle + " " + _pick(rng, LAST_NAMES, n)
+
+
+def _dates(rng, n, start_year, end_year, bad=0.1):
+    years = rng.integers(start_year, end_year, n)
+    months = rng.integers(1, 13, n)
+    days = rng.integers(1, 29, n)
+    y, m, d = (pd.Series(a).astype(str) for a in (years, months, days))
+    m2, d2 = m.str.zfill(2), d.str.zfill(2)
+    formats = np.stack([
+        (y + "-" + m2 + "-" + d2).to_numpy(dtype=object),     # ISO
+        (d2 + "/" + m2 + "/" + y).to_numpy(dtype=object),     # day first
+        (d + " " + pd.Series(pd.to_datetime(m, format="%m").dt.strftime("%b")) + " " + y).to_numpy(dtype=object),
+    ])
+    out = formats[rng.integers(0, len(formats), n), np.arange(n)]
+    roll = rng.random(n)
+    out[roll < bad / 2] = ""
+    out[(roll >= bad / 2) & (roll < bad)] = "not a date"
+    return out
+
+
+def _emails(rng, names, domain, missing=0.35):
+    emails = pd.Series(names).str.lower().str.replace(" ", ".", regex=False) + "@" + domain
+    emails = emails.to_numpy(dtype=object)
+    roll = rng.random(len(names))
+    emails[roll < missing] = ""                                          # missing
+    emails[(roll >= missing) & (roll < missing + 0.03)] = "bad@@mail"    # invalid
+    return emails
+
+
+def student_sheet(rows: int, seed: int = 0, extra_columns: int = 0) -> pd.DataFrame:
+    """
+    A dirty student sheet with `rows` rows. `extra_columns` adds low-cardinality
+    text columns (club_1, club_2, ...) to make the sheet wider.
+    """
+    rng = np.random.default_rng(seed)
+    n = rows
+
+    width = len(str(n))
+    ids = ("STU" + pd.Series(np.arange(1, n + 1)).astype(str).str.zfill(width)).to_numpy(dtype=object)
+    roll = rng.random(n)
+    ids[roll < 0.04] = np.nan                                            # missing
+    dup = (roll >= 0.04) & (roll < 0.06)
+    ids[dup] = ids[rng.integers(0, n, dup.sum())]                        # duplicated
+    short = (roll >= 0.06) & (roll < 0.08)
+    ids[short] = "STU" + pd.Series(rng.integers(1, n + 1, short.sum())).astype(str).to_numpy(dtype=object)
+
+    dob = _dates(rng, n, 1995, 2012)
+    age = _pick(rng, [str(a) for a in range(10, 30)] + ["", "abc", "200", "-3"], n)
+    # rows without a usable DOB always get a usable age
+    bad_dob = np.isin(dob, ["", "not a date"])
+    age[bad_dob] = _pick(rng, [str(a) for a in range(10, 30)], bad_dob.sum())
+
+    names = _names(rng, n)
+    emails = _emails(rng, names, "school.edu")
+
+    df = pd.DataFrame({
+        "Student ID": ids,
+        "Name": names,
+        "Class": _pick(rng, ["9", "10", "11", "12"], n),
+        "Section": _pick(rng, ["A", "B", "C", "D"], n),
+        "Gender": _pick(rng, ["M", "male", "Female", "f", "girl", "boy", "", "FEMALE ", "man", "x"], n),
+        "DOB": dob,
+        "Age": age,
+        "Subject": _pick(rng, ["Maths", "Physics", "History", "English", "Biology"], n),
+        "Marks": _pick(rng, ["55", "NA", "78%", "", "-", "120", "33.3", "91"], n),
+        "CGPA": _pick(rng, ["3.2", "4.5", "", "2.9", "3.9"], n),
+        "Attendance": _pick(rng, ["85/100", "92%", "77", "", "101", "abc", "66.5 %", "45/50"], n),
+        "Email": emails,
+        "Joining Date": _dates(rng, n, 2019, 2025, bad=0.2),
+        "Result": _pick(rng, ["Pass", "Fail"], n),
+    })
+    for i in range(extra_columns):
+        df[f"club_{i + 1}"] = _pick(rng, ["chess", "music", "robotics", "drama"], n)
+    return df
+
+
+def employee_sheet(rows: int, seed: int = 0, extra_columns: int = 0) -> pd.DataFrame:
+    """
+    A dirty employee sheet with `rows` rows: ids written several ways,
+    "22/26" attendance in days, salaries with currency signs and commas.
+    `extra_columns` adds low-cardinality text columns (skill_1, ...).
+    """
+    rng = np.random.default_rng(seed)
+    n = rows
+
+    width = len(str(n))
+    numbers = pd.Series(np.arange(1, n + 1)).astype(str)
+    ids = ("EMP-" + numbers.str.zfill(width)).to_numpy(dtype=object)
+    roll = rng.random(n)
+    ids[roll < 0.03] = np.nan                                            # missing
+    dup = (roll >= 0.03) & (roll < 0.05)
+    ids[dup] = ids[rng.integers(0, n, dup.sum())]                        # duplicated
+    loose = (roll >= 0.05) & (roll < 0.09)
+    ids[loose] = ("emp" + numbers[loose]).to_numpy(dtype=object)         # no dash, no padding
+
+    dob = _dates(rng, n, 1965, 2003)
+    age = _pick(rng, [str(a) for a in range(21, 60)] + ["", "n/a", "150"], n)
+    bad_dob = np.isin(dob, ["", "not a date"])
+    age[bad_dob] = _pick(rng, [str(a) for a in range(21, 60)], bad_dob.sum())
+
+    names = _names(rng, n)
+    salary = rng.integers(30, 200, n) * 1000
+    salary_text = np.stack([
+        pd.Series(salary).astype(str).to_numpy(dtype=object),
+        pd.Series(salary).map("{:,}".format).to_numpy(dtype=object),
+        ("$" + pd.Series(salary).astype(str)).to_numpy(dtype=object),
+    ])[rng.integers(0, 3, n), np.arange(n)]
+    salary_text[rng.random(n) < 0.05] = ""
+
+    df = pd.DataFrame({
+        "Emp ID": ids,
+        "Name": names,
+        "Department": _pick(rng, ["Sales", "Engineering", "HR", "Finance", "Support"], n),
+        "Sex": _pick(rng, ["M", "Male", "female", "F", "woman", "", " MALE", "other"], n),
+        "DOB": dob,
+        "Age": age,
+        "Email": _emails(rng, names, "company.com", missing=0.2),
+        "Joining Date": _dates(rng, n, 2005, 2025, bad=0.15),
+        "End Date": _dates(rng, n, 2015, 2026, bad=0.6),
+        "Attendance": _pick(rng, ["22/26", "26/26", "95%", "", "24", "abc", "18/26", "30/26"], n),
+        "Salary": salary_text,
+        "Rating": _pick(rng, ["1", "2", "3", "4", "5", "", "NA"], n),
+    })
+    for i in range(extra_columns):
+        df[f"skill_{i + 1}"] = _pick(rng, ["python", "excel", "sql", "sap"], n)
+    return df
+
+
+# name -> generator, for benchmarks that take --sheet
+SHEETS = {
+    "student": student_sheet,
+    "employee": employee_sheet,
+}
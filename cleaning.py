@@ -1,14 +1,25 @@
 import csv
 import re
+import sys
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from collections import Counter
 from datetime import datetime
-import calendar
 from dateutil import parser as dateutil_parser
 from typing import Tuple, Dict, Any, Optional
+import logging
+import threading
 import warnings
+import time
+import tracemalloc
+
+from schema import DatasetSchema
+from display import set_format, text_frame
+from scheduler import Stage, default_scheduler
+from metrics import span
+
+logger = logging.getLogger(__name__)
 
 # Read the CSV file
 # df = pd.read_csv("student_data.csv")
@@ -30,6 +41,59 @@ def remove_duplicates(df):
     return df.reset_index(drop=True)
 
 
+# Same result as df.fillna(""), but with inplace=True only the columns that
+# actually have missing values are rebuilt instead of copying the whole frame.
+def fill_blank(df, inplace=False):
+    if not inplace:
+        return df.fillna("")
+    for col in df.columns:
+        if df[col].isna().any():
+            df[col] = df[col].fillna("")
+    return df
+
+
+class UniqueCalls(threading.local):
+    """
+    Tally of map_uniques for the current thread: rows mapped and func calls
+    actually made. rows - calls is what a per-cell .apply would have added.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.calls = 0
+
+    def snapshot(self) -> Tuple[int, int]:
+        return self.rows, self.calls
+
+
+unique_calls = UniqueCalls()
+
+
+def map_uniques(series: pd.Series, func) -> pd.Series:
+    """
+    series.apply(func) for a pure func, calling it once per distinct value
+    instead of once per cell, so the cost follows the column's cardinality.
+    Missing values are handed to func as they are, once per kind (None,
+    NaN, NaT, pd.NA).
+    """
+    codes, uniques = pd.factorize(series)
+    values = list(uniques)
+
+    na = codes < 0
+    if na.any():
+        missing = series.array[na]
+        kind_codes, _ = pd.factorize(np.array([type(v) for v in missing], dtype=object))
+        first_of_kind = np.unique(kind_codes, return_index=True)[1]
+        codes = codes.copy()
+        codes[na] = len(values) + kind_codes
+        values += [missing[i] for i in first_of_kind]
+
+    mapped = pd.Series([func(v) for v in values])
+    unique_calls.rows += len(series)
+    unique_calls.calls += len(values)
+    return pd.Series(mapped.array.take(codes), index=series.index, name=series.name)
+
+
 
 #show the dataset
  
@@ -47,7 +111,249 @@ def split_order(order: Any) -> Tuple[str, Optional[int], str, int]:
         return (s, None, "", 0)
 
 
+_ORDER_RE = re.compile(r"(\d+)")
+_SPLIT_MAX_WIDTH = 64       # longer strings are split with the regex instead
+_SPLIT_BLOCK = 250_000      # strings per code-point matrix block
+
+
+def _split_uniques_regex(uniques: np.ndarray):
+    matches = [_ORDER_RE.search(u) for u in uniques]
+    prefix = np.array([u[:m.start(1)] if m else u for u, m in zip(uniques, matches)], dtype=object)
+    suffix = np.array([u[m.end(1):] if m else "" for u, m in zip(uniques, matches)], dtype=object)
+    digits = [m.group(1) if m else "" for m in matches]
+    if not all(d.isascii() for d in digits):
+        return None
+    width = np.fromiter((len(d) for d in digits), dtype=np.int64, count=len(digits))
+    if len(width) and width.max() > 15:
+        return None
+    num = np.array([int(d) if d else np.nan for d in digits], dtype=np.float64)
+    return prefix, num, suffix, width
+
+
+def _split_uniques_matrix(uniques: np.ndarray):
+    """
+    split_order over an array of strings without a Python loop: the strings
+    are viewed as a (rows, width) matrix of uint32 code points, the first
+    run of ASCII digits is located with argmax, and prefix/suffix are cut
+    out by masking and shifting code points.
+    """
+    text = uniques.astype(str)
+    width_max = text.dtype.itemsize // 4
+    n = len(text)
+    if width_max == 0:
+        return (np.full(n, "", dtype=object), np.full(n, np.nan),
+                np.full(n, "", dtype=object), np.zeros(n, dtype=np.int64))
+
+    cp = text.view(np.uint32).reshape(n, width_max)
+
+    # \d also matches non-ASCII digits; those go through the per-cell path
+    wide = np.unique(cp[cp > 127])
+    if any(_ORDER_RE.match(chr(c)) for c in wide):
+        return None
+
+    cols = np.arange(width_max)
+    is_digit = (cp >= 48) & (cp <= 57)
+    has = is_digit.any(axis=1)
+    start = np.where(has, is_digit.argmax(axis=1), width_max)
+    after = (cols >= start[:, None]) & ~is_digit
+    end = np.where(after.any(axis=1), after.argmax(axis=1), width_max)
+    end = np.where(has, end, width_max)
+    width = np.where(has, end - start, 0)
+    if width.max() > 15:
+        return None
+
+    in_num = (cols >= start[:, None]) & (cols < end[:, None])
+    power = np.power(10, np.clip(end[:, None] - 1 - cols, 0, 15), dtype=np.int64)
+    num = np.where(in_num, (cp.astype(np.int64) - 48) * power, 0).sum(axis=1)
+    num = np.where(has, num.astype(np.float64), np.nan)
+
+    def to_str(points):
+        # trailing NULs are dropped when viewing back as a numpy unicode string
+        points = np.ascontiguousarray(points, dtype=np.uint32)
+        return points.view(f"<U{width_max}").ravel().astype(object)
+
+    prefix = to_str(np.where(cols < start[:, None], cp, 0))
+    shift = cols + end[:, None]
+    suffix = to_str(np.where(shift < width_max,
+                             np.take_along_axis(cp, np.minimum(shift, width_max - 1), axis=1), 0))
+    return prefix, num, suffix, width.astype(np.int64)
+
+
+def _split_uniques(uniques: np.ndarray):
+    if len(uniques) == 0 or max(map(len, uniques)) > _SPLIT_MAX_WIDTH:
+        return _split_uniques_regex(uniques)
+    blocks = []
+    for lo in range(0, len(uniques), _SPLIT_BLOCK):
+        block = _split_uniques_matrix(uniques[lo:lo + _SPLIT_BLOCK])
+        if block is None:
+            return None
+        blocks.append(block)
+    return tuple(np.concatenate(part) for part in zip(*blocks))
+
+
+def _split_order_frame(series: pd.Series) -> Optional[pd.DataFrame]:
+    """
+    Vectorized split_order: one row per value with prefix, num, suffix, width.
+    Each distinct value is split once and the parts are broadcast back with
+    the factorize codes. num is float64 with NaN where split_order returns
+    None. Returns None when the digits can't be held exactly (more than 15
+    digits, or non-ASCII digits) so the caller can use the per-cell path.
+    """
+    na = series.isna().to_numpy()
+    text = series.astype(object).where(~na, "").astype(str)
+    codes, uniques = pd.factorize(text)
+
+    parts = _split_uniques(np.asarray(uniques, dtype=object))
+    if parts is None:
+        return None
+    u_prefix, u_num, u_suffix, u_width = parts
+
+    prefix = u_prefix.take(codes)
+    prefix[na] = ""
+    num = u_num.take(codes)
+    num[na] = np.nan
+    width = u_width.take(codes)
+    width[na] = 0
+
+    return pd.DataFrame({"prefix": prefix, "num": num, "suffix": u_suffix.take(codes), "width": width})
+
+
+def _most_common(values: np.ndarray) -> str:
+    # Counter.most_common(1) order: highest count, ties go to first seen
+    codes, uniques = pd.factorize(values)
+    return uniques[np.bincount(codes).argmax()]
+
+
+def _first_unused(start: int, used: np.ndarray, count: int) -> np.ndarray:
+    """The `count` smallest integers >= start that are not in `used`."""
+    # at most len(used) slots in the window can be taken, so it always has room
+    span = count + len(used)
+    taken = np.zeros(span, dtype=bool)
+    offset = used - start
+    taken[offset[(offset >= 0) & (offset < span)]] = True
+    return start + np.flatnonzero(~taken)[:count]
+
+
+def _label_hashes(prefix: np.ndarray, num: np.ndarray, suffix: np.ndarray) -> np.ndarray:
+    """One uint64 per prefix/num/suffix id label, to find ids seen in earlier uploads."""
+    labels = pd.DataFrame({"prefix": prefix, "num": num.astype(np.float64), "suffix": suffix})
+    return pd.util.hash_pandas_object(labels, index=False).to_numpy()
+
+
+def _in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    """np.isin(values, sorted_values) for a sorted second array."""
+    pos = np.searchsorted(sorted_values, values)
+    found = np.zeros(len(values), dtype=bool)
+    inside = pos < len(sorted_values)
+    found[inside] = sorted_values[pos[inside]] == values[inside]
+    return found
+
+
+def _sorted_union(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """np.union1d for a sorted, unique first array: only `values` is sorted."""
+    values = np.unique(values).astype(sorted_values.dtype)
+    values = values[~_in_sorted(values, sorted_values)]
+    return np.insert(sorted_values, np.searchsorted(sorted_values, values), values)
+
+
+def _format_nums(nums: np.ndarray, pad_width: Optional[int]) -> np.ndarray:
+    text = pd.Series(nums, dtype=np.int64).astype(str)
+    if pad_width and pad_width > 0:
+        text = text.str.zfill(pad_width)
+    return text.to_numpy(dtype=object)
+
+
 def clean_id_column(
+    series: pd.Series,
+    mode: str = "fill",
+    start_at: int = 1,
+    pad_width: Optional[int] = None,
+    prefer_prefix_threshold: float = 0.6,
+    state: Optional[dict] = None
+) -> pd.Series:
+    # state: pass a dict to keep the fit (prefix, suffix, padding, used
+    # numbers and labels). A dict filled by an earlier upload is reused, so
+    # appended ids continue that numbering instead of starting over.
+    # The per-cell fallback below doesn't record a fit.
+
+    parts = _split_order_frame(series)
+    if parts is None:
+        return _clean_id_column_python(series, mode, start_at, pad_width, prefer_prefix_threshold)
+
+    has_num = parts["num"].notna().to_numpy()
+    nums = parts["num"].to_numpy()[has_num].astype(np.int64)
+    prefix = parts["prefix"].to_numpy(dtype=object)
+    suffix = parts["suffix"].to_numpy(dtype=object)
+    fitted = state is not None and "prefix" in state
+
+    if fitted:
+        chosen_prefix = state["prefix"]
+        chosen_suffix = state["suffix"]
+        if pad_width is None:
+            pad_width = state["pad_width"]
+        start_num = state["start"]
+    elif has_num.any():
+        chosen_prefix = _most_common(prefix[has_num])
+        chosen_suffix = _most_common(suffix[has_num])
+
+        if pad_width is None:
+            pad_width = int(parts["width"].max())
+
+        start_num = max(start_at, int(nums.min()))
+    else:
+        chosen_prefix = ""
+        chosen_suffix = ""
+        if pad_width is None:
+            pad_width = 0
+        start_num = start_at
+
+    if state is not None:
+        state.update(prefix=chosen_prefix, suffix=chosen_suffix, pad_width=pad_width, start=start_num)
+
+    # sequence mode
+    if mode == "sequence":
+        first = state.get("next", start_num) if state is not None else start_num
+        seq = _format_nums(np.arange(first, first + len(series)), pad_width)
+        if state is not None:
+            state["next"] = first + len(series)
+        return pd.Series(chosen_prefix + seq + chosen_suffix, index=series.index, dtype=object)
+
+    # fill mode: missing numbers and repeated prefix/num/suffix labels get the
+    # smallest numbers not already used with the chosen suffix, in row order
+    dup = parts[["prefix", "num", "suffix"]].duplicated(keep="first").to_numpy() & has_num
+    if fitted:
+        # ids already in the earlier uploads count as repeats too
+        dup |= _in_sorted(_label_hashes(prefix, parts["num"].to_numpy(), suffix), state["labels"]) & has_num
+    assign = ~has_num | dup
+
+    out = series.astype(str).to_numpy(dtype=object)
+
+    used = nums[suffix[has_num] == chosen_suffix]
+    if fitted:
+        used = _sorted_union(state["used"], used)
+    fresh = np.empty(0, dtype=np.int64)
+    if assign.any():
+        fresh = _first_unused(start_num, used, int(assign.sum()))
+        out[assign] = chosen_prefix + _format_nums(fresh, pad_width) + chosen_suffix
+
+    if state is not None:
+        # the labels each row ends up with, and every number now taken
+        final_prefix, final_num, final_suffix = prefix.copy(), parts["num"].to_numpy(copy=True), suffix.copy()
+        final_prefix[assign], final_num[assign], final_suffix[assign] = chosen_prefix, fresh, chosen_suffix
+        labels = _label_hashes(final_prefix, final_num, final_suffix)
+        state["labels"] = _sorted_union(state.get("labels", np.empty(0, dtype=np.uint64)), labels)
+        state["used"] = _sorted_union(np.unique(used) if not fitted else used, fresh)
+
+    if pad_width:
+        repad = ~assign & (parts["width"].to_numpy() != pad_width)
+        if repad.any():
+            renum = parts["num"].to_numpy()[repad].astype(np.int64)
+            out[repad] = prefix[repad] + _format_nums(renum, pad_width) + suffix[repad]
+
+    return pd.Series(out, index=series.index, dtype=object).astype(str)
+
+
+def _clean_id_column_python(
     series: pd.Series,
     mode: str = "fill",
     start_at: int = 1,
@@ -134,17 +440,19 @@ def clean_id_column(
     return out.astype(str)
 
 
-def detect_id_columns(df: pd.DataFrame, candidate_regex: Optional[str] = None):
+def detect_id_columns(df: pd.DataFrame, candidate_regex: Optional[str] = None, schema=None):
     if candidate_regex is None:
-        candidate_regex = r'\b(id|studentid|student_id|order|orderno|order_no|emp_id|empid|reg|regno|reg_no|num|number|code|ref)\b'
+        return (schema or DatasetSchema()).columns(df, "id")
     return [col for col in df.columns if re.search(candidate_regex, col, flags=re.I)]
 
 
-def auto_fix_id_columns(df: pd.DataFrame, mode="fill", **clean_kwargs):
-    df_out = df.copy()
-    id_cols = detect_id_columns(df_out)
+def auto_fix_id_columns(df: pd.DataFrame, mode="fill", inplace=False, schema=None, state=None, **clean_kwargs):
+    # state: one clean_id_column fit per id column
+    df_out = df if inplace else df.copy()
+    id_cols = detect_id_columns(df_out, schema=schema)
     for col in id_cols:
-        df_out[col] = clean_id_column(df_out[col], mode=mode, **clean_kwargs)
+        col_state = None if state is None else state.setdefault(str(col), {})
+        df_out[col] = clean_id_column(df_out[col], mode=mode, state=col_state, **clean_kwargs)
     return df_out
 
 # output in cleaning data
@@ -152,19 +460,22 @@ def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
     df = auto_fix_id_columns(df, mode="fill", start_at=1)
     return df
 # ======================================================================================================
-def clean_gender_inplace(df):
+GENDER_CATEGORIES = ["Female", "Male", "Unknown"]
+
+
+def clean_gender_inplace(df, inplace=False, schema=None):
     if df is None:
         print("DataFrame is None!")
         return None
 
     # Fill missing values
-    df = df.fillna("")
+    df = fill_blank(df, inplace=inplace)
 
     # Standardize column names
     df.columns = [c.strip().lower() for c in df.columns]
 
     # Auto-detect gender column
-    gender_col = next((c for c in df.columns if "gender" in c or "sex" in c), None)
+    gender_col = (schema or DatasetSchema()).first(df, "gender")
     if not gender_col:
         raise ValueError("No gender column found")
 
@@ -186,12 +497,309 @@ def clean_gender_inplace(df):
             return "Female"
         return "Unknown"
 
-    df[gender_col] = df[gender_col].apply(normalize_gender)
+    # three values: a category is one byte per row instead of a string
+    df[gender_col] = pd.Categorical(map_uniques(df[gender_col], normalize_gender),
+                                    categories=GENDER_CATEGORIES)
     return df
 def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
     clean_gender = clean_gender_inplace(df)
     return df
 # ==================================================================================================
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:  # pandas < 2.2
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+# strings pd.to_datetime skips when picking the value to guess a format from
+_NOT_A_FORMAT_SAMPLE = {"", "NaT", "nat", "NAT", "nan", "NaN", "NAN", "now", "today"}
+# whole days that fit in a datetime64[ns]
+_FIRST_NS_DAY = np.datetime64("1677-09-22")
+_LAST_NS_DAY = np.datetime64("2262-04-11")
+
+
+def _first_date_string(values: np.ndarray, skip_blank: bool = False) -> Optional[str]:
+    """
+    The value pd.to_datetime guesses its format from, if it is a string.
+    skip_blank: pass over whitespace-only strings too (_parse_dob drops them).
+    """
+    for value in values:
+        if isinstance(value, str):
+            if value not in _NOT_A_FORMAT_SAMPLE and not (skip_blank and not value.strip()):
+                return value
+        elif not pd.isna(value):
+            return None
+    return None
+
+
+def _numeric_by_uniques(series: pd.Series) -> pd.Series:
+    """pd.to_numeric(series, errors="coerce") as float64, once per distinct value."""
+    if series.dtype != object:
+        return pd.to_numeric(series, errors="coerce")
+    codes, uniques = pd.factorize(series)
+    values = pd.to_numeric(pd.Series(uniques, dtype=object), errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    # code -1 (missing) picks the NaN appended at the end
+    return pd.Series(np.append(values, np.nan)[codes], index=series.index, name=series.name)
+
+
+def _dayfirst_formats(first: Optional[str]) -> Dict[bool, Optional[str]]:
+    """The format pd.to_datetime guesses from `first`, with dayfirst=True and False."""
+    return {flag: guess_datetime_format(first, dayfirst=flag) if first else None
+            for flag in (True, False)}
+
+
+def _to_datetime_like(values: pd.Series, first: Optional[str]) -> pd.Series:
+    """
+    pd.to_datetime(values, errors="coerce") as it comes out when values are
+    part of a longer column whose format sample (_first_date_string) is
+    `first`: pandas guesses one format from that value for all of them.
+    """
+    if values.dtype != object:
+        return pd.to_datetime(values, errors="coerce")
+    fmt = guess_datetime_format(first) if first else None
+    # no format guessed: pandas parses each value on its own, as "mixed" does
+    return pd.to_datetime(values, errors="coerce", format=fmt or "mixed")
+
+
+def _dayfirst_parses(raw: pd.Series, rows: Optional[np.ndarray] = None,
+                     formats: Optional[Dict[bool, Optional[str]]] = None) -> Dict[bool, Tuple[pd.Series, int]]:
+    """
+    pd.to_datetime(raw, dayfirst=True) and (dayfirst=False), with how many
+    rows each one parses; just the first when both guess the same format
+    (e.g. ISO dates). pandas guesses one format from the first value and
+    parses the column with it; the format is guessed here up front.
+    `rows`: how many rows each value of raw stands for. `formats`: the
+    guesses to use instead (see _dayfirst_formats).
+    """
+    if formats is None:
+        first = _first_date_string(raw.to_numpy(dtype=object)) if raw.dtype == object else None
+        formats = _dayfirst_formats(first)
+
+    def parse(flag):
+        if formats[flag] is None:
+            # no format guessed: each value on its own, as pandas would do
+            # it for the column (rather than guessing from raw's own first)
+            mixed = "mixed" if raw.dtype == object else None
+            parsed = pd.to_datetime(raw, errors="coerce", dayfirst=flag, format=mixed)
+        else:
+            parsed = pd.to_datetime(raw, errors="coerce", format=formats[flag])
+        ok = parsed.notna().to_numpy()
+        return parsed, int(ok.sum() if rows is None else rows[ok].sum())
+
+    if formats[True] is not None and formats[True] == formats[False]:
+        return {True: parse(True)}
+    return {True: parse(True), False: parse(False)}
+
+
+def _parse_dates_dayfirst(raw: pd.Series, prefer_dayfirst: Optional[bool],
+                          rows: Optional[np.ndarray] = None,
+                          formats: Optional[Dict[bool, Optional[str]]] = None) -> Tuple[pd.Series, bool]:
+    """
+    The parse of _dayfirst_parses that reads more rows (ties go to
+    dayfirst), or the preferred one.
+    """
+    parses = _dayfirst_parses(raw, rows, formats)
+    if len(parses) == 1:
+        return parses[True][0], True if prefer_dayfirst is None else bool(prefer_dayfirst)
+
+    if prefer_dayfirst is None:
+        chosen_dayfirst = parses[True][1] >= parses[False][1]
+    else:
+        chosen_dayfirst = bool(prefer_dayfirst)
+    return parses[chosen_dayfirst][0], bool(chosen_dayfirst)
+
+
+def _dob_uniques(column: pd.Series) -> Tuple[np.ndarray, pd.Series]:
+    """factorize, with blank strings counted as missing (code -1)."""
+    codes, uniques = pd.factorize(column)
+    uniques = pd.Series(uniques, dtype=object)
+    keep = uniques.replace(r'^\s*$', pd.NA, regex=True).notna().to_numpy()
+    renumber = np.full(len(uniques) + 1, -1, dtype=np.int64)
+    renumber[:-1][keep] = np.arange(keep.sum())
+    return renumber[codes], uniques[keep].reset_index(drop=True)
+
+
+def _parse_dob(column: pd.Series, prefer_dayfirst: Optional[bool],
+               formats: Optional[Dict[bool, Optional[str]]] = None) -> Tuple[pd.Series, bool]:
+    """
+    DOB text to datetimes: blanks are missing, the dayfirst pick above, then
+    dateutil for whatever that missed. A text column is factorized first
+    so all of it runs once per distinct string and is broadcast back.
+    """
+    if column.dtype == "datetime64[ns]":
+        # already dates (e.g. parsed shard by shard, partitioned.py): the
+        # parse below would hand them back as they are
+        return column, True if prefer_dayfirst is None else bool(prefer_dayfirst)
+    if column.dtype != object:
+        raw = column.replace(r'^\s*$', pd.NA, regex=True)
+        parsed, dayfirst = _parse_dates_dayfirst(raw, prefer_dayfirst, formats=formats)
+        return _dateutil_fallback(parsed, raw.astype("object"), dayfirst), dayfirst
+
+    codes, uniques = _dob_uniques(column)
+    rows = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    parsed, dayfirst = _parse_dates_dayfirst(uniques, prefer_dayfirst, rows, formats)
+    parsed = _dateutil_fallback(parsed, uniques, dayfirst)
+    # back to one value per row; missing rows (code -1) become NaT
+    return pd.Series(parsed.array.take(codes, allow_fill=True), index=column.index), dayfirst
+
+
+def _parse_dob_each(column: pd.Series, formats: Dict[bool, Optional[str]]) -> Dict[bool, Tuple[pd.Series, int]]:
+    """
+    _parse_dob(column, flag, formats) for each dayfirst flag that reads the
+    column differently, with the rows its format parsed (the counts
+    _parse_dates_dayfirst picks on), from a single factorize.
+    """
+    if column.dtype != object:
+        raw = column.replace(r'^\s*$', pd.NA, regex=True)
+        return {flag: (_dateutil_fallback(parsed, raw.astype("object"), flag), ok)
+                for flag, (parsed, ok) in _dayfirst_parses(raw, formats=formats).items()}
+
+    codes, uniques = _dob_uniques(column)
+    rows = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    out = {}
+    for flag, (parsed, ok) in _dayfirst_parses(uniques, rows, formats).items():
+        parsed = _dateutil_fallback(parsed, uniques, flag)
+        out[flag] = pd.Series(parsed.array.take(codes, allow_fill=True), index=column.index), ok
+    return out
+
+
+# fallback strings in these shapes are resolved without calling dateutil
+_DMY_RE = r"^(\d{1,2})([/.\-])(\d{1,2})\2([1-9]\d{3})$"    # 05/06/2003
+_YMD_RE = r"^([1-9]\d{3})([/.\-])(\d{1,2})\2(\d{1,2})$"    # 2003-05-06
+_D_MONTH_Y_RE = r"^(\d{1,2}) ([A-Za-z]+) ([1-9]\d{3})$"     # 5 Mar 2003
+_MONTH_NUMBERS = {name.lower(): number
+                  for number, names in enumerate(dateutil_parser.parserinfo.MONTHS, start=1)
+                  for name in names}
+
+
+def _month_start(years: np.ndarray, months: np.ndarray):
+    """First day of each year/month as datetime64[D], and the month's length."""
+    start = (years.astype(np.int64) - 1970).astype("datetime64[Y]").astype("datetime64[M]") + (months - 1)
+    first_day = start.astype("datetime64[D]")
+    return first_day, ((start + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+
+
+def _ymd_to_datetime64(years, months, days) -> np.ndarray:
+    """datetime64[ns] from int arrays; NaT where the date is invalid or out of ns range."""
+    ok = (years >= 1) & (months >= 1) & (months <= 12) & (days >= 1)
+    first_day, month_days = _month_start(np.where(ok, years, 1970), np.where(ok, months, 1))
+    dates = first_day + (days - 1)
+    ok &= (days <= month_days) & (dates >= _FIRST_NS_DAY) & (dates <= _LAST_NS_DAY)
+    return np.where(ok, dates, np.datetime64("NaT")).astype("datetime64[ns]")
+
+
+def _dateutil_common_shapes(text: pd.Series, dayfirst: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    dateutil_parser.parse(s, dayfirst=dayfirst) for the shapes most fallback
+    strings have, using dateutil's own day/month rules: a number over 12
+    must be the day, otherwise dayfirst decides; with the year first,
+    dayfirst reads 2003-05-06 as 5 June. Returns (datetime64[ns] values,
+    mask of strings in one of the shapes); the rest need dateutil itself.
+    """
+    values = np.full(len(text), np.datetime64("NaT"), dtype="datetime64[ns]")
+    matched = np.zeros(len(text), dtype=bool)
+
+    parts = text.str.extract(_DMY_RE)
+    hit = parts[0].notna().to_numpy()
+    if hit.any():
+        a, b, year = (parts.loc[hit, i].astype(np.int64).to_numpy() for i in (0, 2, 3))
+        first_is_day = (a > 12) | (dayfirst & (b <= 12))
+        day, month = np.where(first_is_day, a, b), np.where(first_is_day, b, a)
+        # a > 31 would have to be a year, and there is one already
+        values[hit] = np.where(a > 31, np.datetime64("NaT"), _ymd_to_datetime64(year, month, day))
+        matched |= hit
+
+    parts = text.str.extract(_YMD_RE)
+    hit = parts[0].notna().to_numpy()
+    if hit.any():
+        year, b, c = (parts.loc[hit, i].astype(np.int64).to_numpy() for i in (0, 2, 3))
+        swap = dayfirst & (c <= 12)
+        values[hit] = _ymd_to_datetime64(year, np.where(swap, c, b), np.where(swap, b, c))
+        matched |= hit
+
+    parts = text.str.extract(_D_MONTH_Y_RE)
+    month = parts[1].str.lower().map(_MONTH_NUMBERS)
+    hit = month.notna().to_numpy()
+    if hit.any():
+        day, year = (parts.loc[hit, i].astype(np.int64).to_numpy() for i in (0, 2))
+        values[hit] = _ymd_to_datetime64(year, month[hit].astype(np.int64).to_numpy(), day)
+        matched |= hit
+
+    return values, matched
+
+
+def _dateutil_datetime64(text: str, dayfirst: bool) -> np.datetime64:
+    try:
+        value = pd.Timestamp(dateutil_parser.parse(text, dayfirst=dayfirst))
+        if value.tzinfo is not None:
+            value = value.tz_localize(None)
+        # dates outside datetime64[ns] can't be stored: treated as unparseable
+        return value.as_unit("ns").to_datetime64()
+    except Exception:
+        return np.datetime64("NaT", "ns")
+
+
+def _dateutil_fallback(parsed: pd.Series, raw: pd.Series, dayfirst: bool) -> pd.Series:
+    """
+    Values the pinned parse missed go through dateutil, once per distinct
+    string rather than once per row.
+    """
+    mask = (parsed.isna() & raw.notna()).to_numpy()
+    if not mask.any():
+        return parsed
+
+    if parsed.dtype != "datetime64[ns]":
+        # tz-aware or non-ns result: keep the per-row assignment
+        parsed = parsed.copy()
+        for idx in parsed.index[mask]:
+            try:
+                parsed.loc[idx] = pd.to_datetime(dateutil_parser.parse(str(raw.loc[idx]), dayfirst=dayfirst))
+            except Exception:
+                parsed.loc[idx] = pd.NaT
+        return parsed
+
+    codes, uniques = pd.factorize(raw[mask])
+    text = pd.Series(uniques, dtype=object).astype(str)
+    values, matched = _dateutil_common_shapes(text, dayfirst)
+    values[~matched] = [_dateutil_datetime64(t, dayfirst) for t in text[~matched]]
+    out = parsed.to_numpy(copy=True)
+    out[mask] = values[codes]
+    return pd.Series(out, index=parsed.index)
+
+
+def _dates_from_age(ages: np.ndarray, today: pd.Timestamp, month: int, day: int):
+    """
+    Birth dates `ages` years before today on month/day (day capped at the
+    month's length), as datetime64[D], plus a mask of ages that give a
+    valid date.
+    """
+    with np.errstate(invalid="ignore"):
+        finite = np.isfinite(ages)
+        years = today.year - np.trunc(np.where(finite, ages, 0))
+    valid = finite & (years >= 1) & (years <= 9999)
+
+    first_day, month_days = _month_start(np.where(valid, years, 1970), np.full(len(ages), month))
+    return first_day + (np.minimum(day, month_days) - 1), valid
+
+
+def _date_parts(dates: np.ndarray):
+    """year, month, day int arrays of datetime64 values (garbage where NaT)."""
+    years = dates.astype("datetime64[Y]")
+    months = dates.astype("datetime64[M]")
+    return (years.astype(np.int64) + 1970,
+            (months - years.astype("datetime64[M]")).astype(np.int64) + 1,
+            (dates.astype("datetime64[D]") - months.astype("datetime64[D]")).astype(np.int64) + 1)
+
+
+def _age_on(today: pd.Timestamp, dob: pd.Series) -> pd.Series:
+    """Whole years from dob (datetime64[ns]) to today, NaN where dob is NaT."""
+    dates = dob.to_numpy()
+    year, month, day = _date_parts(dates)
+    before_birthday = (month > today.month) | ((month == today.month) & (day > today.day))
+    age = (today.year - year - before_birthday).astype(float)
+    age[np.isnat(dates)] = np.nan
+    return pd.Series(age, index=dob.index)
+
+
 def clean_dob_age_pair(
     df_in: pd.DataFrame,
     dob_col: Optional[str] = None,
@@ -201,25 +809,31 @@ def clean_dob_age_pair(
     fallback_day: int = 1,
     prefer_dayfirst: Optional[bool] = None,
     max_reasonable_age: int = 120,
-    drop_missing_both: bool = False
+    drop_missing_both: bool = False,
+    inplace: bool = False,
+    schema: Optional[DatasetSchema] = None,
+    state: Optional[dict] = None
 ) -> pd.DataFrame:
+    # state: pass a dict to keep the dayfirst choice and how often each
+    # birth month and day occurred; later uploads parse their dates the
+    # same way and infer DOBs from the month/day modes of all uploads
     
     if df_in is None:
         raise ValueError("Input DataFrame is None")
 
     warnings.filterwarnings("ignore", category=UserWarning, message="Parsing dates")
 
-    df = df_in.copy()
-    cols = list(df.columns)
+    # intermediate values live in local Series rather than helper columns,
+    # so with inplace=True only the DOB and Age columns are rewritten
+    df = df_in if inplace else df_in.copy()
+    schema = schema or DatasetSchema()
 
     # Detect columns if not given
     if dob_col is None:
-        dob_candidates = [c for c in cols if 'dob' in c.lower() or 'birth' in c.lower()]
-        dob_col = dob_candidates[0] if dob_candidates else None
+        dob_col = schema.first(df, "dob")
 
     if age_col is None:
-        age_candidates = [c for c in cols if 'age' in c.lower() and 'stage' not in c.lower()]
-        age_col = age_candidates[0] if age_candidates else None
+        age_col = schema.first(df, "age")
 
     if dob_col is None and age_col is None:
         raise ValueError("Both DOB and Age columns are missing. Provide at least one.")
@@ -230,81 +844,83 @@ def clean_dob_age_pair(
     else:
         today = pd.to_datetime(today).normalize()
 
-    # create placeholders if needed
-    created_dob_placeholder = False
-    created_age_placeholder = False
+    # placeholders if a column is missing (never written back to df)
     if dob_col is None:
-        df["__dob_temp__"] = pd.NA
-        dob_col = "__dob_temp__"
-        created_dob_placeholder = True
+        dob_raw = pd.Series(pd.NA, index=df.index, dtype=object)
     else:
-        df[dob_col] = df[dob_col].replace(r'^\s*$', pd.NA, regex=True)
+        dob_raw = df[dob_col]
 
     if age_col is None:
-        df["__age_temp__"] = pd.NA
-        age_col = "__age_temp__"
-        created_age_placeholder = True
+        age = pd.Series(pd.NA, index=df.index, dtype=object)
+    else:
+        age = df[age_col]
 
     # coerce age numeric
-    df[age_col] = pd.to_numeric(df[age_col], errors="coerce")
-
-    # Robust parsing with dayfirst heuristic
-    def try_parse_dayfirst(flag: bool):
-        return pd.to_datetime(df[dob_col], errors="coerce", dayfirst=flag)
+    age = _numeric_by_uniques(age)
 
-    parsed_true = try_parse_dayfirst(True)
-    parsed_false = try_parse_dayfirst(False)
-
-    if prefer_dayfirst is None:
-        chosen_dayfirst = True if parsed_true.notna().sum() >= parsed_false.notna().sum() else False
-    else:
-        chosen_dayfirst = bool(prefer_dayfirst)
+    if prefer_dayfirst is None and state is not None:
+        prefer_dayfirst = state.get("dayfirst")
 
-    parsed = parsed_true if chosen_dayfirst else parsed_false
+    # Robust parsing with dayfirst heuristic, then dateutil for the rest
+    parsed, chosen_dayfirst = _parse_dob(dob_raw, prefer_dayfirst)
 
-    # dateutil fallback for remaining raw values
-    raw = df[dob_col].astype("object")
-    mask_fallback = parsed.isna() & raw.notna()
-    if mask_fallback.any():
-        for idx in df.index[mask_fallback]:
-            try:
-                parsed_val = dateutil_parser.parse(str(raw.loc[idx]), dayfirst=chosen_dayfirst)
-                parsed.loc[idx] = pd.to_datetime(parsed_val)
-            except Exception:
-                parsed.loc[idx] = pd.NaT
-
-    df["_dob_parsed"] = pd.to_datetime(parsed).dt.normalize()
+    dob_parsed = pd.to_datetime(parsed).dt.normalize()
 
     # Majority month/day (or fallback)
-    valids = df["_dob_parsed"].dropna()
-    if not valids.empty:
-        month_mode = int(valids.dt.month.mode()[0])
-        day_mode  = int(valids.dt.day.mode()[0])
+    valids = dob_parsed.dropna()
+    month_counts = day_counts = None
+    if not valids.empty and valids.dtype == "datetime64[ns]":
+        _, months, days = _date_parts(valids.to_numpy())
+        month_counts, day_counts = np.bincount(months, minlength=13), np.bincount(days, minlength=32)
+    elif not valids.empty:
+        month_counts = np.bincount(valids.dt.month.to_numpy(dtype=np.int64), minlength=13)
+        day_counts = np.bincount(valids.dt.day.to_numpy(dtype=np.int64), minlength=32)
+
+    if state is not None:
+        if "months" in state:
+            month_counts = state["months"] + (0 if month_counts is None else month_counts)
+            day_counts = state["days"] + (0 if day_counts is None else day_counts)
+        if not valids.empty:
+            state["dayfirst"] = chosen_dayfirst
+        if month_counts is not None:
+            state.update(months=month_counts, days=day_counts)
+
+    if month_counts is not None:
+        # smallest most common value, like Series.mode()[0]
+        month_mode = int(month_counts.argmax())
+        day_mode = int(day_counts.argmax())
     else:
         month_mode = int(fallback_month) if 1 <= fallback_month <= 12 else 1
         day_mode  = int(fallback_day)  if 1 <= fallback_day <= 28 else 1
 
     # Infer DOB from Age where DOB missing
-    mask_infer = df["_dob_parsed"].isna() & df[age_col].notna()
+    mask_infer = (dob_parsed.isna() & age.notna()).to_numpy()
     if mask_infer.any():
-        inferred_dates = []
-        for idx, age_val in df.loc[mask_infer, age_col].items():
-            try:
-                a = int(age_val)
-                yr = int(today.year - a)
-                last_day = calendar.monthrange(yr, month_mode)[1]
-                safe_day = min(day_mode, last_day)
-                inferred_dates.append(pd.Timestamp(datetime(yr, month_mode, safe_day)))
-            except Exception:
-                inferred_dates.append(pd.NaT)
-        df.loc[mask_infer, "_dob_parsed"] = inferred_dates
+        inferred, valid = _dates_from_age(
+            age.loc[mask_infer].to_numpy(dtype=float, na_value=np.nan), today, month_mode, day_mode)
+        in_ns = valid & (inferred >= _FIRST_NS_DAY) & (inferred <= _LAST_NS_DAY)
+        if (valid & ~in_ns).any() or dob_parsed.dtype != "datetime64[ns]":
+            # e.g. age 500: the date doesn't fit datetime64[ns] (or the
+            # dates are tz-aware), so the column becomes object Timestamps
+            # like it always did
+            dob_parsed = dob_parsed.copy()
+            dob_parsed.loc[mask_infer] = [
+                pd.Timestamp(datetime(*d.item().timetuple()[:3])) if ok else pd.NaT
+                for d, ok in zip(inferred, valid)
+            ]
+        else:
+            out = dob_parsed.to_numpy(copy=True)
+            out[mask_infer] = np.where(valid, inferred, np.datetime64("NaT")).astype("datetime64[ns]")
+            dob_parsed = pd.Series(out, index=dob_parsed.index)
 
     # Optionally drop rows missing both
     if drop_missing_both:
-        mask_drop = df["_dob_parsed"].isna() & df[age_col].isna()
+        mask_drop = dob_parsed.isna() & age.isna()
         if mask_drop.any():
             df = df.loc[~mask_drop].copy()
             df.reset_index(drop=True, inplace=True)
+            dob_parsed = dob_parsed.loc[~mask_drop].reset_index(drop=True)
+            age = age.loc[~mask_drop].reset_index(drop=True)
 
     # Calculate age from DOB
     def calc_age(dt):
@@ -314,30 +930,26 @@ def clean_dob_age_pair(
         a = today.year - dt.year - ((today.month, today.day) < (dt.month, dt.day))
         return int(a)
 
-    df["__calc_age__"] = df["_dob_parsed"].apply(calc_age)
+    if pd.api.types.is_datetime64_dtype(dob_parsed):
+        calc_ages = _age_on(today, dob_parsed)
+    else:
+        calc_ages = map_uniques(dob_parsed, calc_age)
 
     # Fill missing ages with calculated age
-    df[age_col] = df[age_col].fillna(df["__calc_age__"])
+    age = age.fillna(calc_ages)
 
     # Replace unrealistic ages (if any) with calculated age where possible
-    unrealistic_mask = df[age_col].notna() & ((df[age_col] < 0) | (df[age_col] > max_reasonable_age))
+    unrealistic_mask = age.notna() & ((age < 0) | (age > max_reasonable_age))
     if unrealistic_mask.any():
-        df.loc[unrealistic_mask, age_col] = df.loc[unrealistic_mask, "__calc_age__"]
+        age.loc[unrealistic_mask] = calc_ages.loc[unrealistic_mask]
 
     # Finalize age column as nullable Int
-    df[age_col] = pd.to_numeric(df[age_col], errors="coerce").astype("Int64")
+    if age_col is not None:
+        df[age_col] = pd.to_numeric(age, errors="coerce").astype("Int64")
 
     # Overwrite DOB with parsed values
-    df[dob_col] = df["_dob_parsed"]
-
-    # Drop helper columns
-    df.drop(columns=["_dob_parsed", "__calc_age__"], inplace=True, errors="ignore")
-
-    # remove placeholder columns if created
-    if created_dob_placeholder and "__dob_temp__" in df.columns:
-        df.drop(columns=["__dob_temp__"], inplace=True, errors="ignore")
-    if created_age_placeholder and "__age_temp__" in df.columns:
-        df.drop(columns=["__age_temp__"], inplace=True, errors="ignore")
+    if dob_col is not None:
+        df[dob_col] = dob_parsed
 
     return df
 
@@ -347,19 +959,84 @@ def clean_dataset(df: pd.DataFrame ) -> pd.DataFrame:
     return df
  
 
-def clean_emails_inplace_df(df, email_col=None, name_col=None, default_domain="gmail.com"):
-
-    df = df.fillna("")
-
-    # Standardize column names
-    orig_columns = list(df.columns)
-    df.columns = [c.strip().lower() for c in df.columns]
-
+_USERNAME_JUNK = r"[^a-zA-Z]"
+# local parts a generated address can take: name, name2, name3, ...
+_GENERATED_LOCAL_RE = r"^([a-z]+)([2-9]|[1-9]\d{1,9})?$"
+
+
+def _usernames_from_names(names: pd.Series) -> pd.Series:
+    """
+    Email usernames for a column of names: the ASCII letters of each name,
+    lowercased ("Mary-Ann O'Neil" -> "maryannoneil"), or "unknown" when
+    there are none. Built once per distinct name.
+    """
+    codes, uniques = pd.factorize(names.astype(str))
+    users = pd.Series(uniques, dtype=object).str.replace(_USERNAME_JUNK, "", regex=True).str.lower()
+    users = users.mask(users == "", "unknown")
+    return pd.Series(users.to_numpy(dtype=object)[codes], index=names.index, dtype=object)
+
+
+def _taken_numbers(local_parts: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Local parts a generated address could collide with, split into
+    username and number ("john" -> ("john", 1), "john7" -> ("john", 7)).
+    Anything else can't collide and is left out.
+    """
+    parts = _generated_parts(local_parts)
+    return parts["base"].to_numpy(dtype=object), parts["number"].to_numpy(dtype=np.int64)
+
+
+def _generated_parts(local_parts: pd.Series) -> pd.DataFrame:
+    """_taken_numbers as a frame ("base", "number") on the index of the local parts it keeps."""
+    parts = local_parts.str.extract(_GENERATED_LOCAL_RE).dropna(subset=[0])
+    return pd.DataFrame({"base": parts[0], "number": pd.to_numeric(parts[1]).fillna(1).astype(np.int64)})
+
+
+def _email_numbers(usernames: pd.Series, taken_base: np.ndarray, taken_number: np.ndarray) -> np.ndarray:
+    """
+    Number for each new address, in row order: 1 for the bare username,
+    then 2, 3, ... for later rows with the same username, skipping the
+    numbers already taken (_taken_numbers of the addresses on the domain).
+
+    Usernames are letters only, so "john" + number can never be another
+    username's address, and each username is numbered on its own: the
+    m-th row of a username gets the m-th number not taken for it.
+    """
+    codes, uniques = pd.factorize(usernames)
+    wanted = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy() + 1
+
+    base = pd.Index(uniques).get_indexer(taken_base)
+    hit = base >= 0
+    if not hit.any():
+        return wanted
+    number = taken_number[hit]
+
+    # taken numbers sorted by (username, number); the j-th taken number T
+    # of a username sits before its m-th free number when T - j <= m
+    big = int(max(number.max(), wanted.max())) + 2
+    key = np.unique(base[hit].astype(np.int64) * big + number)
+    t_base, t_num = np.divmod(key, big)
+    first = np.searchsorted(t_base, t_base, side="left")
+    before = t_base * big + t_num - (np.arange(len(key)) - first)
+    skipped = (np.searchsorted(before, codes * big + wanted, side="right")
+               - np.searchsorted(t_base, codes, side="left"))
+    return wanted + skipped
+
+
+_EMAIL_RE = re.compile(r"^[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}$")
+
+
+def _email_columns(df, schema, email_col=None, name_col=None) -> Tuple[str, str]:
+    """
+    The email and name columns clean_emails_inplace_df works on. Adds them
+    to df when it has none: a blank "email", or a name built from first and
+    last name.
+    """
     # Detect or create email column
     if email_col:
         email_col = email_col.strip().lower()
     else:
-        email_col = next((c for c in df.columns if "mail" in c or "email" in c), None)
+        email_col = schema.first(df, "email")
 
     if not email_col:
         email_col = "email"
@@ -369,12 +1046,12 @@ def clean_emails_inplace_df(df, email_col=None, name_col=None, default_domain="g
     if name_col:
         name_col = name_col.strip().lower()
     else:
-        name_col = next((c for c in df.columns if "name" in c and "full" not in c), None)
+        name_col = schema.first(df, "name")
 
         # fallback using first/last name
         if not name_col:
-            first = next((c for c in df.columns if c in ("first_name", "firstname", "first")), None)
-            last = next((c for c in df.columns if c in ("last_name", "lastname", "last")), None)
+            first = schema.first(df, "first_name")
+            last = schema.first(df, "last_name")
 
             if first and last:
                 name_col = "name_from_parts"
@@ -386,58 +1063,67 @@ def clean_emails_inplace_df(df, email_col=None, name_col=None, default_domain="g
             else:
                 name_col = "name"
                 df[name_col] = df[name_col].replace("", "unknown")
+    return email_col, name_col
+
+
+def _clean_emails(column: pd.Series) -> Tuple[np.ndarray, pd.Series]:
+    """
+    factorize codes of the column and its distinct values cleaned:
+    lowercased and stripped, "" where that is not an address.
+    """
+    codes, uniques = pd.factorize(column.astype(str))
+    emails = pd.Series(uniques, dtype=object).str.lower().str.strip()
+    return codes, emails.where(emails.str.match(_EMAIL_RE), "")
+
+
+def clean_emails_inplace_df(df, email_col=None, name_col=None, default_domain="gmail.com", inplace=False, schema=None,
+                            state=None):
+    # state: pass a dict to keep the majority domain and the addresses taken
+    # on it; a dict from an earlier upload is reused, so new rows keep that
+    # domain and never get an address the earlier rows already have
+
+    df = fill_blank(df, inplace=inplace)
+    schema = schema or DatasetSchema()
 
-    # Clean existing emails
-    df[email_col] = df[email_col].astype(str).str.lower().str.strip()
-    email_re = re.compile(r"^[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}$")
-    df.loc[~df[email_col].str.match(email_re), email_col] = ""
-
-    # Detect majority domain
-    valid_domains = (
-        df[df[email_col] != ""][email_col]
-        .apply(lambda x: x.split("@")[1])
-        .tolist()
-    )
-    majority_domain = pd.Series(valid_domains).mode()[0] if valid_domains else default_domain
-
-    used_emails = set(df[df[email_col] != ""][email_col])
-
-   
-    def _make_username_from_name(name):
-        cleaned = re.sub(r"[^a-zA-Z\s]", "", str(name)).strip().lower()
-        parts = [p for p in cleaned.split() if p]
-
-        if not parts:
-            return "unknown"
-        if len(parts) == 1:
-            return parts[0]
-
-        # ❗ Join firstname + lastname with NO dot
-        return "".join(parts)
-
-    def generate_email_from_name(name):
-        username = _make_username_from_name(name)
-        base = username
-
-        candidate = f"{username}@{majority_domain}"
-        if candidate not in used_emails:
-            used_emails.add(candidate)
-            return candidate
-
-        # If exists, append numbers
-        i = 2
-        while True:
-            candidate2 = f"{base}{i}@{majority_domain}"
-            if candidate2 not in used_emails:
-                used_emails.add(candidate2)
-                return candidate2
-            i += 1
-
-    df[email_col] = df.apply(
-        lambda r: generate_email_from_name(r[name_col]) if r[email_col] == "" else r[email_col],
-        axis=1
-    )
+    # Standardize column names
+    orig_columns = list(df.columns)
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    email_col, name_col = _email_columns(df, schema, email_col, name_col)
+
+    # Clean existing emails (once per distinct value; most are blank)
+    codes, emails = _clean_emails(df[email_col])
+    df[email_col] = emails.to_numpy(dtype=object)[codes]
 
+    # Detect majority domain (the alphabetically first on a tie, like mode())
+    valid = (emails != "").to_numpy()
+    existing = (emails[valid].str.partition("@") if valid.any()
+                else pd.DataFrame({0: [], 2: []}, dtype=object))
+    if state is not None and "domain" in state:
+        majority_domain = state["domain"]
+    else:
+        rows = np.bincount(codes, minlength=len(emails))[valid]
+        rows_per_domain = pd.Series(rows).groupby(existing[2].to_numpy()).sum()
+        majority_domain = rows_per_domain.idxmax() if len(rows_per_domain) else default_domain
+
+    taken_base, taken_number = _taken_numbers(existing.loc[existing[2] == majority_domain, 0])
+    if state is not None and "domain" in state:
+        taken_base = np.concatenate([state["taken_base"], taken_base])
+        taken_number = np.concatenate([state["taken_number"], taken_number])
+
+    # Fill the blanks: the letters of the name, numbered from 2 when the
+    # address is already used (john@, john2@, john3@ ...), in row order
+    missing = (df[email_col] == "").to_numpy()
+    if missing.any():
+        usernames = _usernames_from_names(df.loc[missing, name_col])
+        numbers = _email_numbers(usernames, taken_base, taken_number)
+        suffix = np.where(numbers == 1, "", numbers.astype(str)).astype(object)
+        df.loc[missing, email_col] = (usernames.to_numpy(dtype=object) + suffix + f"@{majority_domain}")
+        taken_base = np.concatenate([taken_base, usernames.to_numpy(dtype=object)])
+        taken_number = np.concatenate([taken_number, numbers])
+
+    if state is not None:
+        state.update(domain=majority_domain, taken_base=taken_base, taken_number=taken_number)
     return df
 
 def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
@@ -446,60 +1132,71 @@ def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
  
 
 
-def clean_attendance_inplace(df):
+def _attendance_value(val):
+    # one attendance cell as a percentage (0-100), or None
+    # --- Convert to string for safe checks ---
+    if val is None:
+        return None
+
+    val_str = str(val).strip()
+
+    if val_str == "":
+        return None
+
+    # Handle fractions like "85/100"
+    if "/" in val_str:
+        try:
+            num, denom = val_str.split("/")
+            return (float(num) / float(denom)) * 100
+        except:
+            return None
+
+    # Remove % or non-numeric characters
+    val_str = re.sub(r"[^\d.]", "", val_str)
+
+    try:
+        num = float(val_str)
+        # Clamp between 0 and 100
+        return max(0, min(num, 100))
+    except:
+        return None
+
+
+def clean_attendance_inplace(df, inplace=False, schema=None, state=None):
+    # state: pass a dict to keep the lowest attendance seen; blanks in later
+    # uploads are filled with the lowest value across all of them
     if df is None:
         print("DataFrame is None!")
         return None
 
     # Fill missing values with empty string
-    df = df.fillna("")
+    df = fill_blank(df, inplace=inplace)
 
     # Standardize column names
     df.columns = [c.strip().lower() for c in df.columns]
 
     # Detect attendance column
-    att_col = next((c for c in df.columns if "attendance" in c), None)
+    att_col = (schema or DatasetSchema()).first(df, "attendance")
     if not att_col:
         print("No attendance column found.")
         return df
 
-    def clean_value(val):
-        # --- Convert to string for safe checks ---
-        if val is None:
-            return None
-        
-        val_str = str(val).strip()
-
-        if val_str == "":
-            return None
-
-        # Handle fractions like "85/100"
-        if "/" in val_str:
-            try:
-                num, denom = val_str.split("/")
-                return (float(num) / float(denom)) * 100
-            except:
-                return None
-
-        # Remove % or non-numeric characters
-        val_str = re.sub(r"[^\d.]", "", val_str)
-
-        try:
-            num = float(val_str)
-            # Clamp between 0 and 100
-            return max(0, min(num, 100))
-        except:
-            return None
-
-    # Apply cleaning
-    df[att_col] = df[att_col].apply(clean_value)
+    # Apply cleaning (once per distinct value)
+    values = map_uniques(df[att_col], _attendance_value).astype(float)
 
     # Fill missing with minimum valid attendance
-    min_att = df[att_col].min()
-    df[att_col] = df[att_col].fillna(min_att)
+    min_att = values.min()
+    if state is not None:
+        min_att = pd.Series([min_att, state.get("min")], dtype=float).min()
+        state["min"] = min_att
+    if pd.isna(min_att):
+        # not one number in it ("present"/"absent"): leave the column as it is
+        print("No attendance figures found.")
+        return df
 
-    # Convert to string with percentage symbol
-    df[att_col] = df[att_col].apply(lambda x: f"{round(x, 2)}%")
+    # Keep the percentage as a number; it is shown as "85.0%" (display.py)
+    df[att_col] = values.fillna(min_att).round(2).astype("float32")
+    set_format(df, att_col, "percent")
 
     return df
 
@@ -509,13 +1206,13 @@ def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
     return df
  
 
-def detect_score_columns(df):
-    keywords = ['mark', 'gpa', 'cgpa', 'percent', '%']
-    return [col for col in df.columns if any(k in col.lower() for k in keywords)]
+def detect_score_columns(df, schema=None):
+    return (schema or DatasetSchema()).columns(df, "score")
 
 # Clean and fix scores, then add % symbol for percentage columns
-def clean_marks_columns(df):
-    score_cols = detect_score_columns(df)
+def clean_marks_columns(df, schema=None):
+    schema = schema or DatasetSchema()
+    score_cols = detect_score_columns(df, schema=schema)
     
     for col in score_cols:
         # Remove %, NA, empty etc.
@@ -526,12 +1223,13 @@ def clean_marks_columns(df):
         df[col] = df[col].fillna(0)
         
         # Clip values
-        if 'gpa' in col.lower() or 'cgpa' in col.lower():
-            df[col] = df[col].clip(upper=4)  # GPA max 4
+        if "gpa" in schema.roles(col):
+            df[col] = df[col].clip(upper=4).astype("float32")  # GPA max 4
         else:
             df[col] = df[col].clip(upper=100)  # Marks/percent max 100
-            # Add % symbol
-            df[col] = df[col].astype(int).astype(str) + '%'
+            # Whole marks in the smallest int type; shown with a % symbol
+            df[col] = pd.to_numeric(df[col].astype(int), downcast="integer")
+            set_format(df, col, "percent")
     
     return df
 
@@ -541,9 +1239,9 @@ def clean_dataset (df: pd.DataFrame ) -> pd.DataFrame:
     return df
  
 
-def detect_date_columns(df, keywords=None):
+def detect_date_columns(df, keywords=None, schema=None):
     if keywords is None:
-        keywords = ["date", "join", "joining", "st_date", "end_date", "relieve"]
+        return (schema or DatasetSchema()).columns(df, "date")
 
     found = []
     for col in df.columns:
@@ -552,22 +1250,42 @@ def detect_date_columns(df, keywords=None):
             found.append(col)
     return found
 
-def clean_date_columns(df, date_columns=None):
-    df = df.copy()
+def _counted_mode(values: pd.Series, saved: Optional[pd.Series]) -> Tuple[int, pd.Series]:
+    """
+    values.mode()[0] (the smallest most common value) over values plus the
+    counts of earlier uploads in `saved`. Returns it with the new counts.
+    """
+    counts = values.value_counts()
+    if saved is not None:
+        counts = counts.add(saved, fill_value=0)
+    return int(counts[counts == counts.max()].index.min()), counts
+
+
+def clean_date_columns(df, date_columns=None, inplace=False, schema=None, state=None):
+    # state: pass a dict to keep, per column, how often each year, month
+    # and day occurred, so later uploads fill blanks with the modes of all
+    # of them
+    if not inplace:
+        df = df.copy()
 
     # Auto-detect if user didn't provide
     if date_columns is None:
-        date_columns = detect_date_columns(df)
+        date_columns = detect_date_columns(df, schema=schema)
 
     for col in date_columns:
         if col in df.columns:
             df[col] = pd.to_datetime(df[col], errors='coerce')
             valid_dates = df[col].dropna()
+            saved = state.get(str(col)) if state is not None else None
 
-            if not valid_dates.empty:
-                majority_year = int(valid_dates.dt.year.mode()[0])
-                majority_month = int(valid_dates.dt.month.mode()[0])
-                majority_day = int(valid_dates.dt.day.mode()[0])
+            if not valid_dates.empty or saved:
+                saved = saved or {}
+                counts = {}
+                majority_year, counts["year"] = _counted_mode(valid_dates.dt.year, saved.get("year"))
+                majority_month, counts["month"] = _counted_mode(valid_dates.dt.month, saved.get("month"))
+                majority_day, counts["day"] = _counted_mode(valid_dates.dt.day, saved.get("day"))
+                if state is not None:
+                    state[str(col)] = counts
 
                 df[col] = df[col].fillna(
                     pd.Timestamp(
@@ -583,15 +1301,38 @@ def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
     return df
  
 
-def clean_date_formate(df):
+def _appended_range(saved: dict, dates: pd.Series) -> pd.Series:
+    """
+    The tail of the range clean_date_formate fills with, as if `dates`
+    had been uploaded together with the saved rows: one evenly spaced date
+    per row between the earliest and latest date of all of them.
+    Updates `saved` (start, end, rows).
+    """
+    start = min(saved["start"], dates.min()) if dates.notna().any() else saved["start"]
+    end = max(saved["end"], dates.max()) if dates.notna().any() else saved["end"]
+    first, rows = saved["rows"], saved["rows"] + len(dates)
+    # np.linspace(start, end, rows)[first:] without building the head
+    step = (end.value - start.value) / max(rows - 1, 1)
+    values = start.value + step * np.arange(first, rows)
+    saved.update(start=start, end=end, rows=rows)
+    return pd.Series(pd.to_datetime(values.astype(np.int64)), index=dates.index)
+
+
+def clean_date_formate(df, schema=None, state=None):
+    # state: pass a dict to keep each column's first and last date and its
+    # row count; later uploads continue that range instead of starting
+    # their own
     # Auto-detect columns with "date" in their name
-    date_cols = [col for col in df.columns if "date" in col.lower()]
+    date_cols = (schema or DatasetSchema()).columns(df, "date_sequence")
 
     for col in date_cols:
         # Convert to datetime, coerce invalid/missing -> NaT
         df[col] = pd.to_datetime(df[col], errors="coerce")
 
-        if df[col].notna().sum() >= 2:  # need at least a start & end
+        saved = state.get(str(col)) if state is not None else None
+        if saved and df[col].dtype == "datetime64[ns]":
+            df[col] = df[col].fillna(_appended_range(saved, df[col]))
+        elif df[col].notna().sum() >= 2:  # need at least a start & end
             # Get first and last valid date
             start_date = df[col].min()
             end_date = df[col].max()
@@ -601,6 +1342,8 @@ def clean_date_formate(df):
 
             # Fill missing values in order
             df[col] = df[col].fillna(pd.Series(full_range, index=df.index))
+            if state is not None:
+                state[str(col)] = {"start": start_date, "end": end_date, "rows": len(df)}
 
     return df
 
@@ -609,28 +1352,50 @@ def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
     clean_date = clean_date_formate(df)
     return df
 
-def clean_nan_other_columns(df):
-    df = df.copy()
+def _blank_rows(column: pd.Series) -> np.ndarray:
+    """
+    column.isna() | (column.astype(str).str.strip() == "") as a bool array,
+    with the string check done once per distinct value.
+    """
+    codes, uniques = pd.factorize(column)
+    blank = pd.Series(uniques, dtype=object).astype(str).str.strip().eq("").to_numpy(dtype=bool)
+    # code -1 (missing) picks the True appended at the end
+    return np.append(blank, True)[codes]
+
 
-    # Keywords to detect important columns
-    keywords = [
-        "name", "salary", "mark", "price", "quantity",
-        "revenue", "open", "close", "temperature",
-        "humidity", "condition"
-    ]
+def clean_nan_other_columns(df, inplace=False, schema=None, drop_report=None):
+    # drop_report: pass a dict to get "rows" (rows dropped) and "by_column",
+    # how many rows were blank in each column (a row blank in several
+    # columns is counted in each of them)
 
-    # Columns that MATCH keywords → mandatory columns (DO NOT use for row dropping)
-    mandatory_cols = [col for col in df.columns if any(k in col.lower() for k in keywords)]
+    # Columns that MATCH keywords (schema.MANDATORY_KEYWORDS) → mandatory
+    # columns (DO NOT use for row dropping)
+    mandatory_cols = (schema or DatasetSchema()).columns(df, "mandatory")
 
     # All other columns → if NaN/empty remove row
     other_cols = [col for col in df.columns if col not in mandatory_cols]
 
-    # Clean rows: remove where OTHER columns have NaN or empty
+    # one pass: a mask of the rows to keep, built column by column
+    keep = np.ones(len(df), dtype=bool)
+    by_column = {}
     for col in other_cols:
-        df = df[df[col].notna() & (df[col].astype(str).str.strip() != "")]
-
-    # Reset index
-    df = df.reset_index(drop=True)
+        blank = _blank_rows(df[col])
+        by_column[str(col)] = int(blank.sum())
+        keep &= ~blank
+
+    if drop_report is not None:
+        drop_report["rows"] = int(len(keep) - keep.sum())
+        drop_report["by_column"] = {col: n for col, n in by_column.items() if n}
+
+    if not inplace:
+        return df[keep].reset_index(drop=True)
+
+    # inplace: drop the rows from this frame object, so a caller still
+    # holding `df` doesn't pin the old rows
+    df.reset_index(drop=True, inplace=True)
+    if not keep.all():
+        df.drop(index=np.flatnonzero(~keep), inplace=True)
+        df.reset_index(drop=True, inplace=True)
     return df
 
 def clean_dataset(df: pd.DataFrame) -> pd.DataFrame:
@@ -644,26 +1409,314 @@ def convert_datetime_to_string(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+# text columns with at most this share of distinct values become categories
+# (class, section, result, department ...): one small int code per row
+# instead of a Python string each
+CATEGORY_MAX_UNIQUE_SHARE = 0.5
+
+
+def _object_nbytes(codes: np.ndarray, uniques) -> int:
+    """
+    memory_usage(deep=True) of an object column from its factorized form
+    (a pointer plus the object of every cell), without visiting each cell.
+    """
+    sizes = np.fromiter((sys.getsizeof(u) for u in uniques), dtype=np.int64, count=len(uniques))
+    counts = np.bincount(codes + 1, minlength=len(uniques) + 1)
+    return int(8 * len(codes) + counts[1:] @ sizes + counts[0] * sys.getsizeof(np.nan))
+
+
+def _as_category(series: pd.Series, codes: np.ndarray, uniques) -> pd.Series:
+    """series (factorized as codes, uniques) as a category, or unchanged if it is too varied or not all text."""
+    if len(uniques) > CATEGORY_MAX_UNIQUE_SHARE * len(series):
+        return series
+    # only plain text: mixed or number categories don't store as columns
+    if pd.api.types.infer_dtype(uniques, skipna=True) != "string":
+        return series
+    categorical = pd.Categorical.from_codes(codes, pd.Index(uniques, dtype=object))
+    return pd.Series(categorical, index=series.index)
+
+
+def _as_float32(series: pd.Series) -> pd.Series:
+    """series as float32 if that changes no value, else unchanged."""
+    narrow = series.astype("float32")
+    if np.array_equal(narrow.to_numpy(dtype="float64"), series.to_numpy(dtype="float64"), equal_nan=True):
+        return narrow
+    return series
+
+
+def compact_columns(df: pd.DataFrame, report=None) -> pd.DataFrame:
+    # Last stage: dates stay datetime64 (8 bytes a row, not a string each)
+    # and are shown as YYYY-MM-DD; whole-number columns (age, ids read as
+    # numbers ...) go to the smallest int type that holds them, floats to
+    # float32 when no value changes, low-cardinality text to categories.
+    # report: pass a dict to get the frame's bytes before and after (as
+    # memory_usage(deep=True) counts them), and each converted column's dtype.
+    before = after = int(df.index.memory_usage())
+    converted = {}
+    for col in df.columns:
+        series = original = df[col]
+        measured = None  # deep bytes of the original, when known already
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ("integer", "floating"):
+            # numbers left in an object column (fill_blank put "" beside them)
+            series = pd.to_numeric(series)
+
+        if pd.api.types.is_datetime64_any_dtype(series):
+            set_format(df, col, "date")
+        elif not len(series) or pd.api.types.is_bool_dtype(series):
+            pass
+        elif pd.api.types.is_integer_dtype(series):
+            series = pd.to_numeric(series, downcast="integer")
+        elif series.dtype == np.float64:
+            series = _as_float32(series)
+        elif series.dtype == object:
+            codes, uniques = pd.factorize(series)
+            series = _as_category(series, codes, uniques)
+            if report is not None and series is not original:
+                # few distinct values: cheaper than visiting every cell
+                measured = _object_nbytes(codes, uniques)
+
+        if series.dtype != original.dtype:
+            df[col] = series
+            converted[str(col)] = str(series.dtype)
+        if report is not None:
+            if measured is None:
+                measured = int(original.memory_usage(index=False, deep=True))
+            before += measured
+            after += measured if series is original else int(series.memory_usage(index=False, deep=True))
+
+    if report is not None:
+        report.update({"bytes_before": before, "bytes_after": after, "columns": converted})
+    return df
+
 
-def run_full_cleaning_pipeline(df, output_csv="cleaned_output.csv"):
-    # run each cleaner in order
-    df = auto_fix_id_columns(df)
-    df = clean_gender_inplace(df)
-    df = clean_dob_age_pair(df)
-    df = clean_emails_inplace_df(df)
-    df = clean_attendance_inplace(df)
-    df = clean_marks_columns(df)
-    df = clean_date_columns(df)
-    df = clean_date_formate(df)
-    df = clean_nan_other_columns(df)
-    df = convert_datetime_to_string(df)
 
-    # save to CSV
-    df.to_csv(output_csv, index=False)
+# run each cleaner in order
+PIPELINE_STAGES = [
+    ("auto_fix_id_columns", auto_fix_id_columns),
+    ("clean_gender_inplace", clean_gender_inplace),
+    ("clean_dob_age_pair", clean_dob_age_pair),
+    ("clean_emails_inplace_df", clean_emails_inplace_df),
+    ("clean_attendance_inplace", clean_attendance_inplace),
+    ("clean_marks_columns", clean_marks_columns),
+    ("clean_date_columns", clean_date_columns),
+    ("clean_date_formate", clean_date_formate),
+    ("clean_nan_other_columns", clean_nan_other_columns),
+    ("compact_columns", compact_columns),
+]
+
+# stages that copy their input unless called with inplace=True
+# (the others already modify the frame they are given)
+COPYING_STAGES = {
+    "auto_fix_id_columns",
+    "clean_gender_inplace",
+    "clean_dob_age_pair",
+    "clean_emails_inplace_df",
+    "clean_attendance_inplace",
+    "clean_date_columns",
+    "clean_nan_other_columns",
+}
+
+# stages that find their columns through a DatasetSchema
+SCHEMA_STAGES = {name for name, _ in PIPELINE_STAGES} - {"compact_columns"}
+
+# stages that fit something on the data (an id numbering, a majority
+# domain, date modes ...) and take state= to keep it for appended rows
+STATEFUL_STAGES = {
+    "auto_fix_id_columns",
+    "clean_dob_age_pair",
+    "clean_emails_inplace_df",
+    "clean_attendance_inplace",
+    "clean_date_columns",
+    "clean_date_formate",
+}
+
+# roles of the columns each stage reads and writes, for running the
+# independent ones at the same time (scheduler.py); the stages not listed
+# work on the whole frame
+STAGE_ROLES = {
+    "auto_fix_id_columns": ("id",),
+    "clean_gender_inplace": ("gender",),
+    "clean_dob_age_pair": ("dob", "age"),
+    "clean_emails_inplace_df": ("email", "name", "first_name", "last_name"),
+    "clean_attendance_inplace": ("attendance",),
+    "clean_marks_columns": ("score",),
+    "clean_date_columns": ("date",),
+    "clean_date_formate": ("date_sequence",),
+}
+
+# stages that start with fill_blank over the whole frame
+FILLING_STAGES = {
+    "clean_gender_inplace",
+    "clean_emails_inplace_df",
+    "clean_attendance_inplace",
+}
+
+
+def pipeline_stages(df, schema) -> list:
+    """PIPELINE_STAGES for the scheduler, with the columns of df each one touches."""
+    stages = []
+    for name, _ in PIPELINE_STAGES:
+        roles = STAGE_ROLES.get(name)
+        columns = None if roles is None else [
+            col for col in df.columns if any(role in schema.roles(col) for role in roles)
+        ]
+        stages.append(Stage(name, columns, name in FILLING_STAGES))
+    return stages
+
+
+def _run_stage(name, df, kwargs):
+    # one stage on the scheduler's pool (a module-level function, so a
+    # process pool can pickle it); kwargs go back with the state it fitted
+    with span(name, len(df)) as timed:
+        df = dict(PIPELINE_STAGES)[name](df, **kwargs)
+        timed.rows_out = len(df)
+    return df, kwargs
+
+
+class StageMemory:
+    """
+    Per-stage tracemalloc and map_uniques accounting for run_full_cleaning_pipeline.
+    peak_ratio is (input + peak memory allocated since the pipeline started)
+    / input. If tracing only starts here, frees of the input's own columns
+    are invisible, so the ratio is an upper bound; start tracemalloc before
+    building the frame for an exact figure.
+    """
+
+    MB = 1024 * 1024
+
+    def __init__(self, df, report: list):
+        self.report = report
+        self.input_bytes = max(int(df.memory_usage(deep=True).sum()), 1)
+        self.owns_tracing = not tracemalloc.is_tracing()
+        if self.owns_tracing:
+            tracemalloc.start()
+        self.base = tracemalloc.get_traced_memory()[0]
+
+    def start(self):
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.get_traced_memory()[0]
+        self.started = time.perf_counter()
+        self.unique_before = unique_calls.snapshot()
+
+    def stop(self, stage: str, df):
+        current, peak = tracemalloc.get_traced_memory()
+        rows, calls = (now - before for now, before in zip(unique_calls.snapshot(), self.unique_before))
+        self.report.append({
+            "stage": stage,
+            "rows": len(df),
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "allocated_mb": round((current - self.before) / self.MB, 2),
+            "peak_mb": round((peak - self.before) / self.MB, 2),
+            "peak_ratio": round((self.input_bytes + peak - self.base) / self.input_bytes, 2),
+            # map_uniques: func calls made, and calls a per-cell .apply would have added
+            "unique_calls": calls,
+            "calls_saved": rows - calls,
+        })
+
+    def close(self):
+        if self.owns_tracing:
+            tracemalloc.stop()
+
+
+def run_full_cleaning_pipeline(df, output_csv="cleaned_output.csv", progress=None,
+                               inplace=False, memory_report=None, schema=None, drop_report=None,
+                               state=None, compact_report=None, scheduler=None):
+    # progress(stage_name, rows) is called before each stage starts.
+    # inplace=True: the pipeline owns `df`, so stages change only the
+    # columns they touch instead of copying the whole frame.
+    # memory_report: pass a list to get one tracemalloc entry per stage
+    # (with the calls map_uniques saved in that stage).
+    # drop_report: pass a dict to learn which columns emptied the rows
+    # clean_nan_other_columns dropped.
+    # compact_report: pass a dict to get the frame's bytes before and after
+    # compact_columns, and the dtype each converted column got.
+    # state: pass a dict to keep each stage's fit (one entry per stage).
+    # Passing the dict of an earlier run cleans df as rows appended to it.
+    # output_csv=None: don't write the CSV (the caller saves df itself).
+    # scheduler: a scheduler.StageScheduler to run independent stages at
+    # the same time (default: from the PIPELINE_* environment); it is only
+    # used for inplace runs of frames of at least its min_rows. Frames of
+    # more than two of its shards (partition_rows) are cleaned in row shards.
+    # Column roles are detected once here and shared by every stage.
+    schema = schema or DatasetSchema(df)
+    memory = StageMemory(df, memory_report) if memory_report is not None else None
+
+    def stage_kwargs(name):
+        kwargs = {}
+        if inplace and name in COPYING_STAGES:
+            kwargs["inplace"] = True
+        if name in SCHEMA_STAGES:
+            kwargs["schema"] = schema
+        if name == "clean_nan_other_columns" and drop_report is not None:
+            kwargs["drop_report"] = drop_report
+        if name == "compact_columns" and compact_report is not None:
+            kwargs["report"] = compact_report
+        if name in STATEFUL_STAGES and state is not None:
+            kwargs["state"] = state.setdefault(name, {})
+        return kwargs
+
+    scheduler = scheduler or default_scheduler()
+    # stages on column subsets need the names the cleaners normalize to;
+    # memory_report measures one stage at a time
+    parallel = (inplace and memory is None and scheduler.parallel(len(df))
+                and all(isinstance(c, str) and c == c.strip().lower() for c in df.columns))
+    partitioned = None
+    if parallel and scheduler.shards(len(df)) > 1:
+        # very long sheets: row shards cleaned at the same time (partitioned.py)
+        from partitioned import clean_partitioned, NotPartitionable
+        try:
+            partitioned = clean_partitioned(df, scheduler, schema, progress=progress, drop_report=drop_report,
+                                            state=state, compact_report=compact_report)
+        except NotPartitionable as e:
+            logger.info("Cleaning in one piece: %s", e)
+    try:
+        if partitioned is not None:
+            df = partitioned
+        elif parallel:
+            kwargs = {name: stage_kwargs(name) for name, _ in PIPELINE_STAGES}
+            df = scheduler.run(df, pipeline_stages(df, schema), _run_stage, kwargs, progress)
+            if state is not None:
+                # the stages may have run in another process
+                for name in STATEFUL_STAGES:
+                    state[name] = kwargs[name]["state"]
+        else:
+            for name, stage in PIPELINE_STAGES:
+                if progress:
+                    progress(name, len(df))
+                if memory:
+                    memory.start()
+                with span(name, len(df)) as timed:
+                    df = stage(df, **stage_kwargs(name))
+                    timed.rows_out = len(df)
+                if memory:
+                    memory.stop(name, df)
+
+        # save to CSV
+        if output_csv is not None:
+            if memory:
+                memory.start()
+            # as the text it is shown as ("85.0%", not 85.0)
+            with span("to_csv", len(df)) as timed:
+                text_frame(df).to_csv(output_csv, index=False)
+                timed.rows_out = len(df)
+            if memory:
+                memory.stop("to_csv", df)
+    finally:
+        if memory:
+            memory.close()
 
     return df
     
-def clean_dataset(df):
+def _row_keys(df: pd.DataFrame) -> np.ndarray:
+    """One uint64 per row of the raw values, to spot rows seen in an earlier upload."""
+    return pd.util.hash_pandas_object(df.astype(str), index=False).to_numpy()
+
+
+def clean_dataset(df, progress=None, memory_report=None, drop_report=None, state=None,
+                  compact_report=None):
+    # state: see run_full_cleaning_pipeline. With the state of an earlier
+    # upload, df holds appended rows: rows already uploaded are dropped too.
+
     # normalize columns
     df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
     df.columns = [c.strip().lower() for c in df.columns]
@@ -675,9 +1728,20 @@ def clean_dataset(df):
     else:
         df = df.drop_duplicates(keep='first')
 
+    if state is not None:
+        keys = _row_keys(df[columns_to_check or list(df.columns)])
+        if "seen_rows" in state:
+            new_rows = ~_in_sorted(keys, state["seen_rows"])
+            df, keys = df[new_rows], keys[new_rows]
+        state["seen_rows"] = _sorted_union(state.get("seen_rows", np.empty(0, dtype=np.uint64)), keys)
+
     df = df.reset_index(drop=True)
 
-    # run full pipeline
-    df = run_full_cleaning_pipeline(df)
+    # run full pipeline (df is our own copy now, so stages can skip theirs).
+    # No shared cleaned_output.csv: uploads are saved per user (main.py),
+    # and one file in the working directory would be every user's at once.
+    df = run_full_cleaning_pipeline(df, output_csv=None, progress=progress, inplace=True,
+                                    memory_report=memory_report, drop_report=drop_report, state=state,
+                                    compact_report=compact_report)
 
     return df
\ No newline at end of file
@@ -0,0 +1,464 @@
+# datasets.py
+# The cleaned DataFrame kept in memory so the dashboard can ask for one page
+# of rows at a time (GET /rows) instead of downloading every record.
+#
+# Configuration (environment):
+#   DATASET_CACHE_MB    memory for cached datasets and responses (default 512)
+import os
+import re
+import json
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from display import text_column, text_frame
+
+
+MAX_PAGE_ROWS = 1000
+# query results (row orders, aggregates) kept per dataset, least recently used dropped
+QUERY_CACHE_SIZE = 64
+DATASET_CACHE_MB = 512
+
+# "col:text" contains, "col=text" equals, "col!=text", "col>n", "col>=n", "col<n", "col<=n"
+FILTER_RE = re.compile(r"^(?P<col>.+?)(?P<op>>=|<=|!=|=|>|<|:)(?P<value>.*)$", re.S)
+NUMERIC_OPS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal}
+
+
+class BadQuery(ValueError):
+    """A sort or filter names a column that doesn't exist, or can't be parsed."""
+
+
+def to_records(df: pd.DataFrame, formats: Optional[Dict[str, str]] = None) -> List[Dict[str, str]]:
+    """
+    Rows as the dashboard expects them: every cell a string, blanks for NaN,
+    typed columns in their display format ("85.0%", see display.py).
+    """
+    return text_frame(df, formats).to_dict(orient="records")
+
+
+def by_uniques(series: pd.Series, fn) -> pd.Series:
+    """
+    fn(unique values) broadcast back to every row. Text columns repeat a
+    lot (grades, sections, "85%"), so string work runs once per distinct value.
+    """
+    codes, uniques = pd.factorize(series, use_na_sentinel=False)
+    mapped = fn(pd.Series(uniques, dtype=object)).to_numpy()
+    return pd.Series(mapped[codes], index=series.index)
+
+
+def numeric_values(series: pd.Series) -> pd.Series:
+    """Cells as numbers the way the dashboard reads them ("85%", "1,200")."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return series.astype(float)
+    return by_uniques(series, lambda u: pd.to_numeric(
+        u.astype(str).str.replace(r"[,%\s]", "", regex=True), errors="coerce").astype(float))
+
+
+def folded_text(series: pd.Series) -> pd.Series:
+    """Stripped, lowercased text with blanks as NaN (compare/sort form)."""
+    return by_uniques(series, lambda u: u.where(u.notna(), "").astype(str).str.strip().str.lower()
+                      .replace("", np.nan))
+
+
+class Dataset:
+    """
+    One cleaned upload plus the orders built for it. Sorting a column the
+    first time costs one argsort; after that any page of that order is a
+    slice. `version` changes with every upload, so clients can tell when the
+    rows they paged through are stale.
+
+    Built from a columnar store (see storage.py) it loads lazily: a sort or
+    aggregate reads only its columns and a page reads only its rows.
+
+    Everything it loads or builds later (columns, views, orders, query
+    results) is added to nbytes() as it is kept, and reported to
+    on_resize(delta_bytes) so a DatasetCache can keep its budget.
+    """
+
+    def __init__(self, df: Optional[pd.DataFrame] = None, name: str = "last_upload",
+                 version: Optional[str] = None, store=None, formats: Optional[Dict[str, str]] = None):
+        self._df = df
+        self.store = store
+        self.name = name
+        self.version = version or uuid.uuid4().hex[:12]
+        # column -> display format, from the dataset's schema
+        self.formats = formats or {}
+        self._columns: Optional[list] = None
+        self._rows: Optional[int] = None
+        self._series: Dict[Any, pd.Series] = {}
+        self._sort_keys: Dict[Any, pd.Series] = {}
+        self._numbers: Dict[Any, pd.Series] = {}
+        self._text: Dict[Any, pd.Series] = {}
+        self._display: Dict[Any, pd.Series] = {}
+        self._sort_index: Dict[Tuple[Any, bool], np.ndarray] = {}
+        # key -> (result, bytes)
+        self._queries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # bytes of the frame passed in (measured on first nbytes()), and of
+        # everything kept since
+        self._df_bytes: Optional[int] = None
+        self._kept_bytes = 0
+        self.on_resize = None
+
+    @classmethod
+    def from_store(cls, store, name: str = "last_upload", version: Optional[str] = None,
+                   formats: Optional[Dict[str, str]] = None) -> "Dataset":
+        if store.columnar:
+            return cls(name=name, version=version, store=store, formats=formats)
+        # a pickle can only be read whole, so read it once
+        return cls(store.read(), name=name, version=version, formats=formats)
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """The whole frame (loaded from the store on first use)."""
+        if self._df is None:
+            df = self.store.read()
+            self._df = df
+            self._resized(size_of(df))
+        return self._df
+
+    @property
+    def columns(self) -> list:
+        if self._df is not None:
+            return list(self._df.columns)
+        if self._columns is None:
+            self._columns = self.store.columns()
+        return self._columns
+
+    def __len__(self):
+        if self._df is not None:
+            return len(self._df)
+        if self._rows is None:
+            self._rows = self.store.num_rows()
+        return self._rows
+
+    def nbytes(self) -> int:
+        with self._lock:
+            if self._df_bytes is None:
+                # a frame loaded from the store is already in _kept_bytes
+                self._df_bytes = size_of(self._df) if self._df is not None and self.store is None else 0
+            return self._df_bytes + self._kept_bytes
+
+    def _resized(self, delta: int):
+        with self._lock:
+            self._kept_bytes += delta
+        if self.on_resize is not None and delta:
+            self.on_resize(delta)
+
+    def _keep(self, views: dict, key, value):
+        """views[key] = value, counted in nbytes(); the first one kept wins."""
+        with self._lock:
+            if key in views:
+                return views[key]
+            views[key] = value
+        self._resized(size_of(value))
+        return value
+
+    def column(self, name: str):
+        if name not in self.columns:
+            raise BadQuery(f"Unknown column: {name}")
+        return name
+
+    def series(self, col) -> pd.Series:
+        """One column, positionally indexed."""
+        if self._df is not None:
+            return self._df[col].reset_index(drop=True)
+        if col not in self._series:
+            return self._keep(self._series, col, self.store.read([col])[col])
+        return self._series[col]
+
+    def take(self, positions: np.ndarray, fields: Optional[list] = None) -> pd.DataFrame:
+        """Rows at the given positions, optionally only some fields."""
+        if self._df is None:
+            return self.store.take(positions, fields)
+        df = self._df if fields is None else self._df[fields]
+        return df.iloc[positions]
+
+    def memo(self, key: tuple, build):
+        """
+        Result of build() cached under `key` for the life of this dataset
+        (i.e. this upload). Returns (result, was_cached).
+        """
+        with self._lock:
+            if key in self._queries:
+                self._queries.move_to_end(key)
+                return self._queries[key][0], True
+
+        result = build()
+        size = size_of(result)
+
+        with self._lock:
+            old = self._queries.pop(key, None)
+            delta = size - (old[1] if old is not None else 0)
+            self._queries[key] = (result, size)
+            while len(self._queries) > QUERY_CACHE_SIZE:
+                delta -= self._queries.popitem(last=False)[1][1]
+        self._resized(delta)
+        return result, False
+
+    # --------------------------------------------------
+    # per-column views, built on first use
+    # --------------------------------------------------
+    def numbers(self, col) -> pd.Series:
+        if col not in self._numbers:
+            return self._keep(self._numbers, col, numeric_values(self.series(col)))
+        return self._numbers[col]
+
+    def text(self, col) -> pd.Series:
+        # folded from the shown text, so filters match what the table shows
+        if col not in self._text:
+            return self._keep(self._text, col, folded_text(self.display_text(col)))
+        return self._text[col]
+
+    def display_text(self, col) -> pd.Series:
+        """Cells as the dashboard shows them (see to_records), stripped."""
+        if col not in self._display:
+            text = text_column(self.series(col), self.formats.get(str(col)))
+            return self._keep(self._display, col, by_uniques(text, lambda u: u.str.strip()))
+        return self._display[col]
+
+    # --------------------------------------------------
+    # sorting
+    # --------------------------------------------------
+    def sort_key(self, col) -> pd.Series:
+        """
+        Numbers sort as numbers (also "85%" style text); other text sorts
+        case-insensitively. Blanks are NaN so they always go last.
+        """
+        key = self._sort_keys.get(col)
+        if key is None:
+            series = self.series(col)
+            if pd.api.types.is_datetime64_any_dtype(series):
+                key = series
+            else:
+                text = self.text(col)
+                numbers = self.numbers(col)
+                filled = text.notna().sum()
+                if filled and numbers.notna().sum() >= 0.9 * filled:
+                    key = numbers
+                else:
+                    # rank of each distinct value, so the argsort is on ints
+                    codes, uniques = pd.factorize(text)
+                    ranks = np.empty(len(uniques), dtype=float)
+                    ranks[np.argsort(uniques.to_numpy(dtype=object), kind="stable")] = np.arange(len(uniques))
+                    key = pd.Series(np.where(codes >= 0, ranks[codes], np.nan))
+            key = self._keep(self._sort_keys, col, key)
+        return key
+
+    def sort_index(self, col, descending: bool = False) -> np.ndarray:
+        index = self._sort_index.get((col, descending))
+        if index is None:
+            key = self.sort_key(col)
+            index = key.sort_values(ascending=not descending, kind="stable",
+                                    na_position="last").index.to_numpy()
+            index = self._keep(self._sort_index, (col, descending), index)
+        return index
+
+    # --------------------------------------------------
+    # filtering
+    # --------------------------------------------------
+    def parse_filter(self, text: str) -> Tuple[str, str, str]:
+        m = FILTER_RE.match(text)
+        if not m:
+            raise BadQuery(f"Bad filter: {text!r} (use column:value, column=value, column>n ...)")
+        col, op, value = m.group("col").strip(), m.group("op"), m.group("value").strip()
+        return self.column(col), op, value
+
+    def filter_mask(self, col, op: str, value: str) -> np.ndarray:
+        if op in NUMERIC_OPS:
+            try:
+                number = float(value.replace(",", "").replace("%", ""))
+            except ValueError:
+                raise BadQuery(f"Filter on {col} needs a number, got {value!r}") from None
+            numbers = self.numbers(col).to_numpy()
+            with np.errstate(invalid="ignore"):
+                return NUMERIC_OPS[op](numbers, number) & ~np.isnan(numbers)
+
+        value = value.lower()
+        text = self.text(col)
+        if op == ":":
+            if not value:
+                return np.ones(len(text), dtype=bool)
+            return by_uniques(text, lambda u: u.str.contains(value, regex=False).fillna(False)).to_numpy(dtype=bool)
+        # blank cells compare as ""
+        mask = (text.fillna("") == value).to_numpy()
+        return ~mask if op == "!=" else mask
+
+    # --------------------------------------------------
+    # pages
+    # --------------------------------------------------
+    def order(self, sort: Optional[str] = None, filters: Optional[List[str]] = None) -> Optional[np.ndarray]:
+        """
+        Row positions for a sort/filter combination, or None for the plain
+        upload order. Orders are cached, so paging through one is O(page).
+        """
+        filters = [f for f in (filters or []) if f]
+        if not sort and not filters:
+            return None
+
+        return self.memo(("order", sort, tuple(filters)),
+                         lambda: self._build_order(sort, filters))[0]
+
+    def _build_order(self, sort: Optional[str], filters: List[str]) -> np.ndarray:
+        descending = bool(sort) and sort.startswith("-")
+        sort_col = self.column(sort[1:] if descending else sort) if sort else None
+
+        mask = None
+        for text in filters:
+            part = self.filter_mask(*self.parse_filter(text))
+            mask = part if mask is None else mask & part
+
+        if sort_col is not None:
+            order = self.sort_index(sort_col, descending)
+            if mask is not None:
+                order = order[mask[order]]
+        else:
+            order = np.flatnonzero(mask)
+        return order
+
+    def page(self, offset: int = 0, limit: int = 100, sort: Optional[str] = None,
+             filters: Optional[List[str]] = None) -> Dict[str, Any]:
+        order = self.order(sort, filters)
+        if order is None:
+            total = len(self)
+            positions = np.arange(offset, min(offset + limit, total))
+        else:
+            total = len(order)
+            positions = order[offset:offset + limit]
+        rows = self.take(positions)
+
+        return {
+            "version": self.version,
+            "offset": offset,
+            "limit": limit,
+            "total": total,
+            "dataset_rows": len(self),
+            "sort": sort,
+            "filter": filters or [],
+            "columns": [str(c) for c in self.columns],
+            "rows": to_records(rows, self.formats),
+        }
+
+
+# --------------------------------------------------
+# process-wide cache
+# --------------------------------------------------
+def file_version(path) -> Optional[str]:
+    """
+    Version of a saved dataset from its file's size and mtime: stable across
+    restarts and reloads, different after every save. None if missing.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+
+def size_of(value) -> int:
+    """Rough bytes held by a cached value, for the cache budget."""
+    if isinstance(value, Dataset):
+        return value.nbytes()
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, bytearray, str)):
+        return len(value)
+    return len(json.dumps(value, default=str))
+
+
+class DatasetCache:
+    """
+    Datasets and things derived from them (schema, response bodies) kept in
+    memory, keyed by (dataset id, version, kind). Least recently used entries
+    are dropped once the total goes over max_bytes; the newest entry always
+    stays, even if it alone is over budget. A cached Dataset reports what it
+    loads and builds after it was put here (Dataset.on_resize), so its
+    entry's size follows it and the budget holds.
+
+    A new upload gets a new version, so stale entries can never be served;
+    invalidate() just frees their memory straight away.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[tuple, Tuple[Any, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    @classmethod
+    def from_env(cls) -> "DatasetCache":
+        return cls(int(float(os.getenv("DATASET_CACHE_MB", DATASET_CACHE_MB)) * 1024 * 1024))
+
+    def get(self, dataset_id: str, version: str, kind: str, build):
+        """Cached value for the key, or build() it and cache the result."""
+        key = (dataset_id, version, kind)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            self._stats["misses"] += 1
+
+        value = build()
+        self.put(dataset_id, version, kind, value)
+        return value
+
+    def put(self, dataset_id: str, version: str, kind: str, value):
+        key = (dataset_id, version, kind)
+        size = size_of(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        if isinstance(value, Dataset):
+            value.on_resize = lambda delta: self._resize(key, value, delta)
+
+    def _resize(self, key: tuple, value, delta: int):
+        """A cached value grew (or shrank) by delta bytes."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] is not value:
+                return  # dropped or replaced meanwhile
+            self._entries[key] = (value, entry[1] + delta)
+            self._entries.move_to_end(key)  # it is in use right now
+            self._bytes += delta
+            self._evict()
+
+    def _evict(self):
+        # with self._lock held
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, dropped) = self._entries.popitem(last=False)
+            self._bytes -= dropped
+            self._stats["evictions"] += 1
+
+    def invalidate(self, dataset_id: str, keep_version: Optional[str] = None):
+        """Drop every version of a dataset except keep_version."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == dataset_id and k[1] != keep_version]:
+                self._bytes -= self._entries.pop(key)[1]
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,113 @@
+# display.py
+# How typed columns are shown. The cleaners keep numbers as numbers and
+# dates as datetime64 (compact, and aggregates need no parsing); the text
+# they used to write ("85.0%", "2021-04-19") is made from the values only
+# when rows are sent as text.
+#
+# A column's format is a name from DISPLAY_FORMATS. Cleaners set it on the
+# frame (df.attrs["formats"]) and it is saved with the dataset's schema, so
+# it stays with the data wherever the frame is stored or sent.
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+
+def _percent(values: pd.Series) -> pd.Series:
+    # whole numbers as they are ("92%"), others to 2 decimals ("84.62%")
+    if pd.api.types.is_integer_dtype(values):
+        return values.astype(str) + "%"
+    return values.map(lambda v: f"{round(float(v), 2)}%" if isinstance(v, (int, float, np.number)) else str(v))
+
+
+def _date(values: pd.Series) -> pd.Series:
+    return pd.to_datetime(values, errors="coerce").dt.strftime("%Y-%m-%d").fillna("")
+
+
+# format name -> text of the (non-missing) distinct values of a column
+DISPLAY_FORMATS = {
+    "percent": _percent,
+    "date": _date,
+}
+
+
+def formats_of(df: pd.DataFrame) -> Dict[str, str]:
+    """Formats the cleaners set on df, for the columns it still has."""
+    formats = df.attrs.get("formats", {})
+    columns = {str(c) for c in df.columns}
+    return {col: fmt for col, fmt in formats.items() if col in columns}
+
+
+def set_format(df: pd.DataFrame, col, fmt: Optional[str]):
+    formats = dict(df.attrs.get("formats", {}))
+    if fmt is None:
+        formats.pop(str(col), None)
+    else:
+        formats[str(col)] = fmt
+    df.attrs["formats"] = formats
+
+
+def column_format(series: pd.Series, fmt: Optional[str] = None) -> Optional[str]:
+    # dates are always shown as dates, with or without a saved format
+    if fmt is None and pd.api.types.is_datetime64_any_dtype(series):
+        return "date"
+    return fmt if fmt in DISPLAY_FORMATS else None
+
+
+def text_column(series: pd.Series, fmt: Optional[str] = None) -> pd.Series:
+    """Cells as text in the column's format; missing cells are blank."""
+    fmt = column_format(series, fmt)
+    missing = series.isna().to_numpy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # a category already has its distinct values: format those
+        codes, uniques = series.cat.codes.to_numpy(), pd.Series(series.cat.categories)
+    elif fmt is not None:
+        # once per distinct value
+        codes, uniques = pd.factorize(series)
+        uniques = pd.Series(uniques)
+    else:
+        # float32 prints its shortest form here ("3.2"), not float64's
+        codes, uniques = None, None
+        text = series.astype(str).to_numpy(dtype=object)
+    if uniques is not None:
+        if not len(uniques):
+            shown = np.empty(0, dtype=object)
+        elif fmt is None:
+            shown = uniques.astype(str).to_numpy(dtype=object)
+        else:
+            shown = DISPLAY_FORMATS[fmt](uniques).to_numpy(dtype=object)
+        text = np.append(shown, "")[codes]
+    text = np.where(missing, "", text)
+    return pd.Series(text, index=series.index, dtype=object)
+
+
+def text_frame(df: pd.DataFrame, formats: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Every cell as the dashboard shows it (what df.fillna("").astype(str) gave before)."""
+    formats = formats_of(df) if formats is None else formats
+    return pd.DataFrame({col: text_column(df[col], formats.get(str(col))) for col in df.columns},
+                        index=df.index, columns=df.columns)
+
+
+def _float64(series: pd.Series) -> pd.Series:
+    # float32 -> float64 by its shortest text, so 2.9 stays 2.9 (not 2.9000000954)
+    codes, uniques = pd.factorize(series)
+    widened = np.append(uniques.astype(str).astype("float64"), np.nan)
+    return pd.Series(widened[codes], index=series.index)
+
+
+def json_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    df ready for to_json: numbers stay numbers, but dates are written as
+    "YYYY-MM-DD" (to_json would give epoch milliseconds) and float32 as
+    the number it prints as.
+    """
+    dates = [col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])]
+    floats = [col for col in df.columns if df[col].dtype == np.float32]
+    if not dates and not floats:
+        return df
+    out = df.copy(deep=False)
+    for col in dates:
+        out[col] = out[col].dt.strftime("%Y-%m-%d")
+    for col in floats:
+        out[col] = _float64(out[col])
+    return out
@@ -0,0 +1,132 @@
+# ingest.py
+# Streaming CSV ingestion: the upload body is copied to a temp file on disk in
+# fixed-size chunks and parsed back in row batches, so we never hold the raw
+# bytes, a decoded copy and the DataFrame in memory at the same time.
+#
+# Each batch is split into columns of their own as it is read, and each
+# column is joined on its own, its pieces freed as soon as it is done. So
+# parsing peaks at about the final frame plus one batch (its parse and
+# copy), not at twice the frame as a concat of whole batches would. The
+# frame comes back unconsolidated (a block per column); consolidating it
+# would copy it once more.
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple, Dict, Any
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+CHUNK_SIZE = 1024 * 1024        # bytes read from the multipart body per await
+BATCH_ROWS = 100_000            # rows parsed per pd.read_csv batch
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return round(peak / (1024 * 1024), 1)
+    return round(peak / 1024, 1)
+
+
+async def spool_upload(file, chunk_size: int = CHUNK_SIZE, suffix: str = ".csv",
+                       hasher=None) -> Tuple[Path, int]:
+    """
+    Copy an UploadFile to a temp file chunk by chunk. Returns (path, bytes).
+    hasher (e.g. hashlib.sha256()) is fed every chunk on the way through,
+    so the body is hashed without being read a second time.
+    """
+    fd, tmp_name = tempfile.mkstemp(prefix="upload_", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(chunk_size)
+                if not chunk:
+                    break
+                out.write(chunk)
+                if hasher is not None:
+                    hasher.update(chunk)
+                size += len(chunk)
+    except Exception:
+        os.unlink(tmp_name)
+        raise
+    return Path(tmp_name), size
+
+
+def _read_kwargs() -> Dict[str, Any]:
+    # same lenient decoding as the old `contents.decode("utf-8", errors="ignore")`
+    return {"encoding": "utf-8", "encoding_errors": "ignore"}
+
+
+def read_csv_batches(path, batch_rows: int = BATCH_ROWS, progress=None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Parse a CSV from disk in batches of `batch_rows` rows and stitch them
+    together. Returns (df, stats) where stats has rows/sec and peak RSS.
+    progress("parse_csv", rows_so_far) is called after every batch.
+    """
+    path = Path(path)
+    started = time.perf_counter()
+
+    pieces: Dict[str, list] = {}  # column -> its part of every batch
+    rows = 0
+    dtypes_seen: Dict[str, set] = {}
+    reader = pd.read_csv(path, chunksize=batch_rows, **_read_kwargs())
+    with reader:
+        for batch in reader:
+            for col, dtype in batch.dtypes.items():
+                dtypes_seen.setdefault(col, set()).add(dtype)
+                # a copy: a view would keep the whole batch alive
+                pieces.setdefault(col, []).append(batch[col].copy())
+            rows += len(batch)
+            del batch
+            if progress:
+                progress("parse_csv", rows)
+
+    if not pieces:
+        raise pd.errors.EmptyDataError("No rows to parse")
+
+    # column by column, dropping each column's pieces once it is joined;
+    # pd.concat keeps the dtype rules of concatenating whole batches
+    columns = {}
+    for col in list(pieces):
+        parts = pieces.pop(col)
+        columns[col] = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+        del parts
+    df = pd.DataFrame(columns, copy=False)
+    del columns
+
+    # A single pd.read_csv keeps a column as raw strings when any value is
+    # non-numeric. Batches infer types independently, so a column can come
+    # back as ints from one batch and strings from another; re-read just
+    # those columns as text to match the whole-file result.
+    mixed = [
+        col for col, kinds in dtypes_seen.items()
+        if len(kinds) > 1 and not all(pd.api.types.is_numeric_dtype(k) for k in kinds)
+    ]
+    if mixed:
+        text_cols = pd.read_csv(path, usecols=mixed, dtype=object, **_read_kwargs())
+        for col in mixed:
+            df[col] = text_cols[col].to_numpy()
+        del text_cols
+
+    seconds = time.perf_counter() - started
+    stats = {
+        "bytes": path.stat().st_size,
+        "rows": len(df),
+        "batch_rows": batch_rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(len(df) / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    return df, stats
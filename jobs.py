@@ -0,0 +1,171 @@
+# jobs.py
+# Background cleaning jobs: POST /jobs returns straight away, the work runs on
+# the CleaningPool and reports which stage it is in so the dashboard can show
+# progress instead of waiting on one long /upload request.
+import time
+import uuid
+import queue
+import asyncio
+import threading
+import multiprocessing
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set
+
+from cleaning import PIPELINE_STAGES
+from workers import CleaningPool, QueueProgress, JobTimeout, InvalidCSV, parse_and_clean
+from metrics import registry
+
+
+# parse_csv, then every cleaner in pipeline order
+JOB_STAGES = ["parse_csv"] + [name for name, _ in PIPELINE_STAGES]
+
+FINISHED = ("done", "failed")
+
+
+class JobManager:
+    def __init__(self, pool: CleaningPool, on_done: Optional[Callable] = None,
+                 on_failed: Optional[Callable] = None, keep_finished: int = 20):
+        self.pool = pool
+        # on_done(job, df, state) runs in a thread after a job succeeds
+        # (persist); what it returns is kept as the job's "dataset"
+        self.on_done = on_done
+        # on_failed(job) runs when it doesn't (give the quota back)
+        self.on_failed = on_failed
+        self.keep_finished = keep_finished
+
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._events = None
+        self._manager = None
+        # running _run tasks: the event loop only holds them weakly
+        self._tasks: Set[asyncio.Task] = set()
+
+    # --------------------------------------------------
+    # progress events from the workers
+    # --------------------------------------------------
+    def _event_queue(self):
+        if self._events is None:
+            if self.pool.kind == "process":
+                self._manager = multiprocessing.get_context("spawn").Manager()
+                self._events = self._manager.Queue()
+            else:
+                self._events = queue.Queue()
+            threading.Thread(target=self._drain, name="job-events", daemon=True).start()
+        return self._events
+
+    def _drain(self):
+        while True:
+            try:
+                job_id, stage, rows = self._events.get()
+            except (EOFError, OSError):
+                return  # manager shut down
+            if job_id is None:
+                return
+            self._update(job_id, status="running", stage=stage, rows=rows,
+                         step=JOB_STAGES.index(stage) + 1 if stage in JOB_STAGES else None)
+
+    def _update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # late progress events must not reopen a finished job
+            if job is None or (job["status"] in FINISHED and fields.get("status") == "running"):
+                return
+            job.update(fields)
+            job["updated_at"] = time.time()
+
+    def shutdown(self):
+        if self._events is not None:
+            self._events.put((None, None, None))
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+        self._events = None
+
+    # --------------------------------------------------
+    # job lifecycle
+    # --------------------------------------------------
+    def create(self, filename: str, owner: str, guest: bool = False) -> Dict[str, Any]:
+        now = time.time()
+        job = {
+            "id": uuid.uuid4().hex,
+            "filename": filename,
+            "owner": owner,
+            "guest": guest,
+            "status": "queued",
+            "stage": None,
+            "step": 0,
+            "total_steps": len(JOB_STAGES),
+            "rows": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now,
+            "ingest": None,
+            "dataset": None,
+        }
+        return job
+
+    def _evict(self):
+        finished = [jid for jid, job in self._jobs.items() if job["status"] in FINISHED]
+        for jid in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[jid]
+
+    def start(self, job: Dict[str, Any], path) -> asyncio.Task:
+        """
+        Submit the spooled CSV at `path` (deleted when the job ends).
+        Raises PoolFull right away, before the job is registered.
+        """
+        progress = QueueProgress(job["id"], self._event_queue())
+        future = self.pool.submit(parse_and_clean, path, progress=progress)
+        with self._lock:
+            self._jobs[job["id"]] = job
+            self._evict()
+        task = asyncio.create_task(self._run(job["id"], path, future))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _run(self, job_id: str, path, future):
+        try:
+            (df, ingest_stats, state), queue_wait, run_time = await self.pool.wait(future)
+            # the request that started the job is long gone: straight into /metrics
+            registry.observe_spans(ingest_stats.pop("trace", []))
+            ingest_stats["queue_wait_ms"] = round(queue_wait * 1000, 1)
+            ingest_stats["clean_ms"] = round(run_time * 1000, 1)
+
+            self._update(job_id, stage="save", rows=len(df))
+            job = self.get(job_id)
+            dataset = None
+            if self.on_done and job is not None:
+                dataset = await asyncio.to_thread(self.on_done, job, df, state)
+
+            self._update(job_id, status="done", stage=None, step=len(JOB_STAGES),
+                         rows=len(df), ingest=ingest_stats, dataset=dataset)
+        except InvalidCSV:
+            self._update(job_id, status="failed", error="Invalid CSV file")
+        except JobTimeout as e:
+            self._update(job_id, status="failed", error=str(e))
+        except Exception as e:
+            self._update(job_id, status="failed", error=f"Cleaning failed: {e}")
+        finally:
+            path.unlink(missing_ok=True)
+            job = self.get(job_id)
+            if self.on_failed and job is not None and job["status"] == "failed":
+                self.on_failed(job)
+
+    # --------------------------------------------------
+    # lookups
+    # --------------------------------------------------
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """JSON-safe view of a job (without who started it)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = {k: v for k, v in job.items() if k not in ("owner", "guest")}
+        if view["status"] == "done":
+            view["result_url"] = f"/jobs/{job_id}/result"
+        return view
@@ -1,27 +1,54 @@
 # main.py
 from pathlib import Path
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Body, Request
-from fastapi.responses import JSONResponse, FileResponse, HTMLResponse
+from fastapi.responses import JSONResponse, FileResponse, HTMLResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.staticfiles import StaticFiles
 
 
 import pandas as pd
-import io, os, csv, traceback, json
+import os, csv, traceback, json, time
+import asyncio
+import hashlib
+import threading
 import re
 from urllib.parse import unquote
 
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 from dotenv import load_dotenv
 # from openai import OpenAI
 
-from cleaning import clean_dataset
+from ingest import spool_upload
+from workers import CleaningPool, PoolFull, JobTimeout, InvalidCSV, parse_and_clean
+from cleaning import compact_columns
+from jobs import JobManager
+from schema import infer_schema
+from datasets import Dataset, DatasetCache, BadQuery, MAX_PAGE_ROWS, file_version
+from storage import save_frame, link_frame, save_state, save_json, load_state
+from upload_cache import UploadCache
+from namespaces import Namespaces, DatasetPaths
+from quotas import UploadQuota
+from streaming import FORMATS, records_response
+from display import formats_of, json_frame
+from aggregates import aggregate_many
+from scheduler import default_scheduler
+from metrics import MetricsMiddleware, registry, span, merge, request_rows
 
 
 # ==================================================
 # APP SETUP
 # ==================================================
-app = FastAPI(title="CSV → JSON uploader (simple)")
+class TracedJSONResponse(JSONResponse):
+    """JSONResponse whose encoding shows up on /metrics ("serialize_response")."""
+
+    def render(self, content) -> bytes:
+        with span("serialize_response"):
+            return super().render(content)
+
+
+app = FastAPI(title="CSV → JSON uploader (simple)", default_response_class=TracedJSONResponse)
 
 # CORS (DEV ONLY)
 app.add_middleware(
@@ -32,6 +59,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# wall/CPU time, rows and memory of every request and stage, for /metrics
+# (metrics.py); added last, so it is outermost and times the rest too
+app.add_middleware(MetricsMiddleware)
+
+# Parse + clean run on a bounded pool, never on the event loop
+cleaning_pool = CleaningPool.from_env()
+
+
+@app.on_event("shutdown")
+def shutdown_pool():
+    cleaning_jobs.shutdown()
+    cleaning_pool.shutdown()
+    # the stage pool of thread-pool cleaning jobs, if one was started
+    default_scheduler().shutdown()
+
 # ==================================================
 # PATHS
 # ==================================================
@@ -41,8 +83,10 @@ OUTPUT_DIR = PROJECT_DIR / "uploads"
 
 OUTPUT_DIR.mkdir(exist_ok=True)
 
-LAST_JSON_PATH = OUTPUT_DIR / "last_upload.json"
-LAST_DF_PATH = OUTPUT_DIR / "last_upload.pkl"
+# every user's cleaned uploads, one directory per dataset (namespaces.py)
+USERS_DIR = OUTPUT_DIR / "users"
+# cleaned results of past uploads, keyed by the bytes uploaded
+UPLOAD_CACHE_DIR = OUTPUT_DIR / "upload_cache"
 INDEX_PATH = PROJECT_DIR / "index.html"
 DASHBOARD_PATH = PROJECT_DIR / "dashboard.html"
 AUTH_PATH = PROJECT_DIR / "auth.html"
@@ -98,17 +142,186 @@ async def auth_page():
 
 
 
+# upload counts per user (quotas.py); counts from the old upload_limits.json
+# are imported when the database is first created
 UPLOAD_LIMIT_FILE = OUTPUT_DIR / "upload_limits.json"
+QUOTA_DB_PATH = OUTPUT_DIR / "quotas.sqlite3"
+upload_quota = UploadQuota.from_env(QUOTA_DB_PATH, import_json=UPLOAD_LIMIT_FILE)
+
+
+def is_guest(request: Request) -> bool:
+    return request.headers.get("X-User-Provider", "guest") == "guest"
+
+
+def user_key_of(request: Request) -> str:
+    """Whose datasets a request works on: the signed-in email, else the guest space."""
+    return request.headers.get("X-User-Email") or "guest"
+
+
+def check_upload_allowed(request: Request, file: UploadFile):
+    """
+    File type + quota checks shared by /upload and /jobs. Returns user_key.
+    The upload is counted here, in the same step as the check; if it then
+    fails, release_upload() takes it back.
+    """
+    user_key = user_key_of(request)
+
+    filename = file.filename or "upload.csv"
+    if not filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Only CSV files allowed")
+
+    if not upload_quota.acquire(user_key, guest=is_guest(request)):
+        raise HTTPException(
+            status_code=403,
+            detail="Guest upload limit reached. Please upgrade."
+        )
+
+    return user_key
+
+
+def release_upload(user_key, guest):
+    upload_quota.release(user_key, guest=guest)
+
+
+def save_dataset(paths: DatasetPaths, df, user_key, filename, state=None, cached=None):
+    """
+    Write a cleaned upload into its dataset directory and make it the
+    user's current one. Every file is written beside and renamed; meta.json
+    goes last, so a dataset is only listed once it is complete.
+    """
+    # save dataset (columnar when pyarrow is installed); a cached upload
+    # is already on disk, so its file is linked in instead of written again
+    if cached is not None:
+        link_frame(cached.store.path, paths.frame_base)
+    else:
+        save_frame(paths.frame_base, df)
+
+    # the cleaners' fit, tied to this version of the file
+    if state is not None:
+        state["version"] = paths.version()
+        save_state(paths.state, state)
+    else:
+        paths.state.unlink(missing_ok=True)
+
+    # column roles, so the dashboard doesn't guess them from names again
+    schema = cached.meta["schema"] if cached is not None else infer_schema(df)
+    save_json(paths.schema, schema)
+
+    now = time.time()
+    meta = paths.read_meta() or {"created_at": now}
+    meta.update({"filename": filename, "rows": len(df), "columns": len(df.columns), "updated_at": now})
+    save_json(paths.meta, meta)
+    namespaces.set_current(user_key, paths.id)
+
+    # keep the cleaned frame in memory for /rows, /columns, /aggregate ...
+    set_current_dataset(paths, df, schema)
+
+    # make room: the user's oldest datasets, then anything past its TTL
+    namespaces.collect(user_key)
+    namespaces.maybe_sweep()
+    return schema
+
+
+def upload_response(filename, df, ingest_stats, schema=None, include_data=True, paths=None,
+                    fmt="json", accept_encoding=""):
+    # include_data=False: the dashboard pages rows from /rows and asks
+    # /aggregate for its numbers, so it only needs the shape of the data
+    response = {
+        "filename": filename,
+        "dataset": paths.id if paths is not None else None,
+        "rows": len(df),
+        "columns": [str(c) for c in df.columns],
+        "version": paths.version() if paths is not None else None,
+        "ingest": ingest_stats,
+        "schema": schema or infer_schema(df),
+    }
+    request_rows(rows_out=len(df) if include_data else 0)
+    if not include_data:
+        return response
+    # records encoded batch by batch straight from the frame (streaming.py),
+    # typed columns as the text the schema's formats say
+    return records_response(df, jsonable_encoder(response), fmt, accept_encoding,
+                            formats=response["schema"].get("formats"))
+
+
+DATA_QUERY = Query(True, description="false: leave out the records (use /rows and /aggregate)")
+FORMAT_QUERY = Query("json", alias="format", description=(
+    "json: one body; json-stream: the same JSON, sent while it is encoded; "
+    "ndjson: a line with everything but the records, then one line per record"))
+
+
+def check_format(fmt):
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(FORMATS)}")
+
+
+APPEND_QUERY = Query(False, description="true: add the rows to the dataset, cleaned the same way")
+DATASET_QUERY = Query(None, description="one of your datasets (see /datasets); default: the current one")
+
+
+def user_dataset(request: Request, dataset_id=None, detail="No uploaded dataframe found.") -> DatasetPaths:
+    """The request's user's dataset (their current one by default), or 404."""
+    paths = namespaces.dataset(user_key_of(request), dataset_id)
+    if paths is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return paths
+
+
+def load_append_state(paths: DatasetPaths):
+    """The cleaners' fit on a dataset, if it is still the saved one."""
+    state = load_state(paths.state)
+    if state is None or state.get("version") != paths.version():
+        raise HTTPException(status_code=409, detail="Nothing to append to. Upload the full sheet first.")
+    return state
 
-def load_upload_limits():
-    if UPLOAD_LIMIT_FILE.exists():
-        with open(UPLOAD_LIMIT_FILE, "r") as f:
-            return json.load(f)
-    return {}
 
-def save_upload_limits(data):
-    with open(UPLOAD_LIMIT_FILE, "w") as f:
-        json.dump(data, f)
+# an append reads the dataset and writes it back: one at a time, so two
+# appends never both build on the same version
+append_lock = threading.Lock()
+
+
+def append_and_save(paths: DatasetPaths, df, state, user_key, filename):
+    """Append df to the dataset and save it. Returns (combined df, schema)."""
+    with append_lock:
+        df = append_to_dataset(paths, df, state)
+        return df, save_dataset(paths, df, user_key, filename, state)
+
+
+def append_to_dataset(paths: DatasetPaths, df, state):
+    """The dataset with the newly cleaned rows below it."""
+    # another upload finished while these rows were being cleaned
+    if state.get("version") != paths.version():
+        raise HTTPException(status_code=409, detail="The data changed while appending. Please retry.")
+    combined = pd.concat([get_current_dataset(paths).df, df], ignore_index=True)
+    # concat keeps attrs only when both sides agree; keep both sides' formats
+    combined.attrs["formats"] = {**load_formats(paths), **formats_of(df)}
+    # categories of the two parts differ, so concat gave plain strings back
+    return compact_columns(combined)
+
+
+namespaces = Namespaces.from_env(USERS_DIR)
+upload_cache = UploadCache.from_env(UPLOAD_CACHE_DIR)
+
+
+def cache_cleaned_upload(key, df, ingest_stats, state):
+    """Keep the cleaned upload for the next time the same file comes in."""
+    meta = {"ingest": ingest_stats, "schema": infer_schema(df), "state": state}
+    return upload_cache.put(key, df, meta)
+
+
+def load_cached_upload(cached):
+    """(df, ingest_stats, state) of a cache hit."""
+    ingest_stats = dict(cached.meta["ingest"], queue_wait_ms=0.0, clean_ms=0.0)
+    return cached.store.read(), ingest_stats, cached.meta["state"]
+
+
+def pool_full_error():
+    return HTTPException(
+        status_code=429,
+        detail="Server is busy cleaning other uploads. Please retry shortly.",
+        headers={"Retry-After": "5"},
+    )
+
 
 # ==================================================
 # CSV UPLOAD ENDPOINT
@@ -116,83 +329,431 @@ def save_upload_limits(data):
 @app.post("/upload")
 async def upload_csv(
     request: Request,
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    data: bool = DATA_QUERY,
+    append: bool = APPEND_QUERY,
+    dataset: Optional[str] = DATASET_QUERY,
+    fmt: str = FORMAT_QUERY,
 ):
-    user_email = request.headers.get("X-User-Email")
-    user_provider = request.headers.get("X-User-Provider", "guest")
+    check_format(fmt)
+    user_key = check_upload_allowed(request, file)
+    try:
+        return await clean_upload(request, file, user_key, data, append, dataset, fmt)
+    except BaseException:
+        # a failed upload doesn't count against the quota
+        release_upload(user_key, is_guest(request))
+        raise
 
-    is_guest = user_provider == "guest"
-    user_key = user_email or "guest"
 
-    upload_limits = load_upload_limits()
-    current_count = upload_limits.get(user_key, 0)
+async def clean_upload(request, file, user_key, data, append, dataset, fmt):
+    filename = file.filename or "upload.csv"
+    # append: only the new rows are cleaned, against the dataset's fit
+    if append:
+        paths = user_dataset(request, dataset, detail="Nothing to append to. Upload the full sheet first.")
+        state = await asyncio.to_thread(load_append_state, paths)
+    else:
+        state = None
+
+    # stream the body to disk (hashing it on the way), then parse + clean
+    # it on the worker pool, unless the same file was cleaned before
+    body_hash = hashlib.sha256()
+    tmp_path, _ = await spool_upload(file, hasher=body_hash)
+    # appends depend on the dataset they go into, not just on the file
+    cache_key = None if append else upload_cache.key(body_hash.hexdigest())
+    cached = await asyncio.to_thread(upload_cache.get, cache_key) if cache_key else None
+    try:
+        if cached is None:
+            (df, ingest_stats, state), queue_wait, run_time = await cleaning_pool.run(
+                parse_and_clean, tmp_path, state=state)
+    except PoolFull:
+        raise pool_full_error()
+    except JobTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except InvalidCSV:
+        raise HTTPException(status_code=400, detail="Invalid CSV file")
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    # reading, writing and concatenating whole frames all run in a thread
+    # too: the event loop keeps serving other requests meanwhile
+    if cached is not None:
+        df, ingest_stats, state = await asyncio.to_thread(load_cached_upload, cached)
+    else:
+        # parse + clean ran on the pool; its spans join this request's
+        merge(ingest_stats.pop("trace", []))
+        ingest_stats["queue_wait_ms"] = round(queue_wait * 1000, 1)
+        ingest_stats["clean_ms"] = round(run_time * 1000, 1)
+    ingest_stats["cache_hit"] = cached is not None
+    request_rows(rows_in=ingest_stats["rows"])
+
+    if append:
+        ingest_stats["appended_rows"] = len(df)
+        filename = (paths.read_meta() or {}).get("filename", filename)
+        df, schema = await asyncio.to_thread(append_and_save, paths, df, state, user_key, filename)
+    else:
+        if cached is None:
+            cached = await asyncio.to_thread(cache_cleaned_upload, cache_key, df, ingest_stats, state)
+        paths = namespaces.new_dataset(user_key)
+        schema = await asyncio.to_thread(save_dataset, paths, df, user_key, filename, state, cached)
+
+    return await asyncio.to_thread(upload_response, filename, df, ingest_stats, schema, include_data=data,
+                                   paths=paths, fmt=fmt, accept_encoding=request.headers.get("accept-encoding", ""))
 
-    if is_guest and current_count >= 1:
-        raise HTTPException(
-            status_code=403,
-            detail="Guest upload limit reached. Please upgrade."
-        )
 
-    filename = file.filename or "upload.csv"
-    if not filename.lower().endswith(".csv"):
-        raise HTTPException(status_code=400, detail="Only CSV files allowed")
+# ==================================================
+# BACKGROUND CLEANING JOBS
+# ==================================================
+def save_job_result(job, df, state):
+    """JobManager on_done: the job's upload becomes a new dataset. Returns its id."""
+    paths = namespaces.new_dataset(job["owner"])
+    save_dataset(paths, df, job["owner"], job["filename"], state)
+    return paths.id
 
-    contents = await file.read()
 
-    try:
-        df = pd.read_csv(io.StringIO(contents.decode("utf-8", errors="ignore")))
-    except Exception:
-        raise HTTPException(status_code=400, detail="Invalid CSV file")
+cleaning_jobs = JobManager(
+    cleaning_pool,
+    on_done=save_job_result,
+    on_failed=lambda job: release_upload(job["owner"], job["guest"]),
+)
 
-    # clean + process
-    df = clean_dataset(df)
 
-    # save dataset
-    df.to_json(LAST_JSON_PATH, orient="records")
-    df.to_pickle(LAST_DF_PATH)
+@app.post("/jobs", status_code=202)
+async def create_job(
+    request: Request,
+    file: UploadFile = File(...)
+):
+    user_key = check_upload_allowed(request, file)
+    guest = is_guest(request)
 
-    # ✅ increment AFTER success
-    upload_limits[user_key] = current_count + 1
-    save_upload_limits(upload_limits)
+    try:
+        tmp_path, _ = await spool_upload(file)
+    except BaseException:
+        release_upload(user_key, guest)
+        raise
+    job = cleaning_jobs.create(file.filename or "upload.csv", owner=user_key, guest=guest)
+    try:
+        cleaning_jobs.start(job, tmp_path)
+    except PoolFull:
+        tmp_path.unlink(missing_ok=True)
+        release_upload(user_key, guest)
+        raise pool_full_error()
 
     return {
-        "filename": filename,
-        "rows": len(df),
-        "data": df.fillna("").astype(str).to_dict(orient="records")
+        "job_id": job["id"],
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events",
     }
 
+
+def user_job(request: Request, job_id: str):
+    """The job, if the request's user started it, else 404 (as if it didn't exist)."""
+    job = cleaning_jobs.get(job_id)
+    if job is None or job["owner"] != user_key_of(request):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+def job_status(request: Request, job_id: str):
+    user_job(request, job_id)
+    status = cleaning_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return status
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(request: Request, job_id: str):
+    user_job(request, job_id)
+
+    # Server-Sent Events: one "progress" event per change, then "done"/"failed"
+    async def stream():
+        last = None
+        while True:
+            status = cleaning_jobs.status(job_id)
+            if status is None:
+                break
+            snapshot = {k: v for k, v in status.items() if k != "updated_at"}
+            if snapshot != last:
+                event = status["status"] if status["status"] in ("done", "failed") else "progress"
+                yield f"event: {event}\ndata: {json.dumps(status)}\n\n"
+                last = snapshot
+            if status["status"] in ("done", "failed"):
+                break
+            await asyncio.sleep(0.25)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(request: Request, job_id: str, data: bool = DATA_QUERY, fmt: str = FORMAT_QUERY):
+    check_format(fmt)
+    job = user_job(request, job_id)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=422, detail=job["error"])
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail="Job is still running")
+    # the job keeps only the id of the dataset it saved, which may be gone
+    # by now (deleted, or swept with the rest of the namespace)
+    paths = namespaces.dataset(job["owner"], job["dataset"]) if job["dataset"] else None
+    if paths is None:
+        raise HTTPException(status_code=410, detail="The job's dataset has been deleted")
+    current = get_current_dataset(paths)
+    # without the records only the shape is needed, so a lazy dataset isn't read whole
+    return upload_response(job["filename"], current.df if data else current, job["ingest"],
+                           schema=load_last_schema(paths), include_data=data, paths=paths,
+                           fmt=fmt, accept_encoding=request.headers.get("accept-encoding", ""))
+
+
+@app.get("/pool-stats")
+def pool_stats():
+    return cleaning_pool.stats()
+
+
+@app.get("/quota-stats")
+def quota_stats():
+    return upload_quota.stats()
+
+
+@app.get("/metrics")
+def get_metrics():
+    # Prometheus text format; stage_* histograms are parsing, each cleaner,
+    # encoders and writers, request_* are whole requests by route
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/last-upload")
-def last_upload():
-    if not LAST_JSON_PATH.exists():
+def last_upload(request: Request, data: bool = DATA_QUERY, dataset: Optional[str] = DATASET_QUERY,
+                fmt: str = FORMAT_QUERY):
+    check_format(fmt)
+    paths = user_dataset(request, dataset, detail="No previous upload found")
+    if not data:
+        current = get_current_dataset(paths)
+        request_rows(rows_out=0)
+        return {
+            "filename": dataset_filename(paths),
+            "dataset": paths.id,
+            "rows": len(current),
+            "columns": [str(c) for c in current.columns],
+            "version": current.version,
+            "schema": load_last_schema(paths),
+        }
+
+    version = paths.version()
+    if version is None:
         raise HTTPException(status_code=404, detail="No previous upload found")
+    request_rows(rows_out=len(get_current_dataset(paths)))
+
+    if fmt != "json":
+        # sent as encoded, never held whole (and not cached)
+        head = {"filename": dataset_filename(paths), "dataset": paths.id,
+                "rows": len(get_current_dataset(paths)), "schema": load_last_schema(paths)}
+        return records_response(get_current_dataset(paths).df, head, fmt,
+                                request.headers.get("accept-encoding", ""), as_text=False)
 
     try:
-        with open(LAST_JSON_PATH, "r") as f:
-            data = json.load(f)
+        body = dataset_cache.get(paths.cache_id, version, "last_upload_body",
+                                 lambda: last_upload_body(paths))
     except Exception:
         raise HTTPException(status_code=500, detail="Failed to load dataset")
+    return Response(content=body, media_type="application/json")
+
+
+def dataset_filename(paths: DatasetPaths) -> str:
+    return (paths.read_meta() or {}).get("filename", "last_upload.csv")
+
+
+def last_upload_body(paths: DatasetPaths) -> bytes:
+    # the records are already JSON: splice them in instead of parsing them
+    current = get_current_dataset(paths)
+    head = json.dumps({
+        "filename": dataset_filename(paths),
+        "dataset": paths.id,
+        "rows": len(current),
+        "schema": load_last_schema(paths),
+    })
+    return head[:-1].encode() + b', "data": ' + last_records_json(paths) + b"}"
+
+
+def last_records_json(paths: DatasetPaths) -> bytes:
+    """A dataset as JSON records, made once per version."""
+    return dataset_cache.get(paths.cache_id, paths.version(), "records_json", lambda: records_json(paths))
+
+
+def records_json(paths: DatasetPaths) -> bytes:
+    df = get_current_dataset(paths).df
+    with span("to_json", len(df)) as timed:
+        body = json_frame(df).to_json(orient="records").encode()
+        timed.rows_out = len(df)
+    return body
+
+
+# ==================================================
+# COLUMN SCHEMA OF THE CURRENT DATASET
+# ==================================================
+def load_last_schema(paths: DatasetPaths):
+    version = paths.version()
+    if version is None:
+        return None
+    return dataset_cache.get(paths.cache_id, version, "schema", lambda: read_last_schema(paths))
+
+
+def read_last_schema(paths: DatasetPaths):
+    if paths.schema.exists():
+        with open(paths.schema, "r") as f:
+            return json.load(f)
+    # saved without a schema: work it out once and keep it
+    schema = infer_schema(get_current_dataset(paths).df)
+    save_json(paths.schema, schema)
+    return schema
+
+
+def load_formats(paths: DatasetPaths) -> Dict[str, str]:
+    """Display formats saved in the dataset's schema ({} for older datasets)."""
+    try:
+        with open(paths.schema, "r") as f:
+            return json.load(f).get("formats") or {}
+    except (OSError, ValueError):
+        return {}
+
+
+@app.get("/schema")
+def get_schema(request: Request, dataset: Optional[str] = DATASET_QUERY):
+    paths = user_dataset(request, dataset)
+    try:
+        schema = load_last_schema(paths)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to load schema: {e}")
+    if schema is None:
+        raise HTTPException(status_code=404, detail="No uploaded dataframe found.")
+    return schema
+
+
+# ==================================================
+# YOUR DATASETS
+# ==================================================
+@app.get("/datasets")
+def list_datasets(request: Request):
+    return namespaces.list(user_key_of(request))
+
+
+@app.post("/datasets/{dataset_id}/current")
+def use_dataset(request: Request, dataset_id: str):
+    paths = user_dataset(request, dataset_id, detail="Dataset not found")
+    namespaces.set_current(user_key_of(request), paths.id)
+    return {"current": paths.id}
+
+
+@app.delete("/datasets/{dataset_id}")
+def delete_dataset(request: Request, dataset_id: str):
+    paths = user_dataset(request, dataset_id, detail="Dataset not found")
+    namespaces.delete(user_key_of(request), paths.id)
+    dataset_cache.invalidate(paths.cache_id)
+    return {"deleted": paths.id}
+
+
+@app.get("/dataset-stats")
+def dataset_stats():
+    return namespaces.stats()
+
+
+# ==================================================
+# PAGED ROWS OF THE CURRENT DATASET
+# ==================================================
+# datasets, their schema and response bodies, keyed by the saved file's
+# version so a new upload (from any worker process) is never missed
+dataset_cache = DatasetCache.from_env()
+
+
+def set_current_dataset(paths: DatasetPaths, df, schema=None):
+    version = paths.version()
+    dataset_cache.invalidate(paths.cache_id, keep_version=version)
+    formats = schema.get("formats") if schema is not None else formats_of(df)
+    dataset_cache.put(paths.cache_id, version, "dataset", Dataset(df, paths.id, version, formats=formats))
+    if schema is not None:
+        dataset_cache.put(paths.cache_id, version, "schema", schema)
+
+
+def get_current_dataset(paths: DatasetPaths) -> Dataset:
+    store = paths.store()
+    version = file_version(store.path)
+    if version is None:
+        raise HTTPException(status_code=404, detail="No uploaded dataframe found.")
+    # columnar stores load lazily: only the columns/rows a request needs
+    return dataset_cache.get(
+        paths.cache_id, version, "dataset",
+        lambda: Dataset.from_store(store, paths.id, version, formats=load_formats(paths)),
+    )
 
+
+@app.get("/cache-stats")
+def cache_stats():
+    return dataset_cache.stats()
+
+
+@app.get("/upload-cache-stats")
+def upload_cache_stats():
+    return upload_cache.stats()
+
+
+@app.get("/rows")
+def get_rows(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_ROWS),
+    sort: Optional[str] = Query(None, description="column, or -column for descending"),
+    filter: List[str] = Query([], description="column:text, column=text, column!=text, column>n, column<=n ..."),
+    dataset: Optional[str] = DATASET_QUERY,
+):
+    current = get_current_dataset(user_dataset(request, dataset))
+    try:
+        page = current.page(offset=offset, limit=limit, sort=sort, filters=filter)
+    except BadQuery as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    request_rows(rows_in=len(current), rows_out=len(page["rows"]))
+    return page
+
+
+# ==================================================
+# DASHBOARD AGGREGATES
+# ==================================================
+class AggregateRequest(BaseModel):
+    # e.g. {"op": "counts", "column": "gender"}; see aggregates.py
+    queries: List[Dict[str, Any]]
+
+
+@app.post("/aggregate")
+def post_aggregate(request: Request, payload: AggregateRequest, dataset: Optional[str] = DATASET_QUERY):
+    current = get_current_dataset(user_dataset(request, dataset))
     return {
-        "filename": "last_upload.csv",
-        "rows": len(data),
-        "data": data
+        "version": current.version,
+        "rows": len(current),
+        "results": aggregate_many(current, payload.queries),
     }
 
 
 # ==================================================
-# DOWNLOAD LAST JSON
+# DOWNLOAD JSON
 # ==================================================
 @app.get("/download-json")
-async def download_json():
-    if not LAST_JSON_PATH.exists():
-        raise HTTPException(
-            status_code=404,
-            detail="No JSON file found. Upload a CSV first."
-        )
-    return FileResponse(
-        LAST_JSON_PATH,
-        filename="converted.json",
-        media_type="application/json"
+def download_json(request: Request, dataset: Optional[str] = DATASET_QUERY, fmt: str = FORMAT_QUERY):
+    check_format(fmt)
+    paths = user_dataset(request, dataset, detail="No JSON file found. Upload a CSV first.")
+    request_rows(rows_out=len(get_current_dataset(paths)))
+    if fmt != "json":
+        name = "converted.ndjson" if fmt == "ndjson" else "converted.json"
+        return records_response(get_current_dataset(paths).df, None, fmt,
+                                request.headers.get("accept-encoding", ""), as_text=False,
+                                headers={"Content-Disposition": f'attachment; filename="{name}"'})
+    return Response(
+        content=last_records_json(paths),
+        media_type="application/json",
+        headers={"Content-Disposition": 'attachment; filename="converted.json"'},
     )
 
 
@@ -200,15 +761,13 @@ async def download_json():
 # GET COLUMN NAMES
 # ==================================================
 @app.get("/columns")
-async def get_columns():
-    if not LAST_DF_PATH.exists():
-        raise HTTPException(
-            status_code=404,
-            detail="No uploaded dataframe found."
-        )
+def get_columns(request: Request, dataset: Optional[str] = DATASET_QUERY):
+    paths = user_dataset(request, dataset)
     try:
-        df = pd.read_pickle(LAST_DF_PATH)
-        return {"columns": [str(c) for c in df.columns]}
+        # a columnar store answers from the file footer alone
+        return {"columns": [str(c) for c in get_current_dataset(paths).columns]}
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(
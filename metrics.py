@@ -0,0 +1,324 @@
+# metrics.py
+# Where the time of a request goes. Work worth watching (parsing, each
+# cleaner, to_json, to_pickle, the pipeline CSV, response serialization) is
+# wrapped in span(name, rows_in): wall and CPU seconds, rows in and out and
+# the change in resident memory are recorded on the current trace.
+#
+# A trace is one HTTP request (MetricsMiddleware) or one pool job
+# (collect(): parse_and_clean runs on the cleaning pool, possibly in another
+# process, and hands its spans back with its result for merge()). When a
+# request ends, its spans and its own totals go into process-wide
+# histograms, served in the Prometheus text format on /metrics. Each server
+# process counts its own requests.
+#
+# Memory is the resident set size before and after (Linux only; freeing
+# counts as 0 or less), and a request's CPU time is the whole process's,
+# so both are rough while other requests run. Stages that a process pool
+# runs for the stage scheduler are not traced one by one.
+#
+# Configuration (environment):
+#   METRICS_ENABLED       0: trace nothing, /metrics stays empty (default 1)
+#   METRICS_TRACE_HEADER  1: every response gets a Server-Timing header with
+#                         its spans; otherwise only requests that send
+#                         "X-Trace: 1" do (default 0)
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+ROWS_BUCKETS = (0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+BYTES_BUCKETS = (0, 1 << 20, 4 << 20, 16 << 20, 64 << 20, 256 << 20, 1 << 30, 4 << 30)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of this process now (None where /proc isn't there)."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class Span:
+    """One timed piece of work; start()/stop() may be called more than once."""
+
+    def __init__(self, name: str, rows_in: Optional[int] = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out: Optional[int] = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.memory: Optional[int] = None
+        self._started = None
+
+    def start(self):
+        # thread CPU: a span runs on one thread at a time, unlike the process
+        self._started = (time.perf_counter(), time.thread_time(), rss_bytes())
+
+    def stop(self):
+        wall, cpu, rss = self._started
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.thread_time() - cpu
+        after = rss_bytes()
+        if rss is not None and after is not None:
+            self.memory = (self.memory or 0) + after - rss
+        self._started = None
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "wall": self.wall, "cpu": self.cpu, "rows_in": self.rows_in,
+                "rows_out": self.rows_out, "memory": self.memory}
+
+
+class Trace:
+    """The spans of one request or pool job, as dicts (picklable)."""
+
+    def __init__(self):
+        self.spans: List[dict] = []
+        self.rows_in: Optional[int] = None
+        self.rows_out: Optional[int] = None
+
+    def add(self, span: dict):
+        self.spans.append(span)  # list.append is atomic; stages may run on threads
+
+    def server_timing(self, total: float) -> str:
+        parts = [f"{s['name']};dur={s['wall'] * 1000:.1f}" for s in self.spans]
+        return ", ".join(parts + [f"total;dur={total * 1000:.1f}"])
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("trace", default=None)
+
+
+@contextmanager
+def span(name: str, rows_in: Optional[int] = None) -> Iterator[Span]:
+    """
+    Time the block as `name` on the current trace. Set .rows_out on the
+    span it yields. Outside a request or pool job nothing is recorded.
+    """
+    trace = _current.get()
+    s = Span(name, rows_in)
+    if trace is None:
+        yield s
+        return
+    s.start()
+    try:
+        yield s
+    finally:
+        s.stop()
+        trace.add(s.as_dict())
+
+
+def traced_chunks(chunks: Iterable[bytes], name: str, rows_in: Optional[int] = None) -> Iterator[bytes]:
+    """
+    chunks of a streamed body, timed as one span: only the time spent
+    making each chunk, not the wait for the client to take it.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield from chunks
+        return
+    s = Span(name, rows_in)
+    chunks = iter(chunks)
+    try:
+        while True:
+            s.start()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                s.rows_out = rows_in  # all of them went out
+                break
+            finally:
+                s.stop()
+            yield chunk
+    finally:
+        trace.add(s.as_dict())
+
+
+def request_rows(rows_in: Optional[int] = None, rows_out: Optional[int] = None):
+    """Rows the current request took in (parsed) and sent back."""
+    trace = _current.get()
+    if trace is None:
+        return
+    if rows_in is not None:
+        trace.rows_in = rows_in
+    if rows_out is not None:
+        trace.rows_out = rows_out
+
+
+@contextmanager
+def collect() -> Iterator[Trace]:
+    """A trace of its own for a pool job; its .spans go back to merge()."""
+    trace = Trace()
+    if not registry.enabled:
+        yield trace
+        return
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def merge(spans: Sequence[dict]):
+    """Spans of a pool job: onto the current request, else straight into /metrics."""
+    trace = _current.get()
+    if trace is not None:
+        trace.spans.extend(spans)
+    else:
+        registry.observe_spans(spans)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> (count per bucket, sum, count)
+        self.series: Dict[tuple, list] = {}
+
+    def observe(self, values: tuple, value: float):
+        series = self.series.get(values)
+        if series is None:
+            series = self.series[values] = [[0] * len(self.buckets), 0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[0][i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, count) in sorted(self.series.items()):
+            labels = ",".join(f'{key}="{_escape(value)}"' for key, value in zip(self.labels, values))
+            sep = "," if labels else ""
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total!r}")
+            lines.append(f"{self.name}_count{{{labels}}} {count}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _measures(prefix: str, what: str, labels: Tuple[str, ...]) -> Dict[str, Histogram]:
+    return {
+        "wall": Histogram(f"{prefix}_wall_seconds", f"Wall clock time of {what}.", labels, SECONDS_BUCKETS),
+        "cpu": Histogram(f"{prefix}_cpu_seconds", f"CPU time of {what}.", labels, SECONDS_BUCKETS),
+        "rows_in": Histogram(f"{prefix}_rows_in", f"Rows going into {what}.", labels, ROWS_BUCKETS),
+        "rows_out": Histogram(f"{prefix}_rows_out", f"Rows coming out of {what}.", labels, ROWS_BUCKETS),
+        "memory": Histogram(f"{prefix}_memory_delta_bytes", f"Change in resident memory over {what}.",
+                            labels, BYTES_BUCKETS),
+    }
+
+
+class Metrics:
+    def __init__(self, enabled: bool = True, trace_header: bool = False):
+        self.enabled = enabled
+        self.trace_header = trace_header
+        self._lock = threading.Lock()
+        self._stages = _measures("uploader_stage", "a stage (parse, cleaner, encoder, writer)", ("stage",))
+        self._requests = _measures("uploader_request", "an HTTP request", ("method", "route", "status"))
+
+    @classmethod
+    def from_env(cls) -> "Metrics":
+        return cls(
+            enabled=os.getenv("METRICS_ENABLED", "1") != "0",
+            trace_header=os.getenv("METRICS_TRACE_HEADER", "0") == "1",
+        )
+
+    def _observe(self, histograms: Dict[str, Histogram], labels: tuple, measured: dict):
+        for key, histogram in histograms.items():
+            if measured.get(key) is not None:
+                histogram.observe(labels, measured[key])
+
+    def observe_spans(self, spans: Sequence[dict]):
+        if not self.enabled:
+            return
+        with self._lock:
+            for s in spans:
+                self._observe(self._stages, (s["name"],), s)
+
+    def observe_request(self, method: str, route: str, status: int, measured: dict, trace: Trace):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._observe(self._requests, (method, route, str(status)), measured)
+            for s in trace.spans:
+                self._observe(self._stages, (s["name"],), s)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = []
+            for histogram in (*self._stages.values(), *self._requests.values()):
+                lines += histogram.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Metrics.from_env()
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: one trace per HTTP request, observed when the last
+    byte of the body is sent (so streamed bodies are counted whole), and
+    the Server-Timing header when it is asked for.
+    """
+
+    def __init__(self, app, metrics: Optional[Metrics] = None):
+        self.app = app
+        self.metrics = metrics or registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.metrics.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = _current.set(trace)
+        started = (time.perf_counter(), time.process_time(), rss_bytes())
+        want_header = self.metrics.trace_header or (b"x-trace", b"1") in scope.get("headers", ())
+        response = {"status": 500, "done": False}
+
+        def finish():
+            if response["done"]:
+                return
+            response["done"] = True
+            wall, cpu, rss = started
+            after = rss_bytes()
+            route = scope.get("route")
+            self.metrics.observe_request(
+                scope["method"], getattr(route, "path", "unmatched"), response["status"], {
+                    "wall": time.perf_counter() - wall,
+                    "cpu": time.process_time() - cpu,
+                    "rows_in": trace.rows_in,
+                    "rows_out": trace.rows_out,
+                    "memory": after - rss if rss is not None and after is not None else None,
+                }, trace)
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                if want_header:
+                    timing = trace.server_timing(time.perf_counter() - started[0])
+                    message["headers"] = [*message.get("headers", ()), (b"server-timing", timing.encode("latin-1"))]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            _current.reset(token)
+            finish()
+
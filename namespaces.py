@@ -0,0 +1,267 @@
+# namespaces.py
+# Where each user's cleaned uploads live. Every upload is a dataset of its
+# own, under uploads/users/<user>/<dataset id>/, and the user's `current`
+# file names the one the dashboard shows. Nothing is shared between users,
+# and everything is on disk and replaced by rename, so any number of web
+# workers on one host can serve the same users.
+#
+# Datasets are removed when they have not been written for the TTL, and
+# the oldest ones go first once a user is over their quota; the current
+# dataset only goes by TTL.
+#
+# Configuration (environment):
+#   DATASET_TTL_HOURS     keep datasets this long after the last write (default 168)
+#   USER_QUOTA_MB         disk per user (default 1024)
+#   USER_MAX_DATASETS     datasets kept per user (default 20)
+#   DATASET_GC_SECONDS    time between TTL sweeps over all users (default 600)
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from datasets import file_version
+from storage import open_store
+
+
+DATASET_TTL_HOURS = 168
+USER_QUOTA_MB = 1024
+USER_MAX_DATASETS = 20
+DATASET_GC_SECONDS = 600
+
+DATASET_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+
+
+def user_dir_name(user_key: str) -> str:
+    """
+    Directory for a user: a readable slug of the key plus a hash of it, so
+    two keys that slug the same never share a directory.
+    """
+    key = user_key.strip().lower()
+    slug = re.sub(r"[^a-z0-9@._-]+", "_", key)[:40].strip(".") or "user"
+    return f"{slug}-{hashlib.sha256(key.encode()).hexdigest()[:10]}"
+
+
+class DatasetPaths:
+    """Files of one dataset: the frame, its schema, the cleaners' fit and meta."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.id = self.root.name
+        # suffix picked by storage.py: .feather with pyarrow, else .pkl
+        self.frame_base = self.root / "data"
+        self.schema = self.root / "schema.json"
+        self.state = self.root / "state.pkl"
+        self.meta = self.root / "meta.json"
+
+    @property
+    def cache_id(self) -> str:
+        """Name in the DatasetCache: unique across users."""
+        return f"{self.root.parent.name}/{self.id}"
+
+    def store(self):
+        return open_store(self.frame_base)
+
+    def version(self) -> Optional[str]:
+        return file_version(self.store().path)
+
+    def read_meta(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.meta, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def nbytes(self) -> int:
+        total = 0
+        for path in self.root.glob("*"):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                pass
+        return total
+
+
+class Namespaces:
+    """Per-user dataset directories under `root`, with TTL and quota cleanup."""
+
+    def __init__(self, root: Path, ttl_seconds: float, quota_bytes: int,
+                 max_datasets: int, gc_seconds: float):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.quota_bytes = quota_bytes
+        self.max_datasets = max_datasets
+        self.gc_seconds = gc_seconds
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+        self._stats = {"created": 0, "deleted": 0, "expired": 0, "over_quota": 0}
+
+    @classmethod
+    def from_env(cls, root: Path) -> "Namespaces":
+        return cls(
+            root,
+            ttl_seconds=float(os.getenv("DATASET_TTL_HOURS", DATASET_TTL_HOURS)) * 3600,
+            quota_bytes=int(float(os.getenv("USER_QUOTA_MB", USER_QUOTA_MB)) * 1024 * 1024),
+            max_datasets=int(os.getenv("USER_MAX_DATASETS", USER_MAX_DATASETS)),
+            gc_seconds=float(os.getenv("DATASET_GC_SECONDS", DATASET_GC_SECONDS)),
+        )
+
+    # --------------------------------------------------
+    # lookups
+    # --------------------------------------------------
+    def user_dir(self, user_key: str) -> Path:
+        return self.root / user_dir_name(user_key)
+
+    def _current_path(self, user_key: str) -> Path:
+        return self.user_dir(user_key) / "current"
+
+    def current_id(self, user_key: str) -> Optional[str]:
+        try:
+            dataset_id = self._current_path(user_key).read_text().strip()
+        except OSError:
+            return None
+        return dataset_id if DATASET_ID_RE.match(dataset_id) else None
+
+    def dataset(self, user_key: str, dataset_id: Optional[str] = None) -> Optional[DatasetPaths]:
+        """
+        A user's dataset, their current one when dataset_id is None. None
+        if there is no such dataset (ids are checked, so no path escapes).
+        """
+        dataset_id = dataset_id or self.current_id(user_key)
+        if not dataset_id or not DATASET_ID_RE.match(dataset_id):
+            return None
+        paths = DatasetPaths(self.user_dir(user_key) / dataset_id)
+        return paths if paths.meta.exists() else None
+
+    def _datasets(self, user_key: str) -> List[DatasetPaths]:
+        user_dir = self.user_dir(user_key)
+        if not user_dir.is_dir():
+            return []
+        return [DatasetPaths(p) for p in user_dir.iterdir()
+                if p.is_dir() and DATASET_ID_RE.match(p.name)]
+
+    def list(self, user_key: str) -> Dict[str, Any]:
+        """The user's datasets, newest first, with their disk use."""
+        current = self.current_id(user_key)
+        datasets = []
+        for paths in self._datasets(user_key):
+            meta = paths.read_meta()
+            if meta is None:  # still being written
+                continue
+            datasets.append(dict(meta, id=paths.id, bytes=paths.nbytes(), current=paths.id == current))
+        datasets.sort(key=lambda d: d.get("created_at", 0), reverse=True)
+        return {
+            "current": current,
+            "datasets": datasets,
+            "bytes": sum(d["bytes"] for d in datasets),
+            "quota_bytes": self.quota_bytes,
+            "max_datasets": self.max_datasets,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    # --------------------------------------------------
+    # writes
+    # --------------------------------------------------
+    def new_dataset(self, user_key: str) -> DatasetPaths:
+        """An empty dataset directory; it shows up once its meta is written."""
+        root = self.user_dir(user_key) / uuid.uuid4().hex[:12]
+        root.mkdir(parents=True)
+        with self._lock:
+            self._stats["created"] += 1
+        return DatasetPaths(root)
+
+    def set_current(self, user_key: str, dataset_id: str):
+        path = self._current_path(user_key)
+        tmp = path.with_name(f"current.{uuid.uuid4().hex[:8]}.tmp")
+        tmp.write_text(dataset_id)
+        os.replace(tmp, path)
+
+    def delete(self, user_key: str, dataset_id: str) -> bool:
+        paths = self.dataset(user_key, dataset_id)
+        if paths is None:
+            return False
+        self._remove(user_key, paths, "deleted")
+        return True
+
+    def _remove(self, user_key: str, paths: DatasetPaths, reason: str):
+        # readers that have the frame open (or memory-mapped) keep it until
+        # they let go; new requests just see the dataset gone
+        shutil.rmtree(paths.root, ignore_errors=True)
+        if self.current_id(user_key) == paths.id:
+            self._current_path(user_key).unlink(missing_ok=True)
+        with self._lock:
+            self._stats[reason] += 1
+
+    # --------------------------------------------------
+    # garbage collection
+    # --------------------------------------------------
+    def collect(self, user_key: str) -> List[str]:
+        """Drop a user's oldest datasets until they fit the quota. Returns their ids."""
+        current = self.current_id(user_key)
+        datasets = []
+        for paths in self._datasets(user_key):
+            meta = paths.read_meta()
+            if meta is not None:
+                datasets.append((meta.get("created_at", 0), paths, paths.nbytes()))
+        datasets.sort(key=lambda d: d[0])
+
+        total = sum(size for _, _, size in datasets)
+        count = len(datasets)
+        removed = []
+        for _, paths, size in datasets:
+            if total <= self.quota_bytes and count <= self.max_datasets:
+                break
+            if paths.id == current:
+                continue
+            self._remove(user_key, paths, "over_quota")
+            removed.append(paths.id)
+            total -= size
+            count -= 1
+        return removed
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Remove every dataset not written for the TTL. Returns how many."""
+        now = time.time() if now is None else now
+        removed = 0
+        for user_dir in [p for p in self.root.iterdir() if p.is_dir()]:
+            for root in [p for p in user_dir.iterdir() if p.is_dir() and DATASET_ID_RE.match(p.name)]:
+                paths = DatasetPaths(root)
+                try:
+                    written = paths.meta.stat().st_mtime
+                except OSError:
+                    # never finished (a crash mid-upload): expire by the directory
+                    written = root.stat().st_mtime
+                if now - written > self.ttl_seconds:
+                    shutil.rmtree(root, ignore_errors=True)
+                    removed += 1
+            current = user_dir / "current"
+            try:
+                if not (user_dir / current.read_text().strip() / "meta.json").exists():
+                    current.unlink(missing_ok=True)
+            except OSError:
+                pass
+            try:
+                user_dir.rmdir()  # only when nothing is left
+            except OSError:
+                pass
+        with self._lock:
+            self._stats["expired"] += removed
+        return removed
+
+    def maybe_sweep(self) -> int:
+        """sweep(), at most once per gc_seconds in this process."""
+        with self._lock:
+            if time.time() - self._last_sweep < self.gc_seconds:
+                return 0
+            self._last_sweep = time.time()
+        return self.sweep()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats)
@@ -0,0 +1,429 @@
+# partitioned.py
+# The cleaning pipeline over row shards, for sheets too long for one core.
+# Most of the cleaning is per row, but a few stages fit something on the
+# whole column first: the id prefix/suffix, padding and the numbers in use
+# (auto_fix_id_columns), the dayfirst reading and the month/day modes of
+# the birth dates, the majority email domain and the addresses taken on it,
+# the lowest attendance, the year/month/day modes of the date columns.
+#
+# So it runs in two passes over the same shards, on the stage scheduler's
+# pool (scheduler.py):
+#   1. fit: each shard reports what those fits need (counts, numbers in
+#      use, label hashes, parsed dates ...), and they are merged here into
+#      the fit the whole column would give;
+#   2. clean: each shard runs every stage with a state= built from that fit
+#      (the same path as rows appended to an earlier upload), so a shard
+#      fills in what the whole frame would have.
+# The shards are joined in order and compact_columns runs once on the
+# result. Frame, reports and the state kept for appended rows come out as
+# one run over the whole frame gives them.
+#
+# Sheets where that can't be guaranteed raise NotPartitionable before
+# anything is changed and are cleaned in one piece: a fitting stage that
+# reads a column an earlier stage rewrites, ids the vectorized split can't
+# hold, dates that don't parse to datetime64[ns], state from an earlier
+# upload.
+#
+# Configuration (environment): PIPELINE_PARTITION_ROWS, PIPELINE_WORKERS and
+# PIPELINE_POOL_KIND, see scheduler.py.
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from cleaning import (
+    PIPELINE_STAGES, COPYING_STAGES, SCHEMA_STAGES, STATEFUL_STAGES,
+    pipeline_stages, fill_blank, detect_id_columns, detect_date_columns,
+    map_uniques, compact_columns,
+    _split_order_frame, _label_hashes, _first_unused,
+    _first_date_string, _dayfirst_formats, _to_datetime_like, _parse_dob_each, _date_parts,
+    _email_columns, _clean_emails, _usernames_from_names, _generated_parts, _email_numbers,
+    _attendance_value,
+)
+from scheduler import StageScheduler, stage_graph
+from metrics import span
+
+IDS = "auto_fix_id_columns"
+DOB = "clean_dob_age_pair"
+EMAILS = "clean_emails_inplace_df"
+ATTENDANCE = "clean_attendance_inplace"
+DATES = "clean_date_columns"
+DATE_RANGE = "clean_date_formate"
+
+# stages whose fit is made in the first pass, from the columns as they are
+# when the stage starts
+FITTED_STAGES = (IDS, DOB, EMAILS, ATTENDANCE, DATES)
+
+
+class NotPartitionable(Exception):
+    """The frame can't be cleaned shard by shard with the same result."""
+
+
+def _check_stages(stages) -> Dict[str, list]:
+    """Columns of each fitted stage; raises if an earlier stage rewrites one of them."""
+    index = {stage.name: i for i, stage in enumerate(stages)}
+    for i, deps in enumerate(stage_graph(stages)):
+        stage = stages[i]
+        if stage.name in FITTED_STAGES:
+            allowed = set()
+        elif stage.name == DATE_RANGE:
+            # its columns are date columns too, already filled by clean_date_columns
+            allowed = {index[DATES]}
+        else:
+            continue
+        if deps - allowed:
+            raise NotPartitionable(f"{stage.name} reads columns an earlier stage rewrites")
+    return {stage.name: list(stage.columns) for stage in stages if stage.name in FITTED_STAGES}
+
+
+def _bounds(rows: int, shards: int) -> List[int]:
+    return [rows * i // shards for i in range(shards + 1)]
+
+
+# ---------------------------------------------------------------- pass 1: fit
+
+def _fit_ids(series: pd.Series) -> dict:
+    parts = _split_order_frame(series)
+    if parts is None:
+        raise NotPartitionable(f"{series.name}: ids the vectorized split can't hold")
+    has_num = parts["num"].notna().to_numpy()
+    prefix = parts["prefix"].to_numpy(dtype=object)[has_num]
+    suffix = parts["suffix"].to_numpy(dtype=object)[has_num]
+    num = parts["num"].to_numpy()[has_num]
+    p_codes, p_uniques = pd.factorize(prefix)
+    s_codes, s_uniques = pd.factorize(suffix)
+    hashes = _label_hashes(prefix, num, suffix)
+    repeated = pd.Series(hashes).duplicated(keep="first").to_numpy()
+    return {
+        # prefixes/suffixes of the numbered ids in order of first appearance, with counts
+        "prefixes": (np.asarray(p_uniques, dtype=object), np.bincount(p_codes, minlength=len(p_uniques))),
+        "suffixes": (np.asarray(s_uniques, dtype=object), np.bincount(s_codes, minlength=len(s_uniques))),
+        "suffix_codes": s_codes,
+        "nums": num.astype(np.int64),
+        "width": int(parts["width"].max()) if len(parts) else 0,
+        # labels of the numbered ids, each once; the rest repeat one of them
+        "hashes": hashes[~repeated],
+        "assign": int((~has_num).sum() + repeated.sum()),
+    }
+
+
+def _fit_dob(column: pd.Series, formats) -> dict:
+    out = {"dtype": str(column.dtype)}
+    for flag, (parsed, ok) in _parse_dob_each(column, formats).items():
+        if parsed.dtype != "datetime64[ns]":
+            raise NotPartitionable(f"{column.name}: birth dates don't parse to datetime64[ns]")
+        dates = parsed.dt.normalize().dropna().to_numpy()
+        _, months, days = _date_parts(dates)
+        out[flag] = (parsed.to_numpy(), ok, np.bincount(months, minlength=13), np.bincount(days, minlength=32))
+    return out
+
+
+def _fit_emails(df: pd.DataFrame, schema) -> dict:
+    email_col, name_col = _email_columns(df, schema)
+    codes, emails = _clean_emails(df[email_col])
+    valid = (emails != "").to_numpy()
+    existing = (emails[valid].str.partition("@") if valid.any()
+                else pd.DataFrame({0: [], 2: []}, dtype=object))
+    rows = pd.Series(np.bincount(codes, minlength=len(emails))[valid])
+    taken = _generated_parts(existing[0])
+    missing = emails.to_numpy(dtype=object)[codes] == ""
+    u_codes, u_uniques = pd.factorize(_usernames_from_names(df.loc[missing, name_col]))
+    return {
+        "domain_rows": rows.groupby(existing[2].to_numpy()).sum(),
+        # addresses a new one could collide with: domain, username, number
+        "taken": (existing.loc[taken.index, 2].to_numpy(dtype=object),
+                  taken["base"].to_numpy(dtype=object), taken["number"].to_numpy(dtype=np.int64)),
+        # usernames of the rows that get a new address, in row order
+        "usernames": (u_codes, np.asarray(u_uniques, dtype=object)),
+    }
+
+
+def _fit_dates(column: pd.Series, first: Optional[str]) -> dict:
+    parsed = _to_datetime_like(column, first)
+    if parsed.dtype != "datetime64[ns]":
+        raise NotPartitionable(f"{column.name}: dates don't parse to datetime64[ns]")
+    valid = parsed.dropna()
+    return {
+        "dtype": str(column.dtype),
+        "parsed": parsed.to_numpy(),
+        "year": valid.dt.year.value_counts(),
+        "month": valid.dt.month.value_counts(),
+        "day": valid.dt.day.value_counts(),
+    }
+
+
+def _fit_shard(df: pd.DataFrame, schema, columns: Dict[str, list], formats: dict) -> dict:
+    """What shard df (raw) contributes to the fit of each stage; columns: theirs."""
+    with span("partition_fit", len(df)):
+        return _fit(df, schema, columns, formats)
+
+
+def _fit(df: pd.DataFrame, schema, columns: Dict[str, list], formats: dict) -> dict:
+    id_cols = detect_id_columns(df[columns[IDS]], schema=schema)
+    fit = {IDS: {str(col): _fit_ids(df[col]) for col in id_cols}}
+
+    # the later stages see the columns after fill_blank (clean_gender_inplace starts with one)
+    df = fill_blank(df[[col for col in df.columns if col not in id_cols
+                        and any(col in cols for cols in columns.values())]])
+
+    dob_col = schema.first(df[columns[DOB]], "dob")
+    fit[DOB] = None if dob_col is None else _fit_dob(df[dob_col], formats[DOB])
+
+    fit[EMAILS] = _fit_emails(df[columns[EMAILS]].copy(), schema)
+
+    att_col = schema.first(df[columns[ATTENDANCE]], "attendance")
+    fit[ATTENDANCE] = None if att_col is None else map_uniques(df[att_col], _attendance_value).astype(float).min()
+
+    fit[DATES] = {str(col): _fit_dates(df[col], formats[DATES][str(col)])
+                  for col in detect_date_columns(df[columns[DATES]], schema=schema)}
+    return fit
+
+
+# --------------------------------------------------------------- merge the fits
+
+def _first_most_common(pairs) -> str:
+    # Counter.most_common(1) over all shards: ties go to the first seen
+    uniques = np.concatenate([u for u, _ in pairs])
+    counts = np.concatenate([c for _, c in pairs])
+    return pd.Series(counts).groupby(uniques, sort=False).sum().idxmax()
+
+
+def _nums_with_suffix(fit: dict, suffix: str) -> np.ndarray:
+    suffixes = list(fit["suffixes"][0])
+    if suffix not in suffixes:
+        return np.empty(0, dtype=np.int64)
+    return fit["nums"][fit["suffix_codes"] == suffixes.index(suffix)]
+
+
+def _merge_ids(fits: List[dict], start_at: int = 1):
+    """
+    clean_id_column's fit of the whole column, every number it ends up
+    using, and the state each shard is cleaned with.
+    """
+    nums = [fit["nums"] for fit in fits]
+    if sum(len(n) for n in nums):
+        prefix = _first_most_common([fit["prefixes"] for fit in fits])
+        suffix = _first_most_common([fit["suffixes"] for fit in fits])
+        pad_width = max(fit["width"] for fit in fits)
+        start = max(start_at, int(min(n.min() for n in nums if len(n))))
+    else:
+        prefix, suffix, pad_width, start = "", "", 0, start_at
+
+    # numbers taken with the chosen suffix
+    used = np.concatenate([_nums_with_suffix(fit, suffix) for fit in fits])
+
+    # labels a shard shares with an earlier one are repeats there too
+    hashes = np.concatenate([fit["hashes"] for fit in fits])
+    repeated = pd.Series(hashes).duplicated(keep="first").to_numpy()
+    sizes = np.cumsum([0] + [len(fit["hashes"]) for fit in fits])
+    assign = [fit["assign"] + int(repeated[a:b].sum()) for fit, a, b in zip(fits, sizes, sizes[1:])]
+    fresh = _first_unused(start, used, sum(assign))
+
+    used = np.unique(used)
+    shard_states = []
+    first = 0
+    for fit, a, b, count in zip(fits, sizes, sizes[1:], assign):
+        labels = np.sort(fit["hashes"][repeated[a:b]])
+        shard_start = int(fresh[first]) if count else start
+        window = used[(used >= shard_start) & (used <= (fresh[first + count - 1] if count else shard_start))]
+        shard_states.append({"prefix": prefix, "suffix": suffix, "pad_width": pad_width, "start": shard_start,
+                             "labels": labels, "used": window})
+        first += count
+
+    chosen = {"prefix": prefix, "suffix": suffix, "pad_width": pad_width, "start": start}
+    return chosen, np.union1d(used, fresh), shard_states
+
+
+def _merge_dob(fits: List[Optional[dict]]):
+    """(state, values of the chosen parse per shard, state per shard) for clean_dob_age_pair."""
+    if fits[0] is None:
+        return {}, None, [{} for _ in fits]
+    if len({fit["dtype"] for fit in fits}) > 1:
+        raise NotPartitionable("birth date column has different dtypes across shards")
+    if False in fits[0]:
+        dayfirst = sum(fit[True][1] for fit in fits) >= sum(fit[False][1] for fit in fits)
+    else:
+        dayfirst = True
+    months = sum(fit[dayfirst][2] for fit in fits)
+    days = sum(fit[dayfirst][3] for fit in fits)
+    if not months.sum():
+        return {}, [fit[dayfirst][0] for fit in fits], [{} for _ in fits]
+    shard_states = [{"dayfirst": dayfirst, "months": months - fit[dayfirst][2], "days": days - fit[dayfirst][3]}
+                    for fit in fits]
+    return {"dayfirst": dayfirst, "months": months, "days": days}, [fit[dayfirst][0] for fit in fits], shard_states
+
+
+def _merge_emails(fits: List[dict], default_domain: str = "gmail.com"):
+    """clean_emails_inplace_df's state of the whole column, and the state for each shard."""
+    # the alphabetically first on a tie, like mode()
+    rows_per_domain = pd.concat([fit["domain_rows"] for fit in fits]).groupby(level=0).sum()
+    domain = rows_per_domain.idxmax() if len(rows_per_domain) else default_domain
+    # an address in several shards is listed once per shard; only the set counts
+    on_domain = [fit["taken"][0] == domain for fit in fits]
+    taken_base = np.concatenate([fit["taken"][1][keep] for fit, keep in zip(fits, on_domain)])
+    taken_number = np.concatenate([fit["taken"][2][keep] for fit, keep in zip(fits, on_domain)])
+
+    usernames = [uniques[codes] for codes, uniques in (fit["usernames"] for fit in fits)]
+    users = np.concatenate(usernames) if usernames else np.empty(0, dtype=object)
+    numbers = _email_numbers(pd.Series(users, dtype=object), taken_base, taken_number)
+
+    shard_states = []
+    first = 0
+    for fit, shard_users in zip(fits, usernames):
+        # the addresses taken for this shard's usernames (the others can't
+        # collide): on the domain already, or generated by earlier shards
+        names = pd.Index(fit["usernames"][1])
+        existing = names.get_indexer(taken_base) >= 0
+        earlier = names.get_indexer(users[:first]) >= 0
+        shard_states.append({
+            "domain": domain,
+            "taken_base": np.concatenate([taken_base[existing], users[:first][earlier]]),
+            "taken_number": np.concatenate([taken_number[existing], numbers[:first][earlier]]),
+        })
+        first += len(shard_users)
+
+    state = {"domain": domain, "taken_base": np.concatenate([taken_base, users]),
+             "taken_number": np.concatenate([taken_number, numbers])}
+    return state, shard_states
+
+
+def _merge_dates(fits: List[dict]):
+    """(state, parsed values per column and shard, state per shard) for clean_date_columns."""
+    state, parsed = {}, {}
+    shard_states = [{} for _ in fits]
+    for col in fits[0]:
+        if len({fit[col]["dtype"] for fit in fits}) > 1:
+            raise NotPartitionable(f"{col}: different dtypes across shards")
+        parsed[col] = [fit[col]["parsed"] for fit in fits]
+        counts = {part: pd.concat([fit[col][part] for fit in fits]).groupby(level=0).sum()
+                  for part in ("year", "month", "day")}
+        if not counts["year"].sum():
+            continue
+        state[col] = counts
+        for shard_state, fit in zip(shard_states, fits):
+            shard_state[col] = {part: counts[part].sub(fit[col][part], fill_value=0) for part in counts}
+    return state, parsed, shard_states
+
+
+# -------------------------------------------------------------- pass 2: clean
+
+def _clean_shard(df: pd.DataFrame, kwargs: Dict[str, dict], parsed: Dict[str, Dict[str, np.ndarray]]):
+    """Every stage but compact_columns on one shard, with the dates parsed in pass 1."""
+    df = df.copy()
+    for name, stage in PIPELINE_STAGES:
+        if name == "compact_columns":
+            continue
+        for col, values in parsed.get(name, {}).items():
+            df[col] = pd.Series(values, index=df.index)
+        with span(name, len(df)) as timed:
+            df = stage(df, **kwargs[name])
+            timed.rows_out = len(df)
+    return df, kwargs
+
+
+def clean_partitioned(df: pd.DataFrame, scheduler: StageScheduler, schema, progress: Optional[Callable] = None,
+                      drop_report=None, state=None, compact_report=None) -> pd.DataFrame:
+    """
+    run_full_cleaning_pipeline(df, inplace=True, ...) over scheduler.shards(len(df))
+    row shards. df must have normalized column names. Raises NotPartitionable
+    (with df unchanged) when the result could differ from the one-piece run.
+    """
+    if state is not None and any(state.get(name) for name in STATEFUL_STAGES):
+        raise NotPartitionable("state from an earlier upload")
+    columns = _check_stages(pipeline_stages(df, schema))
+    bounds = _bounds(len(df), scheduler.shards(len(df)))
+    if progress:
+        progress(PIPELINE_STAGES[0][0], len(df))
+
+    # the value pandas guesses each date column's format from is the first
+    # of the whole column, not of each shard
+    dob_col = schema.first(df[columns[DOB]], "dob")
+    first = None if dob_col is None else _first_date_string(df[dob_col].to_numpy(dtype=object), skip_blank=True)
+    date_cols = detect_date_columns(df[columns[DATES]], schema=schema)
+    formats = {
+        DOB: _dayfirst_formats(first),
+        DATES: {str(col): _first_date_string(df[col].to_numpy(dtype=object)) for col in date_cols},
+    }
+
+    # threads share the frame; a process pool is sent just the columns the fits read
+    if scheduler.kind == "process":
+        source = df[[col for col in df.columns if any(col in cols for cols in columns.values())]]
+    else:
+        source = df
+    shards = [source.iloc[a:b] for a, b in zip(bounds, bounds[1:])]
+    n = len(shards)
+    fits = scheduler.map(_fit_shard, shards, [schema] * n, [columns] * n, [formats] * n)
+
+    ids = {col: _merge_ids([fit[IDS][col] for fit in fits]) for col in fits[0][IDS]}
+    dob_state, dob_parsed, dob_states = _merge_dob([fit[DOB] for fit in fits])
+    email_state, email_states = _merge_emails([fit[EMAILS] for fit in fits])
+    has_attendance = fits[0][ATTENDANCE] is not None
+    min_attendance = pd.Series([fit[ATTENDANCE] for fit in fits], dtype=float).min()
+    date_state, date_parsed, date_states = _merge_dates([fit[DATES] for fit in fits])
+    del fits
+
+    today = pd.to_datetime("today").normalize()
+    shard_kwargs, shard_parsed = [], []
+    for k in range(n):
+        kwargs = {}
+        for name, _ in PIPELINE_STAGES:
+            kwargs[name] = {"inplace": True} if name in COPYING_STAGES else {}
+            if name in SCHEMA_STAGES:
+                kwargs[name]["schema"] = schema
+        kwargs[IDS]["state"] = {col: shard_states[k] for col, (_, _, shard_states) in ids.items()}
+        kwargs[DOB].update(state=dob_states[k], today=today)
+        kwargs[EMAILS]["state"] = email_states[k]
+        kwargs[ATTENDANCE]["state"] = {"min": min_attendance} if has_attendance else {}
+        kwargs[DATES]["state"] = date_states[k]
+        kwargs[DATE_RANGE]["state"] = {}
+        kwargs["clean_nan_other_columns"]["drop_report"] = {}
+        shard_kwargs.append(kwargs)
+        shard_parsed.append({
+            DOB: {} if dob_parsed is None else {dob_col: dob_parsed[k]},
+            DATES: {col: values[k] for col, values in date_parsed.items()},
+        })
+    del dob_parsed, date_parsed
+
+    shards = [df.iloc[a:b] for a, b in zip(bounds, bounds[1:])]
+    results = scheduler.map(_clean_shard, shards, shard_kwargs, shard_parsed)
+    del shards
+
+    out = pd.concat([frame for frame, _ in results], ignore_index=True)
+    formats = {}
+    for frame, _ in results:
+        formats.update(frame.attrs.get("formats", {}))
+    out.attrs = {**df.attrs, "formats": formats} if formats or "formats" in df.attrs else dict(df.attrs)
+
+    if drop_report is not None:
+        reports = [kwargs["clean_nan_other_columns"]["drop_report"] for _, kwargs in results]
+        by_column = {}
+        for report in reports:
+            for col, count in report["by_column"].items():
+                by_column[col] = by_column.get(col, 0) + count
+        drop_report["rows"] = sum(report["rows"] for report in reports)
+        drop_report["by_column"] = by_column
+
+    if state is not None:
+        ranges = {}
+        for _, kwargs in results:
+            for col, saved in kwargs[DATE_RANGE]["state"].items():
+                ranges.setdefault(col, []).append(saved)
+        state[IDS] = {}
+        for col, (fit, used, _) in ids.items():
+            # each shard's labels end up in its state; the numbers are all known here
+            labels = np.unique(np.concatenate([kwargs[IDS]["state"][col]["labels"] for _, kwargs in results]))
+            state[IDS][col] = {**fit, "labels": labels, "used": used}
+        state[DOB] = dob_state
+        state[EMAILS] = email_state
+        state[ATTENDANCE] = {"min": min_attendance} if has_attendance else {}
+        state[DATES] = date_state
+        state[DATE_RANGE] = {col: {"start": min(s["start"] for s in saved), "end": max(s["end"] for s in saved),
+                                   "rows": len(df)} for col, saved in ranges.items()}
+    del results
+
+    if progress:
+        progress("compact_columns", len(out))
+    with span("compact_columns", len(out)) as timed:
+        out = compact_columns(out, **({"report": compact_report} if compact_report is not None else {}))
+        timed.rows_out = len(out)
+    return out
@@ -0,0 +1,210 @@
+# quotas.py
+# Upload counts per user, checked and taken in one step: a slot is acquired
+# before the upload is cleaned and given back if it fails, so two uploads
+# arriving together can't both get past a limit or lose each other's count.
+#
+# Counts live in SQLite (WAL mode, one upsert per check), shared by every
+# worker process on the host. Guests can instead get an in-memory token
+# bucket: a few uploads, refilled over time, per worker process.
+#
+# Configuration (environment):
+#   QUOTA_BACKEND          "sqlite" (default) or "memory" (one process, tests)
+#   QUOTA_DB               SQLite file (default uploads/quotas.sqlite3)
+#   GUEST_UPLOAD_LIMIT     uploads a guest gets in all (default 1)
+#   GUEST_QUOTA            "count" (default: GUEST_UPLOAD_LIMIT, ever) or "bucket"
+#   GUEST_BUCKET_SIZE      uploads a guest can make in a row (default 1)
+#   GUEST_BUCKET_SECONDS   seconds to earn one back (default 86400)
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+GUEST_UPLOAD_LIMIT = 1
+GUEST_BUCKET_SIZE = 1
+GUEST_BUCKET_SECONDS = 86400
+
+
+class SQLiteCounts:
+    """
+    Upload counts in one SQLite table. WAL lets readers run beside the one
+    writer, and each check is a single statement, so it is atomic across
+    threads and processes without a lock of ours.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, import_json: Optional[Path] = None):
+        self.path = Path(path)
+        self._local = threading.local()
+        # writers of this process queue here: SQLite's own wait for a busy
+        # database sleeps in steps of up to 100 ms, a lock hands over at once
+        self._write_lock = threading.Lock()
+        fresh = not self.path.exists()
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS uploads (user_key TEXT PRIMARY KEY, count INTEGER NOT NULL)")
+        if fresh and import_json is not None and Path(import_json).exists():
+            # counts kept by older versions in upload_limits.json
+            with open(import_json, "r") as f:
+                counts = json.load(f)
+            db.executemany("INSERT OR IGNORE INTO uploads VALUES (?, ?)", counts.items())
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread; sqlite3 connections aren't shared
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # WAL + NORMAL: a commit is one append, synced at checkpoints
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def acquire(self, key: str, limit: Optional[int]) -> bool:
+        if limit is not None and limit <= 0:
+            return False
+        db = self._db()
+        with self._write_lock:
+            cur = db.execute(
+                "INSERT INTO uploads VALUES (?1, 1) ON CONFLICT(user_key) DO UPDATE "
+                "SET count = count + 1 WHERE ?2 IS NULL OR count < ?2",
+                (key, limit),
+            )
+        return cur.rowcount == 1
+
+    def release(self, key: str):
+        db = self._db()
+        with self._write_lock:
+            db.execute("UPDATE uploads SET count = count - 1 WHERE user_key = ? AND count > 0", (key,))
+
+    def count(self, key: str) -> int:
+        row = self._db().execute("SELECT count FROM uploads WHERE user_key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+
+class MemoryCounts:
+    """Upload counts in a dict: one process only, gone on restart."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, limit: Optional[int]) -> bool:
+        with self._lock:
+            count = self._counts.get(key, 0)
+            if limit is not None and count >= limit:
+                return False
+            self._counts[key] = count + 1
+            return True
+
+    def release(self, key: str):
+        with self._lock:
+            if self._counts.get(key, 0) > 0:
+                self._counts[key] -= 1
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return self._counts.get(key, 0)
+
+
+class TokenBucket:
+    """
+    `size` uploads per key, one more earned every `seconds`. In memory, so
+    each worker process has its own buckets.
+    """
+
+    name = "bucket"
+
+    def __init__(self, size: int, seconds: float):
+        self.size = size
+        self.seconds = seconds
+        # key -> (tokens, time they were counted)
+        self._buckets: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _tokens(self, key: str, now: float) -> float:
+        tokens, at = self._buckets.get(key, (self.size, now))
+        return min(self.size, tokens + (now - at) / self.seconds)
+
+    def acquire(self, key: str, limit: Optional[int] = None) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                return False
+            self._buckets[key] = (tokens - 1, now)
+            return True
+
+    def release(self, key: str):
+        now = time.monotonic()
+        with self._lock:
+            self._buckets[key] = (min(self.size, self._tokens(key, now) + 1), now)
+
+    def count(self, key: str) -> int:
+        # uploads the key could make right now
+        with self._lock:
+            return int(self._tokens(key, time.monotonic()))
+
+
+class UploadQuota:
+    """
+    Who may upload: signed-in users are only counted, guests are held to
+    guest_limit uploads (or to the guest bucket, when there is one).
+    """
+
+    def __init__(self, counts, guest_limit: int = GUEST_UPLOAD_LIMIT, guest_bucket: Optional[TokenBucket] = None):
+        self.counts = counts
+        self.guest_limit = guest_limit
+        self.guest_bucket = guest_bucket
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "denied": 0, "released": 0, "check_seconds_total": 0.0,
+                       "check_seconds_max": 0.0}
+
+    @classmethod
+    def from_env(cls, default_db: Path, import_json: Optional[Path] = None) -> "UploadQuota":
+        if os.getenv("QUOTA_BACKEND", "sqlite") == "memory":
+            counts = MemoryCounts()
+        else:
+            counts = SQLiteCounts(os.getenv("QUOTA_DB") or default_db, import_json=import_json)
+        bucket = None
+        if os.getenv("GUEST_QUOTA", "count") == "bucket":
+            bucket = TokenBucket(int(os.getenv("GUEST_BUCKET_SIZE", GUEST_BUCKET_SIZE)),
+                                 float(os.getenv("GUEST_BUCKET_SECONDS", GUEST_BUCKET_SECONDS)))
+        return cls(counts, int(os.getenv("GUEST_UPLOAD_LIMIT", GUEST_UPLOAD_LIMIT)), bucket)
+
+    def _backend(self, guest: bool):
+        return self.guest_bucket if guest and self.guest_bucket is not None else self.counts
+
+    def acquire(self, user_key: str, guest: bool) -> bool:
+        """Take an upload slot if the user has one left. Give it back with release()."""
+        started = time.perf_counter()
+        ok = self._backend(guest).acquire(user_key, self.guest_limit if guest else None)
+        took = time.perf_counter() - started
+        with self._lock:
+            self._stats["checks"] += 1
+            self._stats["denied"] += not ok
+            self._stats["check_seconds_total"] += took
+            self._stats["check_seconds_max"] = max(self._stats["check_seconds_max"], took)
+        return ok
+
+    def release(self, user_key: str, guest: bool):
+        """The upload failed: it doesn't count."""
+        self._backend(guest).release(user_key)
+        with self._lock:
+            self._stats["released"] += 1
+
+    def count(self, user_key: str, guest: bool = False) -> int:
+        return self._backend(guest).count(user_key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["backend"] = self.counts.name
+        stats["guests"] = self.guest_bucket.name if self.guest_bucket is not None else self.counts.name
+        stats["check_seconds_avg"] = stats["check_seconds_total"] / stats["checks"] if stats["checks"] else None
+        return stats
@@ -0,0 +1,279 @@
+# scheduler.py
+# The cleaning stages as a dependency graph instead of a list. Most
+# cleaners only touch the columns of their own roles (gender, dob/age,
+# email, attendance, marks, dates), so on a wide sheet several of them can
+# run at once: each gets a frame of just its columns, and the columns it
+# hands back are put into the full frame when it is done.
+#
+# A stage waits for every earlier stage it shares a column with, and for
+# every earlier whole-frame stage (clean_nan_other_columns drops rows,
+# compact_columns looks at every column); whole-frame stages run alone.
+# Some cleaners start with fill_blank over the whole frame. That is a
+# per-column fillna(""), so here it is applied to each column at the point
+# it had in the sequence. The frame comes out the same as running the
+# stages one after another.
+#
+# Threads share the frame for free but pandas holds the GIL for much of
+# the cleaning (Python-level parsing of dates, ids, genders), so they gain
+# little; processes run truly in parallel but pickle each stage's columns
+# both ways. Either only pays off with several cores and wide, long sheets.
+#
+# Very long sheets are instead cut into row shards that are cleaned on the
+# same pool (partitioned.py); shards() says into how many.
+#
+# Configuration (environment):
+#   PIPELINE_WORKERS         stages run at once (default 1: one after another)
+#   PIPELINE_POOL_KIND       "thread" (default) or "process"
+#   PIPELINE_MIN_ROWS        frames with fewer rows always run one stage at a
+#                            time (default 50000)
+#   PIPELINE_PARTITION_ROWS  rows per shard; frames of at least twice this
+#                            many rows are cleaned shard by shard (default
+#                            1000000)
+import os
+import math
+import threading
+import contextvars
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+import pandas as pd
+
+
+class Stage(NamedTuple):
+    name: str
+    # columns the stage reads and writes; None: the whole frame
+    columns: Optional[Sequence]
+    # starts with fill_blank over every column of the frame
+    fills_blanks: bool = False
+
+
+def stage_graph(stages: Sequence[Stage]) -> List[Set[int]]:
+    """For each stage, the indexes of the earlier stages it has to wait for."""
+    deps = []
+    for i, stage in enumerate(stages):
+        deps.append({
+            j for j, earlier in enumerate(stages[:i])
+            if stage.columns is None or earlier.columns is None
+            or not set(stage.columns).isdisjoint(earlier.columns)
+        })
+    return deps
+
+
+def _fill_blanks(df: pd.DataFrame, columns):
+    # cleaning.fill_blank(df, inplace=True), for just these columns
+    for col in columns:
+        if df[col].isna().any():
+            df[col] = df[col].fillna("")
+
+
+def _stitch(df: pd.DataFrame, part: pd.DataFrame):
+    """Put a stage's columns (and the ones it added) back into df."""
+    if len(part) != len(df):
+        raise ValueError(f"Stage changed the row count ({len(df)} -> {len(part)})")
+    part.index = df.index  # a copy from a worker process has its own
+    for col in part.columns:
+        df[col] = part[col]
+    formats = part.attrs.get("formats")
+    if formats:
+        df.attrs["formats"] = {**df.attrs.get("formats", {}), **formats}
+
+
+class _Blanks:
+    """
+    Where each column stands against the fill_blank calls of the sequence:
+    a column needs one when a filling stage came after the last stage
+    that wrote it (or after the start, for columns no stage wrote yet).
+    """
+
+    def __init__(self, stages: Sequence[Stage]):
+        self.stages = stages
+        self.written: Dict[Any, int] = {}  # column -> index of its last writer
+        self.barrier = -1  # last whole-frame stage
+
+    def pending(self, columns, before: int) -> list:
+        fills = [i for i, stage in enumerate(self.stages[:before]) if stage.fills_blanks]
+        return [col for col in columns
+                if any(i > max(self.written.get(col, -1), self.barrier) for i in fills)]
+
+    def wrote(self, index: int, columns):
+        if self.stages[index].columns is None:
+            self.barrier = index
+        for col in columns:
+            self.written[col] = index
+
+
+class StageScheduler:
+    def __init__(self, workers: int = 1, kind: str = "thread", min_rows: int = 50_000,
+                 partition_rows: int = 1_000_000):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.workers = max(1, workers)
+        self.kind = kind
+        self.min_rows = min_rows
+        self.partition_rows = max(1, partition_rows)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "StageScheduler":
+        return cls(
+            workers=int(os.getenv("PIPELINE_WORKERS", "1")),
+            kind=os.getenv("PIPELINE_POOL_KIND", "thread"),
+            min_rows=int(os.getenv("PIPELINE_MIN_ROWS", "50000")),
+            partition_rows=int(os.getenv("PIPELINE_PARTITION_ROWS", "1000000")),
+        )
+
+    def parallel(self, rows: int) -> bool:
+        return self.workers > 1 and rows >= self.min_rows
+
+    def shards(self, rows: int) -> int:
+        """Row shards to clean a frame in: 1 (don't shard) or a multiple of the workers."""
+        if self.workers <= 1 or rows < 2 * self.partition_rows:
+            return 1
+        return math.ceil(rows / self.partition_rows / self.workers) * self.workers
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    # spawn, like the cleaning pool: the caller may run threads
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="stage"
+                    )
+            return self._executor
+
+    def start(self):
+        """Start the pool now rather than in the first parallel run."""
+        self._get_executor().submit(int).result()
+
+    def _submit(self, fn: Callable, *args):
+        if self.kind == "thread":
+            # threads run in the caller's context, so their work is traced
+            # on the caller's request (metrics.py)
+            return self._get_executor().submit(contextvars.copy_context().run, fn, *args)
+        return self._get_executor().submit(fn, *args)
+
+    def map(self, fn: Callable, *iterables: Iterable) -> list:
+        """[fn(*args) ...] on the pool, in order; the first error is raised."""
+        futures = [self._submit(fn, *args) for args in zip(*iterables)]
+        try:
+            return [future.result() for future in futures]
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def run(self, df: pd.DataFrame, stages: Sequence[Stage], call: Callable,
+            kwargs: Dict[str, dict], progress: Optional[Callable] = None) -> pd.DataFrame:
+        """
+        Run stages on df, independent ones at the same time.
+
+        call(name, frame, kwargs) runs one stage and returns (frame, kwargs);
+        it has to be picklable for a process pool. kwargs[name] is what the
+        stage is called with; it is replaced by the kwargs the stage gave
+        back, so state a stage fills in a worker process is kept.
+        Whole-frame stages run here, on df itself. If stages fail, the
+        error of the first of them in stage order is raised, as it would
+        be one stage at a time.
+        """
+        deps = stage_graph(stages)
+        blanks = _Blanks(stages)
+        added: Dict[Any, int] = {}  # column a stage added -> that stage
+        done: Set[int] = set()
+        running: Dict[Any, int] = {}
+        errors: Dict[int, BaseException] = {}
+
+        def finish(index: int, frame: pd.DataFrame, stage_kwargs: dict):
+            stage = stages[index]
+            kwargs[stage.name] = stage_kwargs
+            if stage.columns is not None:
+                for col in frame.columns:
+                    if col not in df.columns:
+                        added[col] = index
+                _stitch(df, frame)
+            blanks.wrote(index, frame.columns)
+            done.add(index)
+
+        def in_order(df: pd.DataFrame) -> pd.DataFrame:
+            # columns the stages added, where one stage at a time puts them
+            order = [col for col in df.columns if col not in added]
+            order += sorted(added, key=added.get)
+            added.clear()
+            return df if list(df.columns) == order else df[order]
+
+        while True:
+            # after a failure, only the stages before it can change the outcome
+            last = min(errors, default=len(stages))
+            ready = [i for i in range(last) if i not in done and i not in running.values()
+                     and deps[i] <= done]
+            if not ready and not running:
+                break
+
+            for i in ready:
+                stage = stages[i]
+                if stage.columns is None:
+                    # waits for every earlier stage and every later one
+                    # waits for it, so nothing else is running now
+                    df = in_order(df)
+                    _fill_blanks(df, blanks.pending(df.columns, i))
+                    if progress:
+                        progress(stage.name, len(df))
+                    try:
+                        df, stage_kwargs = call(stage.name, df, kwargs[stage.name])
+                    except Exception as e:
+                        errors[i] = e
+                    else:
+                        finish(i, df, stage_kwargs)
+                    break
+                wanted = set(stage.columns)
+                # df[columns] is already a copy; the shallow copy only drops
+                # pandas' "copy of a slice" mark, which stages assigning to it
+                # would warn about
+                part = df[[col for col in df.columns if col in wanted]].copy(deep=False)
+                _fill_blanks(part, blanks.pending(part.columns, i))
+                if progress:
+                    progress(stage.name, len(df))
+                running[self._submit(call, stage.name, part, kwargs[stage.name])] = i
+            if not running:
+                continue
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in finished:
+                i = running.pop(future)
+                try:
+                    frame, stage_kwargs = future.result()
+                except Exception as e:
+                    errors[i] = e
+                else:
+                    finish(i, frame, stage_kwargs)
+
+        if errors:
+            raise errors[min(errors)]
+        # fill_blank calls that came after a column's last writer
+        df = in_order(df)
+        _fill_blanks(df, blanks.pending(df.columns, len(stages)))
+        return df
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> StageScheduler:
+    """The process's scheduler, configured from the environment on first use."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = StageScheduler.from_env()
+        return _default
@@ -0,0 +1,189 @@
+# schema.py
+# Column-role detection done once per dataset. Every cleaner used to rescan
+# df.columns with its own keyword rules; here each column name is normalized
+# once, tagged with all the roles that apply, and a small sample of its values
+# is checked so the kind of data is known too. Cleaners ask the schema
+# ("first gender column", "all score columns") instead of rescanning.
+import re
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from display import column_format, formats_of
+
+
+ID_COLUMN_REGEX = r'\b(id|studentid|student_id|order|orderno|order_no|emp_id|empid|reg|regno|reg_no|num|number|code|ref)\b'
+SCORE_KEYWORDS = ['mark', 'gpa', 'cgpa', 'percent', '%']
+DATE_KEYWORDS = ["date", "join", "joining", "st_date", "end_date", "relieve"]
+# columns clean_nan_other_columns never drops rows for
+MANDATORY_KEYWORDS = [
+    "name", "salary", "mark", "price", "quantity",
+    "revenue", "open", "close", "temperature",
+    "humidity", "condition"
+]
+FIRST_NAME_COLUMNS = ("first_name", "firstname", "first")
+LAST_NAME_COLUMNS = ("last_name", "lastname", "last")
+
+SAMPLE_SIZE = 200
+
+EMAIL_RE = r"^[a-z0-9._%+\-]+@[a-z0-9.\-]+\.[a-z]{2,}$"
+
+
+# role -> test on the normalized (stripped, lowercased) column name.
+# Each rule is the exact check the matching cleaner used to run itself.
+ROLE_RULES = {
+    "id": lambda n: re.search(ID_COLUMN_REGEX, n, flags=re.I) is not None,     # auto_fix_id_columns
+    "gender": lambda n: "gender" in n or "sex" in n,                            # clean_gender_inplace
+    "dob": lambda n: "dob" in n or "birth" in n,                                # clean_dob_age_pair
+    "age": lambda n: "age" in n and "stage" not in n,
+    "email": lambda n: "mail" in n or "email" in n,                             # clean_emails_inplace_df
+    "name": lambda n: "name" in n and "full" not in n,
+    "first_name": lambda n: n in FIRST_NAME_COLUMNS,
+    "last_name": lambda n: n in LAST_NAME_COLUMNS,
+    "attendance": lambda n: "attendance" in n,                                  # clean_attendance_inplace
+    "score": lambda n: any(k in n for k in SCORE_KEYWORDS),                     # clean_marks_columns
+    "gpa": lambda n: "gpa" in n or "cgpa" in n,
+    "date": lambda n: any(k in n for k in DATE_KEYWORDS),                       # clean_date_columns
+    "date_sequence": lambda n: "date" in n,                                     # clean_date_formate
+    "mandatory": lambda n: any(k in n for k in MANDATORY_KEYWORDS),             # clean_nan_other_columns
+    # used by the dashboard only
+    "subject": lambda n: any(k in n for k in ("subject", "course", "module", "paper", "topic")),
+    "marks": lambda n: "mark" in n or "score" in n,
+    "percentage": lambda n: "percent" in n or "pct" in n,
+    "class": lambda n: any(k in n for k in ("class", "grade", "standard")),
+    "section": lambda n: "section" in n or n == "sec",
+    "result": lambda n: "result" in n,
+}
+
+# kind of values a role is expected to hold, for the "confirmed" flags
+EXPECTED_KIND = {
+    "age": "numeric",
+    "attendance": "numeric",
+    "score": "numeric",
+    "dob": "datetime",
+    "date": "datetime",
+    "email": "email",
+}
+
+
+def normalize_name(col) -> str:
+    return str(col).strip().lower()
+
+
+def column_roles(col) -> List[str]:
+    name = normalize_name(col)
+    return [role for role, rule in ROLE_RULES.items() if rule(name)]
+
+
+def _sample(series: pd.Series, size: int) -> pd.Series:
+    # evenly spaced rows, so a sorted or grouped sheet is still represented
+    if len(series) > size:
+        series = series.iloc[np.linspace(0, len(series) - 1, size).astype(int)]
+    return series
+
+
+def _share(mask: pd.Series) -> float:
+    return float(mask.mean()) if len(mask) else 0.0
+
+
+def sample_kind(series: pd.Series, size: int = SAMPLE_SIZE) -> Dict[str, Any]:
+    """Look at up to `size` values and guess what they hold."""
+    sample = _sample(series, size)
+    null_share = _share(sample.isna())
+    values = sample.dropna()
+
+    if pd.api.types.is_bool_dtype(series):
+        kind = "boolean"
+    elif pd.api.types.is_numeric_dtype(series):
+        kind = "numeric"
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        kind = "datetime"
+    else:
+        text = values.astype(str).str.strip()
+        text = text[text != ""]
+        if text.empty:
+            kind = "empty"
+        else:
+            as_number = pd.to_numeric(text.str.replace(r"[%,\s]", "", regex=True), errors="coerce")
+            fraction = text.str.fullmatch(r"\d+(\.\d+)?\s*/\s*\d+(\.\d+)?")
+            if _share(as_number.notna() | fraction) >= 0.9:
+                kind = "numeric"
+            elif _share(text.str.lower().str.match(EMAIL_RE)) >= 0.8:
+                kind = "email"
+            elif _share(_parse_dates(text).notna()) >= 0.8:
+                kind = "datetime"
+            else:
+                kind = "text"
+
+    return {
+        "kind": kind,
+        "null_share": round(null_share, 3),
+        "sample_unique": int(values.astype(str).nunique()) if len(values) else 0,
+    }
+
+
+def _parse_dates(text: pd.Series) -> pd.Series:
+    # numbers parse as epoch timestamps; they are not dates here
+    text = text[pd.to_numeric(text, errors="coerce").isna()]
+    try:
+        return pd.to_datetime(text, errors="coerce", format="mixed")
+    except (TypeError, ValueError):
+        return pd.Series(pd.NaT, index=text.index)
+
+
+class DatasetSchema:
+    """
+    Roles per column, worked out once per column name and cached.
+
+    Lookups take the frame so that columns a cleaner adds later (e.g. the
+    generated "email" column) are picked up on the fly, and so results come
+    back in df.columns order, exactly like the per-cleaner scans did.
+    """
+
+    def __init__(self, df: Optional[pd.DataFrame] = None):
+        self._roles: Dict[Any, List[str]] = {}
+        if df is not None:
+            for col in df.columns:
+                self.roles(col)
+
+    def roles(self, col) -> List[str]:
+        roles = self._roles.get(col)
+        if roles is None:
+            roles = self._roles[col] = column_roles(col)
+        return roles
+
+    def columns(self, df: pd.DataFrame, role: str) -> list:
+        return [col for col in df.columns if role in self.roles(col)]
+
+    def first(self, df: pd.DataFrame, role: str):
+        return next((col for col in df.columns if role in self.roles(col)), None)
+
+    def describe(self, df: pd.DataFrame, sample_size: int = SAMPLE_SIZE) -> Dict[str, Any]:
+        """Roles, sampled value kinds and display formats of every column, JSON-ready."""
+        columns = []
+        by_role: Dict[str, list] = {}
+        formats = {}
+        saved = formats_of(df)
+        for col in df.columns:
+            roles = self.roles(col)
+            info = {"name": str(col), "roles": roles}
+            info.update(sample_kind(df[col], sample_size))
+            # how the typed values are shown ("percent", "date"); see display.py
+            info["format"] = column_format(df[col], saved.get(str(col)))
+            if info["format"]:
+                formats[str(col)] = info["format"]
+            # does the data look like what the name promises?
+            info["confirmed"] = {
+                role: info["kind"] == EXPECTED_KIND[role]
+                for role in roles if role in EXPECTED_KIND
+            }
+            columns.append(info)
+            for role in roles:
+                by_role.setdefault(role, []).append(str(col))
+        return {"rows": len(df), "columns": columns, "roles": by_role, "formats": formats}
+
+
+def infer_schema(df: pd.DataFrame) -> Dict[str, Any]:
+    """Schema of a (cleaned) frame for /schema and the upload responses."""
+    return DatasetSchema(df).describe(df)
@@ -8,6 +8,17 @@ if (localStorage.getItem("hasData") === "true") {
 window.isFileUploaded = localStorage.getItem("hasData") === "true";
 window.isUploading = false;
 
+// every dataset request says whose data it is: the server keeps each
+// user's uploads apart (a guest without an email shares the guest space)
+window.userHeaders = function (extra = {}) {
+  const authUser = JSON.parse(localStorage.getItem("authUser") || "null") || {};
+  return {
+    "X-User-Email": authUser.email || "guest",
+    "X-User-Provider": authUser.provider || "guest",
+    ...extra
+  };
+};
+
 
 // ===== PAGE STATE HANDLER =====
 function updatePageState(section) {
@@ -184,8 +184,11 @@ Table.parseNumber = function (v) {
   return n;
 };
 
-// smart column picker
+// smart column picker (server schema roles first, see columndetector.js)
 Table.pickColumnSmart = function (columns, keywords) {
+  const fromSchema = Table.pickFromSchema?.(columns, keywords);
+  if (fromSchema) return fromSchema;
+
   let best = null;
   let bestScore = 0;
 
@@ -258,9 +261,9 @@ window.renderSkipPanel = function (parent, title, reason) {
 (function () {
 
   function renderAttendanceChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const attCol = Table.pickColumnSmart(columns, attendanceKeywords);
+    const attCol = summaries.cols.attendance;
 
 
     if (!attCol) {
@@ -268,15 +271,14 @@ window.renderSkipPanel = function (parent, title, reason) {
       return;
     }
 
-    const result = Table.buildAttendanceBucketsWithRows(records, attCol);
+    const result = Summaries.get("attendanceBuckets");
     if (!result || !result.buckets) {
       renderSkipPanel(parent, "Attendance Charts", "No numeric attendance data");
       return;
     }
 
-    const buckets = result.buckets;
-    const labels = Object.keys(buckets);
-    const data   = Object.values(buckets).map(r => r.length);
+    const labels = result.buckets.map(b => b.label);
+    const data   = result.buckets.map(b => b.count);
 
     if (!labels.length) {
       renderSkipPanel(parent, "Attendance Charts", "No bucket data");
@@ -322,23 +324,24 @@ window.renderSkipPanel = function (parent, title, reason) {
 (function () {
 
   function renderGenderChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const genderCol = Table.pickColumnSmart(columns, genderKeywords);
+    const genderCol = summaries.cols.gender;
+    const counts = Summaries.get("genderCounts");
 
-    if (!genderCol) {
+    if (!genderCol || !counts) {
       renderSkipPanel(parent, "Gender Charts", "Gender column not detected");
       return;
     }
 
     let male = 0, female = 0, other = 0;
 
-    records.forEach(r => {
-      const v = String(r[genderCol] || "").toLowerCase();
+    counts.values.forEach(({ value, count }) => {
+      const v = String(value || "").toLowerCase();
       if (!v) return;
-      if (v.startsWith("m")) male++;
-      else if (v.startsWith("f")) female++;
-      else other++;
+      if (v.startsWith("m")) male += count;
+      else if (v.startsWith("f")) female += count;
+      else other += count;
     });
 
     if (!male && !female && !other) {
@@ -381,41 +384,27 @@ window.renderSkipPanel = function (parent, title, reason) {
 (function () {
 
   function renderMarksChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const subjectCol = Table.pickColumnSmart(columns, subjectKeywords);
+    const subjectCol = summaries.cols.subject;
 
-    const marksCol = Table.pickColumnSmart(columns, marksKeywords);
+    const marksCol = summaries.cols.marks;
 
     if (!subjectCol || !marksCol) {
       // renderSkipPanel(parent,"Marks Charts","Subject or marks column not detected");
       return;
     }
 
-    const map = new Map();
-
-    records.forEach(r => {
-      const subject = r[subjectCol];
-      const v = Table.parseNumber(r[marksCol]);
-      if (!subject || Number.isNaN(v)) return;
-
-      if (!map.has(subject)) map.set(subject, []);
-      map.get(subject).push(v);
-    });
+    // average per subject, grouped on the server
+    const groups = Summaries.get("subjectMarks")?.groups || [];
 
-    if (!map.size) {
+    if (!groups.length) {
       renderSkipPanel(parent, "Marks Charts", "No numeric marks data");
       return;
     }
 
-    const labels = [];
-    const avgData = [];
-
-    map.forEach((vals, subject) => {
-      const avg = vals.reduce((a,b)=>a+b,0) / vals.length;
-      labels.push(subject);
-      avgData.push(+avg.toFixed(2));
-    });
+    const labels = groups.map(g => g.group);
+    const avgData = groups.map(g => +g.value.toFixed(2));
 
     /* ===== BAR ===== */
     const barPanel = ChartCore.createPanel(
@@ -468,24 +457,25 @@ window.renderSkipPanel = function (parent, title, reason) {
 (function () {
 
   function renderResultChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const resultCol = Table.pickColumnSmart(columns, resultKeywords);
+    const resultCol = summaries.cols.result;
+    const counts = Summaries.get("resultCounts");
 
-    if (!resultCol) {
+    if (!resultCol || !counts) {
       // renderSkipPanel(parent, "Result Charts", "Result/status column not detected");
       return;
     }
 
     let pass = 0, fail = 0, other = 0;
 
-    records.forEach(r => {
-      const v = String(r[resultCol] || "").toLowerCase();
+    counts.values.forEach(({ value, count }) => {
+      const v = String(value || "").toLowerCase();
       if (!v) return;
 
-      if (v.includes("pass")) pass++;
-      else if (v.includes("fail")) fail++;
-      else other++;
+      if (v.includes("pass")) pass += count;
+      else if (v.includes("fail")) fail += count;
+      else other += count;
     });
 
     if (!pass && !fail && !other) {
@@ -575,40 +565,30 @@ window.renderSkipPanel = function (parent, title, reason) {
   }
 
   function renderTop6ChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const metricCol =
-      window.Table.pickColumnSmart(columns, marksKeywords) ||
-      window.Table.pickColumnSmart(columns, attendanceKeywords) ||
-      window.Table.pickColumnSmart(columns, percentageKeywords);
+    const cols = summaries.cols;
+    const metricCol = cols.marks || cols.attendance || cols.percentage;
 
 
-    const nameCol = Table.pickColumnSmart(columns, nameKeywords);
+    const nameCol = cols.name;
 
     if (!metricCol) {
       renderSkipPanel(parent, "Top-6 Charts", "Metric column not detected");
       return;
     }
 
-    const rows = [];
-
-    records.forEach((r, i) => {
-      const v = Table.parseNumber(r[metricCol]);
-      if (Number.isNaN(v)) return;
-
-      rows.push({
-        label: nameCol ? r[nameCol] : `Row ${i+1}`,
-        value: v
-      });
-    });
+    // already ranked on the server
+    const rows = (Summaries.get("metricChartTop")?.rows || []).map(r => ({
+      label: nameCol ? r[nameCol] : `Row ${r.__row}`,
+      value: r.__value
+    }));
 
     if (!rows.length) {
       renderSkipPanel(parent, "Top-6 Charts", "No numeric values");
       return;
     }
 
-    rows.sort((a,b)=>b.value-a.value);
-
     buildRankCharts(
       parent,
       `Top-6 ${metricCol}`,
@@ -618,40 +598,30 @@ window.renderSkipPanel = function (parent, title, reason) {
   }
 
   function renderLow6ChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent || !window.summaries) return;
 
-    const metricCol =
-      window.Table.pickColumnSmart(columns, marksKeywords) ||
-      window.Table.pickColumnSmart(columns, attendanceKeywords) ||
-      window.Table.pickColumnSmart(columns, percentageKeywords);
+    const cols = summaries.cols;
+    const metricCol = cols.marks || cols.attendance || cols.percentage;
 
 
-    const nameCol = Table.pickColumnSmart(columns, nameKeywords);
+    const nameCol = cols.name;
 
     if (!metricCol) {
       renderSkipPanel(parent, "Lowest-6 Charts", "Metric column not detected");
       return;
     }
 
-    const rows = [];
-
-    records.forEach((r, i) => {
-      const v = Table.parseNumber(r[metricCol]);
-      if (Number.isNaN(v)) return;
-
-      rows.push({
-        label: nameCol ? r[nameCol] : `Row ${i+1}`,
-        value: v
-      });
-    });
+    // already ranked on the server
+    const rows = (Summaries.get("metricChartLow")?.rows || []).map(r => ({
+      label: nameCol ? r[nameCol] : `Row ${r.__row}`,
+      value: r.__value
+    }));
 
     if (!rows.length) {
       renderSkipPanel(parent, "Lowest-6 Charts", "No numeric values");
       return;
     }
 
-    rows.sort((a,b)=>a.value-b.value);
-
     buildRankCharts(
       parent,
       `Lowest-6 ${metricCol}`,
@@ -667,27 +637,16 @@ window.renderSkipPanel = function (parent, title, reason) {
 })();
 (function () {
 
-  function collectAttendanceRows() {
-    const attCol = Table.pickColumnSmart(columns, attendanceKeywords);
-
-    if (!attCol) return null;
-
-    const nameCol = Table.pickColumnSmart(columns, nameKeywords);
-
-    const rows = [];
-
-    records.forEach((r, i) => {
-      let v = Table.parseNumber(r[attCol]);
-      if (Number.isNaN(v)) return;
+  // which = "Top" | "Low"; ranked on the server, 0–1 read as a fraction of 100
+  function collectAttendanceRows(which) {
+    if (!window.summaries?.cols.attendance) return null;
 
-      // normalize 0–1 → %
-      if (v > 0 && v <= 1) v *= 100;
+    const nameCol = summaries.cols.name;
 
-      rows.push({
-        label: nameCol ? (r[nameCol] || `Row ${i+1}`) : `Row ${i+1}`,
-        value: +v.toFixed(2)
-      });
-    });
+    const rows = (Summaries.get("attendanceChart" + which)?.rows || []).map(r => ({
+      label: nameCol ? (r[nameCol] || `Row ${r.__row}`) : `Row ${r.__row}`,
+      value: +r.__value.toFixed(2)
+    }));
 
     return rows.length ? rows : null;
   }
@@ -760,15 +719,14 @@ window.renderSkipPanel = function (parent, title, reason) {
   }
 
   function renderHighestAttendanceChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent) return;
 
-    const rows = collectAttendanceRows();
+    const rows = collectAttendanceRows("Top");
     if (!rows) {
       renderSkipPanel(parent, "Top Attendance Charts", "Attendance column not found or no numeric data");
       return;
     }
 
-    rows.sort((a, b) => b.value - a.value);
     const top6 = rows.slice(0, 6);
 
     if (!top6.length) {
@@ -780,15 +738,14 @@ window.renderSkipPanel = function (parent, title, reason) {
   }
 
   function renderLowestAttendanceChartsAuto(parent) {
-    if (!parent || !records || !columns) return;
+    if (!parent) return;
 
-    const rows = collectAttendanceRows();
+    const rows = collectAttendanceRows("Low");
     if (!rows) {
       renderSkipPanel(parent, "Lowest Attendance Charts", "Attendance column not found or no numeric data");
       return;
     }
 
-    rows.sort((a, b) => a.value - b.value);
     const low6 = rows.slice(0, 6);
 
     if (!low6.length) {
@@ -807,11 +764,17 @@ window.renderSkipPanel = function (parent, title, reason) {
 
 Charting.renderChartsPage = function () {
   const pageCharts = document.getElementById("pageCharts");
-  if (!pageCharts || !records.length) return;
+  if (!pageCharts || !window.datasetRows) return;
 
   const grid = pageCharts.querySelector(".chart-grid");
   if (!grid) return;
 
+  Summaries.load().then(() => renderCharts(grid)).catch(err => {
+    console.error("Chart summaries failed", err);
+  });
+};
+
+function renderCharts(grid) {
   grid.innerHTML = "";   // clear only grid
 
   const tasks = [
@@ -833,4 +796,4 @@ Charting.renderChartsPage = function () {
   }
 
   requestAnimationFrame(runNext);
-};
+}
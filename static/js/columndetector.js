@@ -1,8 +1,38 @@
 // static/columnDetector.js
 (function (global) {
 
+    // keyword list (from keywords.js) -> column role in the server schema
+    const ROLE_LISTS = {
+      name: "nameKeywords",
+      id: "idKeywords",
+      attendance: "attendanceKeywords",
+      subject: "subjectKeywords",
+      marks: "marksKeywords",
+      percentage: "percentageKeywords",
+      class: "classKeywords",
+      gender: "genderKeywords",
+      section: "sectionKeywords",
+      result: "resultKeywords"
+    };
+
+    // role the server detected for this keyword list, if it is in `columns`
+    function pickFromSchema(columns, keywords) {
+      const roles = global.datasetSchema?.roles;
+      if (!roles) return null;
+
+      for (const [role, listName] of Object.entries(ROLE_LISTS)) {
+        if (global[listName] !== keywords) continue;
+        const col = (roles[role] || []).find(c => columns.includes(c));
+        return col ?? null;
+      }
+      return null;
+    }
+
     function pickColumnSmart(columns, keywords) {
       if (!columns || !columns.length) return null;
+
+      const fromSchema = pickFromSchema(columns, keywords);
+      if (fromSchema) return fromSchema;
   
       const lower = columns.map(c => String(c).toLowerCase());
   
@@ -23,6 +53,7 @@
     // ✅ DO NOT overwrite Table
     global.Table = global.Table || {};
     global.Table.pickColumnSmart = pickColumnSmart;
+    global.Table.pickFromSchema = pickFromSchema;
     global.Table.parseNumber = parseNumber;
   
   })(window);
@@ -86,28 +86,122 @@
     container.appendChild(table);
   }
 
-  function render() {
-    if (!Array.isArray(window.records) || !window.records.length) return;
+  /* ---------------------------------------------------------
+     Paging: rows come from GET /rows one page at a time, so the
+     viewer costs the same for 500 rows or a million.
+  --------------------------------------------------------- */
+  const PAGE_SIZE = 100;
+  const state = { offset: 0, sort: null, filter: "", total: 0, version: null };
+
+  function buildQuery() {
+    const params = new URLSearchParams({ offset: state.offset, limit: PAGE_SIZE });
+    if (state.sort) params.set("sort", state.sort);
+    // "gender=female; marks>80" -> two filters
+    state.filter.split(";").map(f => f.trim()).filter(Boolean)
+      .forEach(f => params.append("filter", f));
+    return params;
+  }
 
-    // toggle blocks
-    document.querySelector("#fulltable .empty-state")?.classList.add("hidden");
-    document.getElementById("rawTableBlock")?.classList.remove("hidden");
-    document.getElementById("cleanTableBlock")?.classList.remove("hidden");
+  function ensureControls() {
+    let bar = document.getElementById("fullTablePager");
+    if (bar) return bar;
+
+    bar = document.createElement("div");
+    bar.id = "fullTablePager";
+    bar.className = "table-pager";
+    bar.innerHTML = `
+      <input type="text" class="pager-filter" placeholder="Filter, e.g. gender=female or marks>80">
+      <button class="btn pager-prev">&laquo; Prev</button>
+      <span class="pager-info"></span>
+      <button class="btn pager-next">Next &raquo;</button>
+    `;
+    document.getElementById("pageFulltable")?.prepend(bar);
+
+    bar.querySelector(".pager-prev").onclick = () => {
+      state.offset = Math.max(0, state.offset - PAGE_SIZE);
+      loadPage();
+    };
+    bar.querySelector(".pager-next").onclick = () => {
+      if (state.offset + PAGE_SIZE < state.total) state.offset += PAGE_SIZE;
+      loadPage();
+    };
+    bar.querySelector(".pager-filter").onchange = e => {
+      state.filter = e.target.value;
+      state.offset = 0;
+      loadPage();
+    };
+    return bar;
+  }
+
+  // click a header: ascending -> descending -> upload order
+  function bindSortHeaders(container) {
+    container.querySelectorAll("th").forEach(th => {
+      const col = th.textContent;
+      th.style.cursor = "pointer";
+      if (state.sort === col) th.textContent = col + " ▲";
+      if (state.sort === "-" + col) th.textContent = col + " ▼";
+      th.onclick = () => {
+        state.sort = state.sort === col ? "-" + col : state.sort === "-" + col ? null : col;
+        state.offset = 0;
+        loadPage();
+      };
+    });
+  }
+
+  async function loadPage() {
+    const bar = ensureControls();
+    const info = bar.querySelector(".pager-info");
+
+    let page;
+    try {
+      const res = await fetch("/rows?" + buildQuery(), { headers: userHeaders() });
+      page = await res.json();
+      if (!res.ok) throw new Error(page.detail || "Failed to load rows");
+    } catch (err) {
+      info.textContent = String(err.message || err);
+      return;
+    }
+
+    // a new upload landed: start again from the first page
+    if (state.version && page.version !== state.version && state.offset) {
+      state.version = page.version;
+      state.offset = 0;
+      return loadPage();
+    }
+    state.version = page.version;
+    state.total = page.total;
+    const last = Math.min(page.offset + page.rows.length, page.total);
+    info.textContent = page.total
+      ? `${page.offset + 1}–${last} of ${page.total}`
+      : "No matching rows";
 
     // raw
     const rawTarget = document.getElementById("rawTable");
     rawTarget.innerHTML = "";
-    Table.renderSimpleTable(rawTarget, window.records.slice(0, 500));
+    Table.renderSimpleTable(rawTarget, page.rows);
+    bindSortHeaders(rawTarget);
 
     // cleaned
-    const { cleaned, changes } = cleanDataset(deepClone(window.records));
+    const { cleaned, changes } = cleanDataset(deepClone(page.rows));
     renderHighlightedTable(
       document.getElementById("cleanTable"),
-      cleaned.slice(0, 500),
+      cleaned,
       changes
     );
   }
 
+  function render() {
+    if (localStorage.getItem("hasData") !== "true" &&
+        (!Array.isArray(window.records) || !window.records.length)) return;
+
+    // toggle blocks
+    document.querySelector("#fulltable .empty-state")?.classList.add("hidden");
+    document.getElementById("rawTableBlock")?.classList.remove("hidden");
+    document.getElementById("cleanTableBlock")?.classList.remove("hidden");
+
+    loadPage();
+  }
+
   window.FullTable = { render };
 
 })();
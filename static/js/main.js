@@ -6,7 +6,7 @@
   window.ChatbotMemory = [];
 
   function hasData() {
-    return Array.isArray(window.records) && window.records.length > 0;
+    return window.datasetRows > 0;
   }
 
   function hideAllPages() {
@@ -55,7 +55,7 @@
 
       chartsPage?.classList.remove("hidden");
 
-      if (!window.records || !window.records.length) {
+      if (!hasData()) {
         // No data → show empty state
         emptyState?.classList.remove("hidden");
         pageCharts?.classList.add("hidden");
@@ -86,8 +86,14 @@
   window.afterUploadSuccess = function (json) {
     isUploading = true;
   
+    // rows stay on the server: tables page through /rows and the
+    // dashboard numbers come from /aggregate (summaries.js)
     window.records = json.data || [];
-    window.columns = [...new Set(
+    window.datasetRows = json.rows || 0;
+    window.datasetVersion = json.version || null;
+    // column roles from the server (null falls back to keyword guessing)
+    window.datasetSchema = json.schema || null;
+    window.columns = json.columns || [...new Set(
       window.records.flatMap(r => Object.keys(r))
     )];
   
@@ -0,0 +1,162 @@
+/* =========================================================
+   summaries.js – dashboard numbers from POST /aggregate
+   One batch per upload: counts, buckets and top/bottom-6 are
+   computed on the server, so the page never needs every row.
+========================================================= */
+(function (global) {
+
+  const ATTENDANCE_BUCKETS = {
+    edges: [90, 80, 70],
+    labels: ["90–100%", "80–89%", "70–79%", "0–69%"]
+  };
+  const BUCKET_ROWS = 100;
+  const HEAD_ROWS = 200;
+
+  let loaded = { version: null, promise: null };
+
+  function pick(keywords) {
+    return global.Table?.pickColumnSmart(global.columns || [], keywords || []) || null;
+  }
+
+  function detectColumns() {
+    return {
+      name: pick(global.nameKeywords),
+      id: pick(global.idKeywords),
+      attendance: pick(global.attendanceKeywords),
+      subject: pick(global.subjectKeywords),
+      marks: pick(global.marksKeywords),
+      percentage: pick(global.percentageKeywords),
+      class: pick(global.classKeywords),
+      gender: pick(global.genderKeywords),
+      section: pick(global.sectionKeywords),
+      result: pick(global.resultKeywords)
+    };
+  }
+
+  async function runQueries(queries) {
+    if (!queries.length) return {};
+    const res = await fetch("/aggregate", {
+      method: "POST",
+      headers: userHeaders({ "Content-Type": "application/json" }),
+      body: JSON.stringify({ queries })
+    });
+    const json = await res.json();
+    if (!res.ok) throw new Error(json.detail || "Failed to load summaries");
+
+    const byId = {};
+    json.results.forEach(r => {
+      if (r.error) console.warn(`aggregate ${r.id}: ${r.error}`);
+      else byId[r.id] = r;
+    });
+    return byId;
+  }
+
+  function rankQueries(id, column, extra = {}) {
+    if (!column) return [];
+    return [
+      { id: id + "Top", op: "rank", column, k: 6, order: "desc", ...extra },
+      { id: id + "Low", op: "rank", column, k: 6, order: "asc", ...extra }
+    ];
+  }
+
+  function firstQueries(cols) {
+    const q = [{ id: "head", op: "head", n: HEAD_ROWS }];
+
+    if (cols.attendance) {
+      q.push({
+        id: "attendanceBuckets", op: "buckets", column: cols.attendance,
+        ...ATTENDANCE_BUCKETS, scale_fractions: true,
+        rows_per_bucket: BUCKET_ROWS,
+        fields: [cols.name, cols.attendance].filter(Boolean)
+      });
+      q.push({ id: "attendanceStats", op: "stats", column: cols.attendance, below: 75 });
+    }
+    if (cols.gender) q.push({ id: "genderCounts", op: "counts", column: cols.gender });
+    if (cols.result) q.push({ id: "resultCounts", op: "counts", column: cols.result });
+    if (cols.subject && cols.marks) {
+      q.push({ id: "subjectMarks", op: "group", by: cols.subject, column: cols.marks, agg: "mean" });
+    }
+
+    q.push(...rankQueries("marks", cols.marks));
+    q.push(...rankQueries("percentage", cols.percentage));
+    q.push(...rankQueries("attendance", cols.attendance));
+    // attendance charts read 0–1 as a fraction of 100
+    q.push(...rankQueries("attendanceChart", cols.attendance, {
+      scale_fractions: true, fields: [cols.name].filter(Boolean)
+    }));
+
+    const metric = cols.marks || cols.attendance || cols.percentage;
+    q.push(...rankQueries("metricChart", metric, { fields: [cols.name].filter(Boolean) }));
+    return q;
+  }
+
+  // columns not found by name: look at the first rows, like the old
+  // client-side scans did
+  function columnWithTokens(head, tokens) {
+    const cols = global.columns || [];
+    return cols.find(c => head.some(r => {
+      const v = r[c];
+      if (v == null || v === "") return false;
+      const low = String(v).toLowerCase();
+      return tokens.some(t => low.includes(t));
+    })) || null;
+  }
+
+  function numericColumns(head) {
+    const rows = head.slice(0, 20);
+    return (global.columns || []).filter(col => {
+      const valid = rows.filter(r => !Number.isNaN(parseFloat(
+        String(r[col] ?? "").replace(/,/g, "").replace("%", "")
+      ))).length;
+      return valid >= Math.max(3, rows.length * 0.6);
+    });
+  }
+
+  async function build() {
+    const cols = detectColumns();
+    const byId = await runQueries(firstQueries(cols));
+    const head = byId.head?.rows || [];
+
+    const more = [];
+    if (!cols.gender) {
+      cols.genderGuess = columnWithTokens(head, ["male", "female", "m", "f", "man", "woman"]);
+      if (cols.genderGuess) more.push({ id: "genderCounts", op: "counts", column: cols.genderGuess });
+    }
+    if (!cols.result) {
+      cols.resultGuess = columnWithTokens(head, [...(global.passTokens || []), ...(global.failTokens || [])]);
+      if (cols.resultGuess) more.push({ id: "resultCounts", op: "counts", column: cols.resultGuess });
+    }
+
+    const numeric = numericColumns(head);
+    cols.score = cols.percentage || numeric[0] || null;
+    if (cols.score) more.push({ id: "scoreStats", op: "stats", column: cols.score });
+
+    Object.assign(byId, await runQueries(more));
+    return { cols, head, numericColumns: numeric, byId };
+  }
+
+  // resolves to window.summaries for the current upload (cached per version)
+  function load() {
+    const version = global.datasetVersion || null;
+    if (!loaded.promise || loaded.version !== version) {
+      loaded = {
+        version,
+        promise: build().then(s => {
+          global.summaries = { version, rows: global.datasetRows || 0, ...s };
+          return global.summaries;
+        }).catch(err => {
+          loaded = { version: null, promise: null };
+          throw err;
+        })
+      };
+    }
+    return loaded.promise;
+  }
+
+  function get(id) {
+    return global.summaries?.byId?.[id] || null;
+  }
+
+  global.Summaries = { load, get };
+
+})(window);
@@ -8,22 +8,27 @@ function renderDashboard() {
     return;
   }
 
-  if (!Array.isArray(window.records) || window.records.length === 0) {
+  if (!window.datasetRows) {
     console.warn("No records available");
     return;
   }
 
-  root.innerHTML = "";
-
-  // ✅ ALWAYS call via Table.*
-  Table.renderNameAttendance?.("dashboardContainer");
-  Table.renderSubjectMarksPerc?.("dashboardContainer");
-  Table.renderResultStatsPanel?.("dashboardContainer");
-  Table.renderGenderPanel?.("dashboardContainer");
-  Table.highestMetricTables?.("dashboardContainer");
-  Table.highestAttendanceOnly?.("dashboardContainer");
-  Table.LowestMetricTables?.("dashboardContainer");
-  Table.LowestAttendanceOnly?.("dashboardContainer");
+  // numbers come from the server (summaries.js), then render in one go
+  Summaries.load().then(() => {
+    root.innerHTML = "";
+
+    // ✅ ALWAYS call via Table.*
+    Table.renderNameAttendance?.("dashboardContainer");
+    Table.renderSubjectMarksPerc?.("dashboardContainer");
+    Table.renderResultStatsPanel?.("dashboardContainer");
+    Table.renderGenderPanel?.("dashboardContainer");
+    Table.highestMetricTables?.("dashboardContainer");
+    Table.highestAttendanceOnly?.("dashboardContainer");
+    Table.LowestMetricTables?.("dashboardContainer");
+    Table.LowestAttendanceOnly?.("dashboardContainer");
+  }).catch(err => {
+    console.error("Dashboard summaries failed", err);
+  });
 }
 
 
@@ -220,44 +225,18 @@ function renderDashboard() {
   }
 
   /* ===============================
-     ATTENDANCE BUCKET BUILDER
+     TOP / BOTTOM-6 FROM THE SERVER
+     shaped like the old client-side lists: { row, num, idx }
   =============================== */
-  function buildAttendanceBucketsWithRows(records, attCol) {
-    const buckets = {
-      "90–100%": [],
-      "80–89%": [],
-      "70–79%": [],
-      "0–69%": []
+  function rankedRows(id) {
+    const ranked = Summaries.get(id);
+    if (!ranked) return { rows: [], numeric: 0 };
+    return {
+      numeric: ranked.numeric,
+      rows: ranked.rows.map(r => ({ row: r, num: r.__value, idx: r.__row - 1 }))
     };
-
-    let numericCount = 0;
-    const totalRows = records.length;
-
-    records.forEach((r, i) => {
-      let v = parseNumber(r[attCol]);
-      if (Number.isNaN(v)) return;
-
-      if (v > 0 && v <= 1) v *= 100;
-      numericCount++;
-
-      const row = { "__rowIndex": i + 1, ...r };
-
-      if (v >= 90) buckets["90–100%"].push(row);
-      else if (v >= 80) buckets["80–89%"].push(row);
-      else if (v >= 70) buckets["70–79%"].push(row);
-      else buckets["0–69%"].push(row);
-    });
-
-    const summaryRows = Object.keys(buckets).map(label => ({
-      Bucket: label,
-      Count: buckets[label].length,
-      Percent: numericCount
-        ? ((buckets[label].length / numericCount) * 100).toFixed(2) + "%"
-        : "0.00%"
-    }));
-
-    return { buckets, summaryRows, numericCount, totalRows };
   }
+
   // ===== TABLE SECTIONS =====
   function renderNameAttendance(targetId) {
     const rootEl = resolveRoot(targetId);
@@ -288,7 +267,7 @@ function renderDashboard() {
     }
     
   
-    const previewRows = records.slice(0, 20).map((r, i) => ({
+    const previewRows = summaries.head.slice(0, 20).map((r, i) => ({
       Row: i + 1,
       [idCol || "id"]: r[idCol] ?? "",
       [nameCol || "name"]: r[nameCol] ?? "",
@@ -300,8 +279,16 @@ function renderDashboard() {
     rootEl.appendChild(previewPanel);
 
     // ---------- SUMMARY PANEL ----------
-    const { buckets, summaryRows, numericCount, totalRows } =
-      buildAttendanceBucketsWithRows(records, attCol);
+    const bucketResult = Summaries.get("attendanceBuckets");
+    if (!bucketResult) return;
+
+    const numericCount = bucketResult.numeric;
+    const totalRows = bucketResult.total;
+    const summaryRows = bucketResult.buckets.map(b => ({
+      Bucket: b.label,
+      Count: b.count,
+      Percent: b.percent.toFixed(2) + "%"
+    }));
   
     const summaryPanel = document.createElement("div");
     summaryPanel.className = "panel";
@@ -324,14 +311,16 @@ function renderDashboard() {
     rootEl.appendChild(bucketsContainer);
 
 
-    Object.entries(buckets).forEach(([label, rows]) => {
+    bucketResult.buckets.forEach(({ label, count, rows }) => {
       const bucketPanel = document.createElement("div");
       bucketPanel.className = "panel";
     
       const bucketTitle = document.createElement("div");
       bucketTitle.style.fontWeight = "700";
       bucketTitle.style.marginBottom = "6px";
-      bucketTitle.textContent = `${label} — ${rows.length} row(s)`;
+      bucketTitle.textContent = rows.length < count
+        ? `${label} — ${count} row(s), first ${rows.length} shown`
+        : `${label} — ${count} row(s)`;
       bucketPanel.appendChild(bucketTitle);
     
       if (!rows.length) {
@@ -340,7 +329,7 @@ function renderDashboard() {
         );
       } else {
         const rowsToShow = rows.map(r => ({
-          Row: r.__rowIndex,
+          Row: r.__row,
           [nameCol || "name"]: r[nameCol] ?? "",
           [attCol]: r[attCol] ?? ""
         }));
@@ -398,7 +387,7 @@ function renderSubjectMarksPerc(targetId) {
   panel.appendChild(detectedInfo);
 
   // table rows
-  const rows = records.slice(0, 20).map((r, idx) => {
+  const rows = summaries.head.slice(0, 20).map((r, idx) => {
     const obj = { Row: idx + 1 };
     detected.forEach(c => obj[c] = r[c] ?? "");
     return obj;
@@ -425,25 +414,12 @@ function renderResultStatsPanel(targetId) {
   if (!dashboard) return;
 
   // ---------- FIND RESULT COLUMN ----------
-  let colToUse = Table.pickColumnSmart(columns, resultKeywords);
-
-  if (!colToUse) {
-    colToUse = (Array.isArray(columns) ? columns.find(c => {
-      for (let i = 0; i < Math.min(200, records.length); i++) {
-        const v = records[i]?.[c];
-        if (v == null) continue;
-        const low = String(v).toLowerCase();
-        if (
-          passTokens.some(t => low.includes(t)) ||
-          failTokens.some(t => low.includes(t))
-        ) return true;
-      }
-      return false;
-    }) : "") || "";
-  }
+  // by name, else the first column with pass/fail values (summaries.js)
+  const colToUse = summaries.cols.result || summaries.cols.resultGuess;
+  const resultCounts = Summaries.get("resultCounts");
 
   // ❌ NOTHING DETECTED → HIDE SECTION
-  if (!colToUse) {
+  if (!colToUse || !resultCounts) {
     return;
   }
 
@@ -457,25 +433,15 @@ function renderResultStatsPanel(targetId) {
   title.textContent = "Result Summary";
   panel.appendChild(title);
 
-  // ---------- COMPUTE STATS ----------
-  const counts = new Map();
-  let total = 0;
-
-  records.forEach(r => {
-    const key = r[colToUse] == null ? "" : String(r[colToUse]).trim();
-    counts.set(key, (counts.get(key) || 0) + 1);
-    total++;
-  });
+  // ---------- STATS (counted on the server) ----------
+  const counts = new Map(resultCounts.values.map(v => [v.value, v.count]));
+  const total = resultCounts.total;
 
-  const stats = Array.from(counts.entries())
-    .map(([value, count]) => ({
-      value,
-      count,
-      percent: total
-        ? ((count / total) * 100).toFixed(2) + "%"
-        : "0.00%"
-    }))
-    .sort((a, b) => b.count - a.count);
+  const stats = resultCounts.values.map(v => ({
+    value: v.value,
+    count: v.count,
+    percent: v.percent.toFixed(2) + "%"
+  }));
 
   // ---------- PASS / FAIL ----------
   let passCount = 0;
@@ -536,22 +502,9 @@ function renderResultStatsPanel(targetId) {
     if (!dashboard) return;
   
     // ---------- FIND GENDER COLUMN ----------
-    let colToUse = window.Table.pickColumnSmart(columns, genderKeywords);
-  
-    if (!colToUse) {
-      for (const c of (Array.isArray(columns) ? columns : [])) {
-        for (let i = 0; i < Math.min(200, records.length); i++) {
-          const v = records[i]?.[c];
-          if (v == null) continue;
-          const low = String(v).toLowerCase();
-          if (["male","female","m","f","man","woman"].some(tok => low.includes(tok))) {
-            colToUse = c;
-            break;
-          }
-        }
-        if (colToUse) break;
-      }
-    }
+    // by name, else the first column with gender-like values (summaries.js)
+    const genderCounts = Summaries.get("genderCounts");
+    const colToUse = genderCounts && (summaries.cols.gender || summaries.cols.genderGuess);
   
     // ---------- PANEL ----------
     const panel = document.createElement("div");
@@ -575,15 +528,9 @@ function renderResultStatsPanel(targetId) {
       return;
     }
   
-    // ---------- COUNT VALUES ----------
-    const counts = new Map();
-    let total = 0;
-  
-    records.forEach(r => {
-      const key = r[colToUse] == null ? "" : String(r[colToUse]).trim();
-      counts.set(key, (counts.get(key) || 0) + 1);
-      total++;
-    });
+    // ---------- COUNTS (from the server) ----------
+    const counts = new Map(genderCounts.values.map(v => [v.value, v.count]));
+    const total = genderCounts.total;
   
     // ---------- MALE / FEMALE / OTHER ----------
     let maleCount = 0;
@@ -640,11 +587,11 @@ function renderResultStatsPanel(targetId) {
     panel.appendChild(summaryWrap);
   
     // ---------- TABLE ----------
-    const statsForTable = Array.from(counts.entries()).map(([value, count]) => ({
-      value,
-      count,
-      percent: total ? ((count / total) * 100).toFixed(2) + "%" : "0.00%"
-    })).sort((a, b) => b.count - a.count);
+    const statsForTable = genderCounts.values.map(v => ({
+      value: v.value,
+      count: v.count,
+      percent: v.percent.toFixed(2) + "%"
+    }));
   
     renderSimpleTable(panel, statsForTable, "percent", {
       tableClass: "compact striped"
@@ -730,7 +677,7 @@ function renderResultStatsPanel(targetId) {
     const percCol  = window.Table.pickColumnSmart(columns, percentageKeywords);
   
     // ---------- helper ----------
-    function buildMetricBlock(metricName, col, rowsList, colsToShowFn, highlightColName) {
+    function buildMetricBlock(metricName, col, rowsList, colsToShowFn, highlightColName, numericCount) {
       const wrapper = document.createElement("div");
       wrapper.className = "panel metric-table";
       wrapper.dataset.metric = metricName.toLowerCase();
@@ -738,7 +685,7 @@ function renderResultStatsPanel(targetId) {
       const title = document.createElement("div");
       title.style.fontWeight = "700";
       title.style.marginBottom = "6px";
-      title.textContent = `${metricName} — '${col}' (numeric rows: ${rowsList.length}) — top 6`;
+      title.textContent = `${metricName} — '${col}' (numeric rows: ${numericCount}) — top 6`;
       wrapper.appendChild(title);
   
       if (rowsList.length === 0) {
@@ -766,20 +713,15 @@ function renderResultStatsPanel(targetId) {
   
     // ---------- MARKS ----------
     if (marksCol) {
-      const numericRows = [];
-      records.forEach((r, idx) => {
-        const num = parseNumber(r[marksCol]);
-        if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-      });
-  
-      numericRows.sort((a, b) => (b.num - a.num) || (a.idx - b.idx));
+      const { rows: numericRows, numeric } = rankedRows("marksTop");
   
       buildMetricBlock(
         "Marks",
         marksCol,
         numericRows,
         columnsForMarksTable,
-        marksCol
+        marksCol,
+        numeric
       );
   
       if (window.Charting?.renderHighestMetricChart) {
@@ -789,20 +731,15 @@ function renderResultStatsPanel(targetId) {
   
     // ---------- PERCENTAGE ----------
     if (percCol) {
-      const numericRows = [];
-      records.forEach((r, idx) => {
-        const num = parseNumber(r[percCol]);
-        if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-      });
-  
-      numericRows.sort((a, b) => (b.num - a.num) || (a.idx - b.idx));
+      const { rows: numericRows, numeric } = rankedRows("percentageTop");
   
       buildMetricBlock(
         "Percentage",
         percCol,
         numericRows,
         columnsForPercentageTable,
-        percCol
+        percCol,
+        numeric
       );
   
       if (window.Charting?.renderHighestMetricChart) {
@@ -841,7 +778,7 @@ function renderResultStatsPanel(targetId) {
     panel.appendChild(title);
   
     // ---------- GUARDS ----------
-    if (!Array.isArray(records) || records.length === 0) {
+    if (!window.datasetRows) {
       const note = document.createElement("div");
       note.className = "small";
       note.textContent = "Upload a file to see attendance Top-6.";
@@ -874,23 +811,8 @@ function renderResultStatsPanel(targetId) {
       return;
     }
   
-    // ---------- PARSER ----------
-    const parser = (typeof parseNumber === "function")
-      ? parseNumber
-      : v => {
-          if (v == null) return NaN;
-          const n = Number(String(v).replace(/,/g, "").replace("%", ""));
-          return Number.isFinite(n) ? n : NaN;
-        };
-  
-    // ---------- COLLECT ROWS ----------
-    const numericRows = [];
-    records.forEach((r, idx) => {
-      const num = parser(r[attCol]);
-      if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-    });
-  
-    numericRows.sort((a, b) => (b.num - a.num) || (a.idx - b.idx));
+    // ---------- RANKED ROWS (from the server) ----------
+    const { rows: numericRows } = rankedRows("attendanceTop");
   
     if (numericRows.length === 0) {
       const msg = document.createElement("div");
@@ -937,7 +859,7 @@ function renderResultStatsPanel(targetId) {
     const percCol  = window.Table.pickColumnSmart(columns, percentageKeywords);
   
     // ---------- helper ----------
-    function buildMetricBlock(metricName, col, rowsList, colsToShowFn, highlightColName) {
+    function buildMetricBlock(metricName, col, rowsList, colsToShowFn, highlightColName, numericCount) {
       const panel = document.createElement("div");
       panel.className = "panel metric-table";
       panel.dataset.metric = metricName.toLowerCase();
@@ -945,7 +867,7 @@ function renderResultStatsPanel(targetId) {
       const title = document.createElement("div");
       title.style.fontWeight = "700";
       title.style.marginBottom = "6px";
-      title.textContent = `${metricName} — '${col}' (numeric rows: ${rowsList.length}) — lowest`;
+      title.textContent = `${metricName} — '${col}' (numeric rows: ${numericCount}) — lowest`;
       panel.appendChild(title);
   
       if (rowsList.length === 0) {
@@ -975,20 +897,15 @@ function renderResultStatsPanel(targetId) {
   
     // ---------- MARKS (LOWEST) ----------
     if (marksCol) {
-      const numericRows = [];
-      records.forEach((r, idx) => {
-        const num = parseNumber(r[marksCol]);
-        if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-      });
-  
-      numericRows.sort((a, b) => (a.num - b.num) || (a.idx - b.idx));
+      const { rows: numericRows, numeric } = rankedRows("marksLow");
   
       buildMetricBlock(
         "Marks",
         marksCol,
         numericRows,
         columnsForMarksTable,
-        marksCol
+        marksCol,
+        numeric
       );
   
       if (window.Charting?.renderLowestMetricChart) {
@@ -998,20 +915,15 @@ function renderResultStatsPanel(targetId) {
   
     // ---------- PERCENTAGE (LOWEST) ----------
     if (percCol) {
-      const numericRows = [];
-      records.forEach((r, idx) => {
-        const num = parseNumber(r[percCol]);
-        if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-      });
-  
-      numericRows.sort((a, b) => (a.num - b.num) || (a.idx - b.idx));
+      const { rows: numericRows, numeric } = rankedRows("percentageLow");
   
       buildMetricBlock(
         "Percentage",
         percCol,
         numericRows,
         columnsForPercentageTable,
-        percCol
+        percCol,
+        numeric
       );
   
       if (window.Charting?.renderLowestMetricChart) {
@@ -1050,7 +962,7 @@ function renderResultStatsPanel(targetId) {
     panel.appendChild(title);
   
     // ---------- GUARDS ----------
-    if (!Array.isArray(records) || records.length === 0) {
+    if (!window.datasetRows) {
       const note = document.createElement("div");
       note.className = "small";
       note.textContent = "Upload a file to see attendance Lowest-6.";
@@ -1072,14 +984,8 @@ function renderResultStatsPanel(targetId) {
       return;
     }
   
-    // ---------- COLLECT NUMERIC ROWS ----------
-    const numericRows = [];
-    records.forEach((r, idx) => {
-      const num = parseNumber(r[attCol]);
-      if (!Number.isNaN(num)) numericRows.push({ row: r, num, idx });
-    });
-  
-    numericRows.sort((a, b) => (a.num - b.num) || (a.idx - b.idx));
+    // ---------- RANKED ROWS (from the server) ----------
+    const { rows: numericRows } = rankedRows("attendanceLow");
   
     if (numericRows.length === 0) {
       const msg = document.createElement("div");
@@ -1175,7 +1081,6 @@ Object.assign(window.Table, {
   parseNumber,
   pickColumnSmart,
   renderSimpleTable,
-  buildAttendanceBucketsWithRows,
 
   // main entry point (🔥 REQUIRED)
   renderDashboard,
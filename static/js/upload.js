@@ -19,13 +19,74 @@ const dataActions = document.getElementById("dataActions");
 const dataSummary = document.getElementById("dataSummary");
 
 // ---------------- DATA ----------------
-let parsedData = [];
 let currentFileName = "";
 
 // ---------------- HELPERS ----------------
 function show(el) { el?.classList.remove("hidden"); }
 function hide(el) { el?.classList.add("hidden"); }
 
+function setProgressText(text) {
+  const label = loadingState?.querySelector("p");
+  if (label) label.textContent = text;
+}
+
+function uploadFailed() {
+  window.isUploading = false;
+  hide(loadingState);
+  show(idleState);
+  setProgressText("Processing file...");
+}
+
+// ---------------- JOB PROGRESS ----------------
+// Streams /jobs/{id}/events and resolves with the final job status. Read
+// through fetch (not EventSource) so the request carries whose job it is.
+async function waitForJob(job) {
+  let res;
+  try {
+    res = await fetch(job.events_url, { headers: userHeaders() });
+  } catch {
+    throw new Error("Lost connection to the server");
+  }
+  if (!res.ok) throw new Error((await res.json()).detail || "Lost connection to the server");
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = "";
+
+  while (true) {
+    let chunk;
+    try {
+      chunk = await reader.read();
+    } catch {
+      throw new Error("Lost connection to the server");
+    }
+    if (chunk.done) break;
+    buffer += chunk.value;
+
+    // one event per blank-line separated block; its JSON is on the "data:" line
+    const blocks = buffer.split("\n\n");
+    buffer = blocks.pop();
+    for (const block of blocks) {
+      const data = block.split("\n").find(line => line.startsWith("data: "));
+      if (!data) continue;
+      const status = JSON.parse(data.slice(6));
+
+      if (status.status === "done") {
+        reader.cancel();
+        return status;
+      } else if (status.status === "failed") {
+        reader.cancel();
+        throw new Error(status.error || "Cleaning failed");
+      } else if (status.stage) {
+        const rows = status.rows ? ` · ${status.rows.toLocaleString()} rows` : "";
+        setProgressText(`Step ${status.step}/${status.total_steps}: ${status.stage}${rows}`);
+      } else {
+        setProgressText("Waiting for a free worker...");
+      }
+    }
+  }
+  throw new Error("Lost connection to the server");
+}
+
 // ---------------- FILE HANDLER ----------------
 async function handleFile(file) {
   const authUser = JSON.parse(localStorage.getItem("authUser"));
@@ -66,7 +127,9 @@ async function handleFile(file) {
   const form = new FormData();
   form.append("file", file);
 
-  const res = await fetch("/upload", {
+  setProgressText("Uploading file...");
+
+  const res = await fetch("/jobs", {
     method: "POST",
     headers: {
       "X-User-Email": email,
@@ -77,9 +140,7 @@ async function handleFile(file) {
 
   // ---------------- HANDLE SERVER RESPONSE ----------------
   if (!res.ok) {
-    window.isUploading = false;
-    hide(loadingState);
-    show(idleState);
+    uploadFailed();
 
     if (res.status === 403) {
       openUpgradeModal?.();
@@ -91,10 +152,23 @@ async function handleFile(file) {
     return;
   }
 
-  const json = await res.json();
+  const job = await res.json();
+
+  // ---------------- WAIT FOR CLEANING JOB ----------------
+  let json;
+  try {
+    const status = await waitForJob(job);
+    // no records: the dashboard pages /rows and asks /aggregate
+    const result = await fetch(status.result_url + "?data=false", { headers: userHeaders() });
+    if (!result.ok) throw new Error((await result.json()).detail);
+    json = await result.json();
+  } catch (err) {
+    uploadFailed();
+    alert(err.message || "Upload failed");
+    return;
+  }
 
   // ---------------- SUCCESS ----------------
-  parsedData = json.data || [];
   currentFileName = json.filename || file.name;
 
   // 🔒 lock upload count AFTER success
@@ -103,6 +177,7 @@ async function handleFile(file) {
   window.isUploading = false;
   window.isFileUploaded = true;
   localStorage.setItem("hasData", "true");
+  setProgressText("Processing file...");
 
   // ✅ SAVE STATE FOR PAGE RELOAD
   localStorage.setItem("uploadState", JSON.stringify({
@@ -158,7 +233,6 @@ removeBtn.onclick = () => {
 
   document.body.classList.remove("has-file");
 
-  parsedData = [];
   currentFileName = "";
 
   hide(fileState);
@@ -177,17 +251,22 @@ removeBtn.onclick = () => {
 };
 
 // ---------------- DOWNLOAD JSON ----------------
-downloadBtn.onclick = () => {
-  if (!parsedData.length) return;
-
-  const blob = new Blob([JSON.stringify(parsedData, null, 2)], {
-    type: "application/json"
-  });
+downloadBtn.onclick = async () => {
+  if (!currentFileName) return;
 
+  // the server keeps the cleaned JSON of the current dataset; fetched
+  // (not linked) so the request carries whose dataset it is
+  const res = await fetch("/download-json?format=json-stream", { headers: userHeaders() });
+  if (!res.ok) {
+    alert((await res.json()).detail || "Download failed");
+    return;
+  }
+  const url = URL.createObjectURL(await res.blob());
   const a = document.createElement("a");
-  a.href = URL.createObjectURL(blob);
+  a.href = url;
   a.download = currentFileName.replace(".csv", ".json");
   a.click();
+  URL.revokeObjectURL(url);
 };
 
 // ---------------- RESTORE STATE ON PAGE RELOAD ----------------
@@ -202,6 +281,7 @@ document.addEventListener("DOMContentLoaded", async () => {
   show(fileState);
   show(dataActions);
 
+  currentFileName = state.filename;
   fileNameEl.textContent = state.filename;
   fileSizeEl.textContent = (state.size / 1024).toFixed(1) + " KB";
   dataSummary.textContent = `${state.rows} rows`;
@@ -210,7 +290,7 @@ document.addEventListener("DOMContentLoaded", async () => {
 
   // 🔥 RESTORE TABLES / CHARTS / CHATBOT
   try {
-    const res = await fetch("/last-upload");
+    const res = await fetch("/last-upload?data=false", { headers: userHeaders() });
     if (!res.ok) return;
 
     const json = await res.json();
@@ -0,0 +1,207 @@
+# storage.py
+# How a cleaned upload (a dataset, see namespaces.py) is kept on disk. With
+# pyarrow installed it is one uncompressed Feather (Arrow IPC) file, which is
+# memory-mapped on read, so a column or a page of rows can be read without
+# loading the rest.
+# pyarrow is in requirements.txt; an install without it falls back to a
+# pickle of the whole frame, which every read loads in full.
+#
+# JSON is no longer written on upload; it is made on demand from the frame.
+#
+# Beside the frame, the cleaners' fitted state (see clean_dataset) is
+# pickled, so rows appended later are cleaned the way the first ones were.
+#
+# A re-uploaded file is served from upload_cache.py: its cleaned frame is
+# linked in place (link_frame) rather than written again.
+import os
+import json
+import pickle
+import shutil
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from metrics import span
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # in requirements.txt; older installs may lack it
+    pa = None
+
+
+class PickleStore:
+    """Whole frame in one pickle; reading anything reads everything."""
+
+    suffix = ".pkl"
+    columnar = False
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def write(self, df: pd.DataFrame):
+        with span("to_pickle", len(df)):
+            df.to_pickle(self.path)
+
+    def read(self, columns: Optional[Sequence] = None) -> pd.DataFrame:
+        df = pd.read_pickle(self.path).reset_index(drop=True)
+        return df if columns is None else df[list(columns)]
+
+    def columns(self) -> list:
+        return list(self.read().columns)
+
+    def num_rows(self) -> int:
+        return len(self.read())
+
+    def take(self, positions: np.ndarray, columns: Optional[Sequence] = None) -> pd.DataFrame:
+        return self.read(columns).iloc[positions]
+
+
+class FeatherStore:
+    """
+    Uncompressed Feather v2. Compression would force a decode of every
+    column on read; uncompressed buffers are used straight from the
+    memory map, so only the columns and rows asked for are touched.
+    """
+
+    suffix = ".feather"
+    columnar = True
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def write(self, df: pd.DataFrame):
+        with span("to_feather", len(df)):
+            feather.write_feather(arrow_table(df), self.path, compression="uncompressed")
+
+    def _table(self, columns: Optional[Sequence] = None):
+        return feather.read_table(self.path, columns=None if columns is None else list(columns),
+                                  memory_map=True)
+
+    def read(self, columns: Optional[Sequence] = None) -> pd.DataFrame:
+        return self._table(columns).to_pandas()
+
+    def _schema(self):
+        # only the footer is read, not the data
+        with pa.memory_map(str(self.path)) as source:
+            return pa.ipc.open_file(source).schema
+
+    def columns(self) -> list:
+        return list(self._schema().names)
+
+    def num_rows(self) -> int:
+        with pa.memory_map(str(self.path)) as source:
+            reader = pa.ipc.open_file(source)
+            return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+    def take(self, positions: np.ndarray, columns: Optional[Sequence] = None) -> pd.DataFrame:
+        table = self._table(columns).take(pa.array(np.asarray(positions, dtype=np.int64)))
+        return table.to_pandas()
+
+
+def arrow_table(df: pd.DataFrame):
+    """
+    df as an Arrow table. Cleaned object columns can mix types (numbers
+    left next to text); Arrow needs one type per column, so those columns
+    are stored as text, which is how the dashboard shows them anyway.
+    """
+    df = df.reset_index(drop=True)
+    df.columns = [str(c) for c in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    fixed = {}
+    for col in df.columns:
+        if df[col].dtype != object:
+            continue
+        try:
+            pa.array(df[col], from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            fixed[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df.assign(**fixed), preserve_index=False)
+
+
+def _stores(base: Path) -> list:
+    # preferred backend first; Feather files can't be read without pyarrow
+    backends = (FeatherStore, PickleStore) if pa is not None else (PickleStore,)
+    return [cls(Path(base).with_suffix(cls.suffix)) for cls in backends]
+
+
+def open_store(base: Path):
+    """
+    Store for `base` (a path without suffix): Feather when pyarrow is
+    installed, else pickle. A pickle saved before pyarrow was installed is
+    still read, so saved datasets survive the switch.
+    """
+    stores = _stores(base)
+    return next((store for store in stores if store.exists()), stores[0])
+
+
+def save_frame(base: Path, df: pd.DataFrame):
+    """Write df with the preferred backend and drop files of the others."""
+    store, *others = _stores(base)
+    # write beside it and rename: readers that have the old file
+    # memory-mapped keep a valid file until they let go of it
+    tmp = store.path.with_name(store.path.name + ".tmp")
+    type(store)(tmp).write(df)
+    os.replace(tmp, store.path)
+    for other in others:
+        other.path.unlink(missing_ok=True)
+    return store
+
+
+def link_frame(src: Path, base: Path):
+    """
+    Put a frame file that is already written (a cached upload) in place as
+    `base`, without reading or writing the frame again. Hard-linked when
+    both are on one filesystem, else copied. Returns the store for it.
+    """
+    src = Path(src)
+    store = next(s for s in _stores(base) if s.suffix == src.suffix)
+    tmp = store.path.with_name(store.path.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, store.path)
+    for other in _stores(base):
+        if other.path != store.path:
+            other.path.unlink(missing_ok=True)
+    return store
+
+
+def save_state(path: Path, state: dict):
+    """Pickle the cleaners' state; written beside and renamed like save_frame."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+
+def save_json(path: Path, value):
+    """Write JSON beside and rename, so readers never see half a file."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(value, f)
+    os.replace(tmp, path)
+
+
+def load_state(path: Path) -> Optional[dict]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
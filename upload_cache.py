@@ -0,0 +1,176 @@
+# upload_cache.py
+# Cleaned results of past uploads, kept on disk and keyed by a hash of the
+# uploaded bytes plus the version of the cleaning code. People re-upload the
+# same sheet all the time; a repeat is served from here without parsing or
+# cleaning it again.
+#
+# An entry is the cleaned frame (written by storage.py, so it can be linked
+# straight into the user's new dataset) and a pickle of what the upload
+# response and appends need: ingest stats, schema and the cleaners' fit.
+#
+# Configuration (environment):
+#   UPLOAD_CACHE_MB     disk for cached uploads (default 1024, 0 turns it off)
+#   UPLOAD_CACHE_DIR    where they are kept (default uploads/upload_cache)
+import os
+import pickle
+import hashlib
+import threading
+import traceback
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from storage import open_store, save_frame
+
+
+UPLOAD_CACHE_MB = 1024
+META_SUFFIX = ".meta.pkl"
+
+# modules whose code decides what a CSV cleans to: editing any of them
+# changes every key, so results of older code are never served
+PIPELINE_MODULES = ("ingest.py", "workers.py", "cleaning.py", "schema.py", "display.py",
+                    "scheduler.py")
+
+
+def pipeline_version() -> str:
+    h = hashlib.sha256()
+    base = Path(__file__).resolve().parent
+    for name in PIPELINE_MODULES:
+        h.update((base / name).read_bytes())
+    return h.hexdigest()[:16]
+
+
+PIPELINE_VERSION = pipeline_version()
+
+
+class CachedUpload:
+    """One cache entry: the stored frame and its metadata."""
+
+    def __init__(self, key: str, store, meta: Dict[str, Any]):
+        self.key = key
+        self.store = store
+        self.meta = meta
+
+
+class UploadCache:
+    """
+    Cleaned uploads on disk, least recently used dropped once the total
+    goes over max_bytes (the newest entry always stays). The index is kept
+    in memory and rebuilt from the directory on start, oldest files first.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        if self.enabled:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load_index()
+
+    @classmethod
+    def from_env(cls, default_dir: Path) -> "UploadCache":
+        directory = os.getenv("UPLOAD_CACHE_DIR") or default_dir
+        return cls(directory, int(float(os.getenv("UPLOAD_CACHE_MB", UPLOAD_CACHE_MB)) * 1024 * 1024))
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, digest: str) -> str:
+        """Cache key for an upload whose body hashed to `digest`."""
+        return f"{digest}-{PIPELINE_VERSION}"
+
+    def _meta_path(self, key: str) -> Path:
+        return self.directory / (key + META_SUFFIX)
+
+    def _entry_size(self, key: str) -> int:
+        store = open_store(self.directory / key)
+        return sum(p.stat().st_size for p in (store.path, self._meta_path(key)) if p.exists())
+
+    def _load_index(self):
+        metas = sorted(self.directory.glob("*" + META_SUFFIX), key=lambda p: p.stat().st_mtime)
+        for meta in metas:
+            key = meta.name[:-len(META_SUFFIX)]
+            self._entries[key] = self._entry_size(key)
+            self._bytes += self._entries[key]
+        self._evict()
+
+    def get(self, key: str) -> Optional[CachedUpload]:
+        """The cached result for key, or None (a miss)."""
+        if not self.enabled:
+            return None
+        store = open_store(self.directory / key)
+        try:
+            with open(self._meta_path(key), "rb") as f:
+                meta = pickle.load(f)
+            found = store.exists()
+        except (OSError, pickle.UnpicklingError, EOFError):
+            found = False
+
+        with self._lock:
+            if not found:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return CachedUpload(key, store, meta)
+
+    def put(self, key: str, df: pd.DataFrame, meta: Dict[str, Any]) -> Optional[CachedUpload]:
+        """
+        Write df and meta under key. Returns the entry, or None when the
+        cache is off or the disk write failed (the upload goes on without it).
+        """
+        if not self.enabled:
+            return None
+        meta_path = self._meta_path(key)
+        try:
+            store = save_frame(self.directory / key, df)
+            tmp = meta_path.with_name(meta_path.name + ".tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, meta_path)
+            size = self._entry_size(key)
+        except OSError:
+            traceback.print_exc()
+            self._remove(key)
+            return None
+
+        with self._lock:
+            self._bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._bytes += size
+            self._stats["stores"] += 1
+            self._evict()
+        return CachedUpload(key, store, meta)
+
+    def _remove(self, key: str):
+        self._meta_path(key).unlink(missing_ok=True)
+        open_store(self.directory / key).path.unlink(missing_ok=True)
+
+    def _evict(self):
+        # datasets are hard links of their entries, so removing an entry
+        # never takes a user's dataset with it
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._stats["evictions"] += 1
+            self._remove(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "pipeline_version": PIPELINE_VERSION,
+            })
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+        return stats
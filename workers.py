@@ -0,0 +1,224 @@
+# workers.py
+# Bounded worker pool for the CPU-bound parse + clean step, so a big upload
+# never runs on the event loop and blocks static files or /columns.
+#
+# Configuration (environment):
+#   CLEAN_POOL_KIND     "process" (default) or "thread"
+#   CLEAN_POOL_WORKERS  worker count (default: CPU count)
+#   CLEAN_QUEUE_LIMIT   jobs allowed to wait for a free worker (default 8)
+#   CLEAN_JOB_TIMEOUT   seconds before a job is abandoned (default 300)
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from cleaning import clean_dataset
+from ingest import read_csv_batches, peak_rss_mb
+import metrics
+
+
+class PoolFull(Exception):
+    """Raised when every worker is busy and the wait queue is at its limit."""
+
+
+class JobTimeout(Exception):
+    """Raised when a job does not finish within the pool timeout."""
+
+
+class InvalidCSV(Exception):
+    """The uploaded file could not be parsed as CSV."""
+
+
+def _timed_call(fn: Callable, submitted_at: float, *args, **kwargs):
+    # runs inside the worker; wall clock so it is comparable across processes
+    started_at = time.time()
+    result = fn(*args, **kwargs)
+    return result, started_at - submitted_at, time.time() - started_at
+
+
+class QueueProgress:
+    """
+    Picklable progress callback: puts (job_id, stage, rows) on a queue that
+    the web process drains. Works with queue.Queue for thread pools and a
+    multiprocessing Manager queue proxy for process pools.
+    """
+
+    def __init__(self, job_id: str, events):
+        self.job_id = job_id
+        self.events = events
+
+    def __call__(self, stage: str, rows: int):
+        self.events.put((self.job_id, stage, rows))
+
+
+def parse_and_clean(path, progress=None, state=None):
+    """
+    Pool job for /upload: parse the spooled CSV and run the cleaning
+    pipeline. Returns (df, ingest_stats, state): the cleaners' fit, to keep
+    for appends. Pass the state of the last upload to clean the CSV as
+    rows appended to it. ingest_stats["trace"] holds the spans of the job
+    (metrics.py), for the caller to pop and merge().
+    """
+    with metrics.collect() as trace:
+        try:
+            with metrics.span("parse_csv") as parsed:
+                df, ingest_stats = read_csv_batches(path, progress=progress)
+                parsed.rows_out = len(df)
+        except Exception as e:
+            raise InvalidCSV(str(e)) from None
+
+        state = {} if state is None else state
+        dropped, compacted = {}, {}
+        df = clean_dataset(df, progress=progress, drop_report=dropped, state=state, compact_report=compacted)
+    ingest_stats["trace"] = trace.spans
+    # rows removed for blank cells, and the columns they were blank in
+    ingest_stats["dropped_rows"] = dropped
+    # bytes of the cleaned frame before/after categories and downcasts
+    ingest_stats["compaction"] = compacted
+    # peak of the process that did the work, not of the web server
+    ingest_stats["peak_rss_mb"] = peak_rss_mb()
+    return df, ingest_stats, state
+
+
+class CleaningPool:
+    def __init__(self, kind: str = "process", workers: Optional[int] = None,
+                 queue_limit: int = 8, timeout: float = 300.0):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown pool kind: {kind}")
+        self.kind = kind
+        self.workers = workers or os.cpu_count() or 2
+        self.queue_limit = queue_limit
+        self.timeout = timeout
+
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "timed_out": 0,
+            "queue_wait_seconds_total": 0.0,
+            "queue_wait_seconds_max": 0.0,
+            "run_seconds_total": 0.0,
+        }
+
+    @classmethod
+    def from_env(cls) -> "CleaningPool":
+        workers = os.getenv("CLEAN_POOL_WORKERS")
+        return cls(
+            kind=os.getenv("CLEAN_POOL_KIND", "process"),
+            workers=int(workers) if workers else None,
+            queue_limit=int(os.getenv("CLEAN_QUEUE_LIMIT", "8")),
+            timeout=float(os.getenv("CLEAN_JOB_TIMEOUT", "300")),
+        )
+
+    # --------------------------------------------------
+    # executor lifecycle
+    # --------------------------------------------------
+    def _get_executor(self):
+        if self._executor is None:
+            if self.kind == "process":
+                # spawn: forking a server process that already runs threads
+                # (uvicorn, the event loop) is not safe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="clean"
+                )
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    # --------------------------------------------------
+    # submission
+    # --------------------------------------------------
+    def _release(self, _future):
+        with self._lock:
+            self._in_flight -= 1
+
+    def submit(self, fn: Callable, *args, **kwargs):
+        """
+        Queue `fn(*args, **kwargs)` on the pool. Raises PoolFull instead of
+        queueing without bound. Returns a concurrent.futures.Future resolving
+        to (result, queue_wait_seconds, run_seconds).
+        """
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self._stats["rejected"] += 1
+                raise PoolFull("Cleaning queue is full")
+            self._in_flight += 1
+            self._stats["submitted"] += 1
+
+        try:
+            future = self._get_executor().submit(_timed_call, fn, time.time(), *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        # the slot is held until the worker is really done, even if the
+        # caller gave up on it after a timeout
+        future.add_done_callback(self._release)
+        return future
+
+    def record(self, future) -> Any:
+        """Unwrap a finished future from submit() and update the counters."""
+        try:
+            result, waited, ran = future.result()
+        except Exception:
+            with self._lock:
+                self._stats["failed"] += 1
+            raise
+        with self._lock:
+            self._stats["completed"] += 1
+            self._stats["queue_wait_seconds_total"] += waited
+            self._stats["queue_wait_seconds_max"] = max(self._stats["queue_wait_seconds_max"], waited)
+            self._stats["run_seconds_total"] += ran
+        return result, waited, ran
+
+    async def run(self, fn: Callable, *args, **kwargs):
+        """
+        Run `fn` on the pool without blocking the event loop.
+        Returns (result, queue_wait_seconds, run_seconds).
+        """
+        return await self.wait(self.submit(fn, *args, **kwargs))
+
+    async def wait(self, future):
+        """Await a future from submit(), enforcing the pool timeout."""
+        waiter = asyncio.wrap_future(future)
+        # errors are re-raised by record(); mark them retrieved on the wrapper
+        waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+        done, _ = await asyncio.wait({waiter}, timeout=self.timeout)
+        if not done:
+            # drops it if still queued; a running job can't be interrupted
+            future.cancel()
+            with self._lock:
+                self._stats["timed_out"] += 1
+            raise JobTimeout(f"Cleaning took longer than {self.timeout:g}s")
+        return self.record(future)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            in_flight = self._in_flight
+        done = stats["completed"]
+        stats.update({
+            "kind": self.kind,
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "timeout_seconds": self.timeout,
+            "in_flight": in_flight,
+            "queued": max(0, in_flight - self.workers),
+            "queue_wait_seconds_avg": stats["queue_wait_seconds_total"] / done if done else 0.0,
+        })
+        return stats